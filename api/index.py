@@ -3,8 +3,26 @@ Vercel serverless function entry point
 """
 import sys
 import os
+import time
+
+_started = time.perf_counter()
 
 # Add project root to path so we can import tool modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from tool.app import app
+
+# tool.app puts tool/ on the path; its modules are imported by their top-level names
+from snapshot import load_snapshot
+from template_registry import load_registry
+from timing import record_startup
+
+record_startup("import", time.perf_counter() - _started)
+
+# Load the templates pre-parsed by the build step (tool/snapshot.py, see vercel.json) in one
+# read, so the first request does not parse every template; without it they are parsed as before
+load_snapshot()
+
+# Check every template once (existence, sheet and cell addresses) so a broken
+# template fails here rather than partway through a request
+load_registry()
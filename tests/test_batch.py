@@ -0,0 +1,87 @@
+"""
+複数事業主の一括生成（batch）
+バッチファイルの読み込み（JSON配列・applicants・JSONL・CSV）と不正な行の扱い、
+一部の事業主が失敗しても残りの書類とエラー内容をZIPに入れることを確かめる。
+"""
+
+import json
+import os
+import sys
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tool"))
+
+import pytest
+
+import batch
+import generator
+from app import app
+from batch import BatchError, company_folder, generate_batch, parse_payloads
+
+# 定額制（様式第6-2号のテンプレートを使わない書類の組み合わせ）
+APPLICANT = {"is_subscription": "yes", "company_name": "株式会社テスト", "office_name": "本社",
+             "workers": [{"name": "受講者1"}]}
+
+
+def test_parse_payloads_formats():
+    payloads = [{"company_name": "A"}, {"company_name": "B"}]
+    assert parse_payloads(json.dumps(payloads)) == payloads
+    assert parse_payloads(json.dumps({"applicants": payloads}).encode("utf-8")) == payloads
+    assert parse_payloads(json.dumps(payloads[0])) == payloads[:1]
+    assert parse_payloads("\n".join(json.dumps(p) for p in payloads) + "\n\n") == payloads
+    assert parse_payloads("\ufeffcompany_name,office_name\nA,本社\nB,\n".encode("utf-8"), "list.CSV") == [
+        {"company_name": "A", "office_name": "本社"}, {"company_name": "B", "office_name": ""}]
+    assert parse_payloads("  ") == []
+
+
+def test_parse_payloads_rejects_invalid_rows():
+    with pytest.raises(BatchError, match="2件目"):
+        parse_payloads(json.dumps([{"company_name": "A"}, "B"]))
+    with pytest.raises(BatchError, match="2件目"):
+        parse_payloads('{"company_name": "A"}\n[1]\n')
+    with pytest.raises(BatchError, match="配列"):
+        parse_payloads(json.dumps({"applicants": "A"}))
+    # JSONとして読めない行はValueError（/batch では400にする）
+    with pytest.raises(ValueError):
+        parse_payloads('{"company_name": "A"}\n{"company_name": \n')
+
+
+def test_company_folder():
+    assert company_folder(0, {"company_name": "株式会社A/B"}) == "001_株式会社A_B"
+    assert company_folder(11, {"office_name": "本社"}) == "012_本社"
+    assert company_folder(2, {"company_name": " \t "}) == "003_事業主"
+
+
+def test_generate_batch_keeps_going_after_errors(tmp_path, monkeypatch):
+    # テンプレートの解析を待たないようpatch方式で生成する
+    monkeypatch.setattr(generator, "FILL_ENGINE", "patch")
+    render_applicant = batch.render_applicant
+
+    def failing(data):
+        if data["company_name"] == "失敗する会社":
+            raise ValueError("入力が不正です")
+        return render_applicant(data)
+
+    monkeypatch.setattr(batch, "render_applicant", failing)
+    payloads = [APPLICANT, dict(APPLICANT, company_name="失敗する会社"), dict(APPLICANT, company_name="株式会社C")]
+    progress = []
+    zip_path = str(tmp_path / "batch.zip")
+    errors = generate_batch(payloads, zip_path, workers=1, progress=lambda done, total: progress.append((done, total)))
+
+    assert errors == [("002_失敗する会社", "入力が不正です")]
+    assert progress == [(1, 3), (2, 3), (3, 3)]
+    with zipfile.ZipFile(zip_path) as zf:
+        names = zf.namelist()
+        assert zf.read("002_失敗する会社/エラー.txt").decode("utf-8") == "書類を生成できませんでした: 入力が不正です\n"
+    documents = [arcname for arcname, _ in generator.render_documents(generator.preprocess_data(APPLICANT))]
+    assert names == ([f"001_株式会社テスト/{arcname}" for arcname in documents] + ["002_失敗する会社/エラー.txt"]
+                     + [f"003_株式会社C/{arcname}" for arcname in documents])
+
+
+def test_batch_endpoint_rejects_invalid_rows():
+    client = app.test_client()
+    response = client.post("/batch", data=json.dumps([{"company_name": "A"}, 1]), content_type="application/json")
+    assert response.status_code == 400
+    assert "2件目" in response.get_json()["error"]
+    response = client.post("/batch", data="[]", content_type="application/json")
+    assert response.status_code == 400
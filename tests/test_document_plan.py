@@ -0,0 +1,64 @@
+"""
+生成する書類の決定（document_plan）
+入力の組み合わせごとに選ばれる様式と並び、計画変更のときの様式第2-1号、
+書類の選択に関わらない項目では同じ結果を使い回すことを確かめる。
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tool"))
+
+from app import app
+from document_plan import DOCUMENT_PATHS, document_plan, plan_args, resolve_plan
+from generator import preprocess_data
+
+
+def _forms(data):
+    return [form_id for form_id, _ in document_plan(preprocess_data(data))]
+
+
+def test_default_plan():
+    # 中小企業・事業外訓練（offjt_type=3）・通学制（training_method=1）
+    assert _forms({}) == ["1_1", "1_3", "3_1", "11", "4_2", "5", "6_2", "8_1", "12", "13"]
+
+
+def test_plan_branches():
+    assert _forms({"is_subscription": "yes", "is_sme": "no"}) == [
+        "1_1", "1_3", "3_2", "11", "14_1", "4_2", "5", "6_3", "8_1", "8_5", "12"]
+    assert _forms({"offjt_type": "1", "training_method": "3", "is_voluntary": "yes", "is_batch_application": "yes"}) == [
+        "1_1", "1_3", "3_1", "11", "10", "14_2", "4_2", "6_2", "7", "8_3", "13"]
+    assert _forms({"training_method": "4"})[-4:] == ["6_2", "8_4", "12", "13"]
+
+
+def test_plan_change_uses_form_2_1():
+    forms = _forms({"is_plan_change": "yes"})
+    assert forms[0] == "2_1" and "1_1" not in forms
+    assert dict(document_plan(preprocess_data({"is_plan_change": "yes"})))["2_1"] == DOCUMENT_PATHS["2_1"]
+
+
+def test_plan_args():
+    data = preprocess_data({"offjt_type": "2", "training_method": 4, "company_name": "株式会社テスト"})
+    assert plan_args(data) == (False, False, True, False, False, "2", None)
+    assert plan_args({}) == (False, False, True, False, False, "3", "1")
+
+
+def test_plan_is_memoized():
+    # 書類の選択に関わらない項目だけが違う入力は同じ結果を使い回す
+    first = document_plan(preprocess_data({"company_name": "A", "workers": [{"name": "受講者1"}]}))
+    assert document_plan(preprocess_data({"company_name": "B"})) is first
+    resolve_plan.cache_clear()
+    args = plan_args(preprocess_data({"is_plan_change": "yes"}))
+    assert resolve_plan(*args) is resolve_plan(*args)
+    assert resolve_plan.cache_info()[:2] == (1, 1)
+
+
+def test_plan_endpoint():
+    workers = [{"name": f"受講者{i}"} for i in range(1, 51)]
+    response = app.test_client().post("/plan", json={"is_plan_change": "yes", "workers": workers})
+    assert response.status_code == 200
+    forms = {form["form_id"]: form for form in response.get_json()["forms"]}
+    assert list(forms) == _forms({"is_plan_change": "yes"})
+    assert forms["2_1"]["path"] == DOCUMENT_PATHS["2_1"]
+    # 50人は様式第3-1号（1ページ40人）で2ページ
+    assert (forms["3_1"]["pages"], forms["2_1"]["pages"]) == (2, 1)
@@ -0,0 +1,115 @@
+"""
+生成方式（JINZAI_FILL_ENGINE）の一致
+patch方式（シートXMLの直接書き換え）とopenpyxl方式で、全様式・分岐（form_specs.BRANCH_KEYS）の
+すべての組み合わせについて、出力したシートのセルの値が同じになるか確かめる。
+patch方式で扱えない値（PatchUnsupported）のときは、openpyxl方式で生成し直すことも確かめる。
+"""
+
+import datetime
+import io
+import itertools
+import os
+import sys
+import zipfile
+from xml.etree import ElementTree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tool"))
+
+import pytest
+
+import generator
+from form_specs import BRANCH_KEYS, FORM_SPECS
+from mapping import branch_domains
+from xlsx_patch import PatchUnsupported
+
+MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+# 分岐以外の項目（どの書類にも何かしら書かれるよう、主な欄を埋めておく）
+BASE = {
+    "submit_year": "2026", "submit_month": "4", "submit_day": "1", "app_year": "2026", "app_month": "5",
+    "app_day": "10", "labor_bureau": "東京", "company_name": "株式会社テスト", "company_address": "東京都千代田区1-1",
+    "postal_code_1": "100", "postal_code_2": "0001", "representative_title": "代表取締役",
+    "representative_name": "山田太郎", "has_agent": "yes", "agent_name_org": "社労士法人", "office_name": "本社",
+    "office_number_1": "1301", "office_number_2": "123456", "office_number_3": "7", "total_employees": "50",
+    "course_name": "DX講座", "num_trainees": "3", "plan_receipt_number": "R-1", "instructor_name": "講師A",
+    "training_org_name": "研修会社", "training_start_year": "2026", "training_end_year": "2026",
+    "wage_subsidy_hours": "10", "instructor_fee": "1000", "total_subscribers": "10",
+    "workers": [{"name": f"受講者{i}", "insurance_number": f"1234-{i:06d}-{i % 10}",
+                 "employment_type": "regular" if i % 2 else "contract"} for i in range(1, 6)],
+}
+
+
+def _available(form_id):
+    return os.path.exists(generator.FORM_TEMPLATES[form_id])
+
+
+def _branches(form_id):
+    """様式の手順が区別する分岐の値の組み合わせ（区別しない値・真偽だけを見る項目は両方を含める）"""
+    domains = branch_domains(generator.form_steps(form_id, "patch"), BRANCH_KEYS)
+    keys = sorted(domains)
+    choices = [sorted(domains[key]) + ["other"] if domains[key] else ["yes", ""] for key in keys]
+    for values in itertools.product(*choices):
+        yield dict(zip(keys, values))
+
+
+def _text(element):
+    """文字列の要素（si / is）の本文（ふりがな（rPh）は除く。openpyxlは保存時に落とす）"""
+    return "".join(t.text or "" for t in element.findall(f"{{{MAIN}}}t") + element.findall(f"{{{MAIN}}}r/{{{MAIN}}}t"))
+
+
+def _cells(content, sheet):
+    """シートのセル番地 -> 値（共有文字列とインライン文字列は同じ文字列、数式は ("=", 式) にする）"""
+    with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        names = set(zf.namelist())
+        strings = ([_text(si) for si in ElementTree.fromstring(zf.read("xl/sharedStrings.xml"))]
+                   if "xl/sharedStrings.xml" in names else [])
+        workbook = ElementTree.fromstring(zf.read("xl/workbook.xml"))
+        rels = {rel.get("Id"): rel.get("Target")
+                for rel in ElementTree.fromstring(zf.read("xl/_rels/workbook.xml.rels"))}
+        target = rels[workbook.find(f"{{{MAIN}}}sheets")[sheet].get(f"{{{REL}}}id")].lstrip("/")
+        root = ElementTree.fromstring(zf.read(target if target.startswith("xl/") else f"xl/{target}"))
+    cells = {}
+    for cell in root.iter(f"{{{MAIN}}}c"):
+        kind = cell.get("t")
+        formula = cell.find(f"{{{MAIN}}}f")
+        value = cell.find(f"{{{MAIN}}}v")
+        if formula is not None:
+            cells[cell.get("r")] = ("=", formula.text)
+        elif kind == "inlineStr":
+            cells[cell.get("r")] = _text(cell.find(f"{{{MAIN}}}is"))
+        elif value is None or value.text is None:
+            continue
+        elif kind == "s":
+            cells[cell.get("r")] = strings[int(value.text)]
+        elif kind in ("str", "e"):
+            cells[cell.get("r")] = value.text
+        elif kind == "b":
+            cells[cell.get("r")] = value.text == "1"
+        else:
+            cells[cell.get("r")] = float(value.text)
+    return cells
+
+
+def _render(form_id, data, engine):
+    buffer = io.BytesIO()
+    generator.fill_form(form_id, data, buffer, engine)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("form_id", [form_id for form_id in FORM_SPECS if _available(form_id)])
+def test_engines_match(form_id):
+    sheet = FORM_SPECS[form_id].sheet
+    for branch in _branches(form_id):
+        data = generator.preprocess_data(dict(BASE, **branch))
+        expected = _cells(_render(form_id, data, "openpyxl"), sheet)
+        assert _cells(_render(form_id, data, "patch"), sheet) == expected, branch
+
+
+def test_patch_unsupported_falls_back_to_openpyxl():
+    data = generator.preprocess_data(dict(BASE, office_name=datetime.date(2026, 4, 1)))
+    with pytest.raises(PatchUnsupported):
+        generator.patch_fill(generator.FORM_TEMPLATES["8_3"], generator.form_writes("8_3", data, "patch"),
+                             io.BytesIO())
+    content = _render("8_3", data, "patch")
+    assert _cells(content, 0) == _cells(_render("8_3", data, "openpyxl"), 0)
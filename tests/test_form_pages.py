@@ -0,0 +1,41 @@
+"""
+受講者一覧（様式第3-1号・第3-2号）のページ分け
+1ページに収まらない人数のとき、本紙・継紙のページ欄と No. 欄の通し番号が全ページで正しいか確かめる。
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tool"))
+
+from generator import form_pages, form_writes, preprocess_data
+
+WORKERS = 50
+
+
+def _pages(form_id):
+    data = preprocess_data({"workers": [{"name": f"受講者{i + 1}"} for i in range(WORKERS)]})
+    return [{w.cell: w.value for w in form_writes(form_id, data, "patch", page)}
+            for page in form_pages(form_id, data)]
+
+
+def test_form_3_1_pages():
+    # 1ページ40人（本紙20人・継紙20人）: 50人は2ページ、本紙・継紙を数えて3枚
+    first, second = _pages("3_1")
+    assert (first["V3"], first["Y3"], first["V60"], first["Y60"]) == ("3", "1", "3", "2")
+    assert (second["V3"], second["Y3"]) == ("3", "3")
+    assert "V60" not in second and "Y60" not in second
+    assert (first["A13"], first["A51"], first["A68"], first["A106"]) == (1, 20, 21, 40)
+    assert (second["A13"], second["A15"], second["A51"], second["A68"]) == (41, 42, 60, 61)
+    assert (second["B13"], second["B31"]) == ("受講者41", "受講者50")
+
+
+def test_form_3_2_pages():
+    # 1ページ45人（本紙20人・継紙25人）: 50人は2ページ、本紙・継紙を数えて3枚
+    first, second = _pages("3_2")
+    assert (first["G3"], first["I3"], first["G46"], first["I46"]) == ("3", "1", "3", "2")
+    assert (second["G3"], second["I3"]) == ("3", "3")
+    assert "G46" not in second and "I46" not in second
+    assert (first["A16"], first["A35"], first["A55"], first["A79"]) == (1, 20, 21, 45)
+    assert (second["A16"], second["A20"], second["A55"]) == (46, 50, 66)
+    assert (second["B16"], second["B20"]) == ("受講者46", "受講者50")
@@ -0,0 +1,126 @@
+"""
+非同期ジョブ（jobs）
+メモリとSQLiteの両方の保存先で、ジョブの状態が queued -> running -> done / error と進むこと、
+進捗の記録と古いジョブの削除、/jobs から実際に生成して完了までたどれることを確かめる。
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tool"))
+
+import pytest
+
+import generator
+import jobs
+import workspace
+from app import app
+from jobs import MemoryJobStore, SQLiteJobStore, get_job, submit
+
+
+class _Deferred:
+    """ワーカーに渡したジョブを、テストから順に実行するまで止めておく"""
+
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, func, *args):
+        self.calls.append((func, args))
+
+    def run(self):
+        for func, args in self.calls:
+            func(*args)
+        self.calls.clear()
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path, monkeypatch):
+    store = MemoryJobStore() if request.param == "memory" else SQLiteJobStore(str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(jobs, "store", store)
+    return store
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    deferred = _Deferred()
+    monkeypatch.setattr(jobs, "_get_executor", lambda: deferred)
+    return deferred
+
+
+def test_job_runs_to_done(store, worker):
+    seen = []
+
+    def work(job_id, count, progress):
+        seen.append(get_job(job_id)["status"])
+        for done in range(1, count + 1):
+            progress(done, count)
+        return {"count": count}
+
+    job_id = submit("generate", work, 3)
+    job = get_job(job_id)
+    assert (job["id"], job["kind"], job["status"], job["done"], job["total"]) == (job_id, "generate", "queued", 0, None)
+
+    worker.run()
+    job = get_job(job_id)
+    assert seen == ["running"]
+    assert (job["status"], job["done"], job["total"], job["result"], job["error"]) == ("done", 3, 3, {"count": 3}, None)
+    assert job["updated"] >= job["created"]
+
+
+def test_job_error(store, worker):
+    def work(job_id, progress):
+        progress(1)
+        raise ValueError("テンプレートが見つかりません")
+
+    job_id = submit("batch", work, total=2)
+    worker.run()
+    job = get_job(job_id)
+    assert (job["status"], job["done"], job["total"], job["result"]) == ("error", 1, 2, None)
+    assert job["error"] == "テンプレートが見つかりません"
+    assert "ValueError" in job["trace"]
+
+
+def test_store_get_update_prune(store):
+    now = time.time()
+    store.put({"id": "old", "status": "done", "created": now - 7200, "updated": now - 7200})
+    store.put({"id": "new", "status": "queued", "created": now, "updated": now})
+    job = store.get("new")
+    job["status"] = "changed"
+    assert store.get("new")["status"] == "queued"
+    store.update("new", status="running")
+    store.update("missing", status="running")
+    assert store.get("new")["status"] == "running"
+    assert store.get("missing") is None
+
+    store.prune(3600)
+    assert store.get("old") is None
+    assert store.get("new")["status"] == "running"
+
+
+def test_sqlite_store_is_shared(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    SQLiteJobStore(path).put({"id": "a", "status": "queued", "updated": time.time()})
+    other = SQLiteJobStore(path)
+    other.update("a", status="done", result={"files": ["様式第1-1号.xlsx"]})
+    assert SQLiteJobStore(path).get("a")["result"] == {"files": ["様式第1-1号.xlsx"]}
+
+
+def test_jobs_endpoint(tmp_path, monkeypatch):
+    # 実際のワーカーで書類を生成し、/jobs/<id> で完了を確かめる
+    monkeypatch.setattr(jobs, "store", MemoryJobStore())
+    monkeypatch.setattr(workspace, "OUTPUT_ROOT", str(tmp_path))
+    monkeypatch.setattr(generator, "FILL_ENGINE", "patch")
+    client = app.test_client()
+    response = client.post("/jobs", json={"is_subscription": "yes", "company_name": "株式会社テスト",
+                                          "workers": [{"name": "受講者1"}]})
+    assert response.status_code == 202
+    status_url = response.get_json()["status_url"]
+    deadline = time.monotonic() + 60
+    job = client.get(status_url).get_json()
+    while job["status"] in ("queued", "running") and time.monotonic() < deadline:
+        time.sleep(0.05)
+        job = client.get(status_url).get_json()
+    assert job["status"] == "done", job.get("error")
+    assert client.get(job["result"]["download_url"]).status_code == 200
+    assert client.get("/jobs/" + "0" * 32).status_code == 404
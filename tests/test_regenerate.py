@@ -0,0 +1,64 @@
+"""
+入力を直したときの作り直し（generator.changed_forms / regenerate_documents）
+直した項目を読む書類だけが作り直され、それ以外は前回の結果をそのまま使うこと、
+書類の選択が変わって増えた書類も作られることを確かめる。
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tool"))
+
+import pytest
+
+import generator
+import result_cache
+from generator import changed_forms, preprocess_data, regenerate_documents, render_documents
+
+# 定額制（様式第6-2号のテンプレートを使わない書類の組み合わせ）
+BASE = {"is_subscription": "yes", "company_name": "株式会社テスト", "office_name": "本社", "total_employees": "50",
+        "course_name": "DX講座", "submit_year": "2026", "submit_month": "4", "submit_day": "1",
+        "workers": [{"name": f"受講者{i}"} for i in range(1, 4)]}
+
+
+@pytest.fixture(autouse=True)
+def fresh_forms(monkeypatch):
+    # 前のテストの書類をキャッシュから返さない（テンプレートの解析を待たないようpatch方式で生成する）
+    monkeypatch.setattr(generator, "FILL_ENGINE", "patch")
+    monkeypatch.setattr(result_cache, "form_cache", result_cache.LRUBytesCache())
+
+
+def test_changed_forms():
+    prev = preprocess_data(BASE)
+    assert changed_forms(prev, preprocess_data(BASE)) == []
+    assert changed_forms(prev, preprocess_data(dict(BASE, total_employees="60"))) == ["4_2", "13"]
+    assert changed_forms(prev, preprocess_data(dict(BASE, total_employees="60")), ["8_3", "13"]) == ["13"]
+    workers = changed_forms(prev, preprocess_data(dict(BASE, workers=BASE["workers"][:2])))
+    assert workers == ["3_1", "3_2", "5"]
+
+
+def test_regenerate_only_changed_forms():
+    prev = preprocess_data(BASE)
+    previous = dict(render_documents(prev))
+    new = preprocess_data(dict(BASE, total_employees="60"))
+
+    documents, rebuilt = regenerate_documents(prev, new, previous)
+    assert rebuilt == ["4_2", "13"]
+    assert [arcname for arcname, _ in documents] == list(previous)
+    expected = dict(render_documents(new))
+    for arcname, content in documents:
+        if "4-2" in arcname or "第13号" in arcname:
+            assert content != previous[arcname]
+            assert content == expected[arcname]
+        else:
+            assert content is previous[arcname]
+
+
+def test_regenerate_adds_new_documents():
+    # 自発的職業能力開発にすると様式第7号が増える（様式第7号はこの項目を読まないが、前回の結果にない）
+    prev = preprocess_data(BASE)
+    previous = dict(render_documents(prev))
+    documents, rebuilt = regenerate_documents(prev, preprocess_data(dict(BASE, is_voluntary="yes")), previous)
+    assert rebuilt == ["7"]
+    added = [arcname for arcname, _ in documents if arcname not in previous]
+    assert len(added) == 1 and "第7号" in added[0]
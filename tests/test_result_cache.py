@@ -0,0 +1,83 @@
+"""
+生成結果のキャッシュ（result_cache）
+LRUの追い出しの順序と上限、書類ごとのキーが依存する入力項目だけで決まること、
+一部の項目を直して生成し直したときに、その項目を読まない書類はキャッシュから返ることを確かめる。
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tool"))
+
+import pytest
+
+import generator
+import result_cache
+from result_cache import LRUBytesCache, form_digest, payload_digest
+
+BASE = {"office_name": "本社", "company_name": "株式会社テスト", "total_employees": "50",
+        "training_start_year": "2026", "training_end_year": "2026", "app_year": "2026"}
+
+
+@pytest.fixture
+def form_cache(monkeypatch):
+    cache = LRUBytesCache()
+    monkeypatch.setattr(result_cache, "form_cache", cache)
+    return cache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUBytesCache(max_bytes=1000, max_entries=2)
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    assert cache.get("a") == b"1"
+    cache.put("c", b"3")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (b"1", b"3")
+    assert cache.stats() == {"entries": 2, "bytes": 2, "hits": 3, "misses": 1}
+
+
+def test_lru_byte_limit():
+    cache = LRUBytesCache(max_bytes=10, max_entries=10)
+    cache.put("a", b"x" * 4)
+    cache.put("b", b"x" * 4)
+    # 置き換えは古い値の分を差し引く
+    cache.put("a", b"x" * 5)
+    assert cache.stats()["bytes"] == 9
+    cache.put("c", b"x" * 4)
+    assert (cache.get("b"), cache.get("a")) == (None, b"x" * 5)
+    # 上限より大きい値は入れない
+    cache.put("d", b"x" * 11)
+    assert cache.get("d") is None
+    assert cache.stats()["entries"] == 2
+
+
+def test_form_digest_depends_only_on_form_inputs():
+    data = generator.preprocess_data(BASE)
+    keys = generator.form_inputs("8_3")
+    assert "total_employees" not in keys and "office_name" in keys
+    assert form_digest(keys, data) == form_digest(keys, generator.preprocess_data(dict(BASE, total_employees="60")))
+    assert form_digest(keys, data) != form_digest(keys, generator.preprocess_data(dict(BASE, office_name="支社")))
+    # 項目がないこととNoneは区別する
+    assert form_digest(("a",), {}) != form_digest(("a",), {"a": None})
+    # 入力項目が分からない書類は入力全体
+    assert form_digest(None, data) == payload_digest(data)
+    assert payload_digest({"a": 1, "b": 2}) == payload_digest({"b": 2, "a": 1})
+
+
+def test_unchanged_forms_hit_after_edit(form_cache):
+    data = generator.preprocess_data(BASE)
+    first = list(generator.iter_rendered_forms(["8_3", "13"], data, workers=1))
+    assert form_cache.stats()["entries"] == 2
+
+    # 様式第13号だけが読む項目を直す: 8-3はキャッシュから、13は作り直す
+    edited = generator.preprocess_data(dict(BASE, total_employees="60"))
+    second = list(generator.iter_rendered_forms(["8_3", "13"], edited, workers=1))
+    assert second[0] == first[0]
+    assert second[1] != first[1]
+    stats = form_cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (3, 1, 3)
+
+    # 元の入力に戻せば両方ともキャッシュから返る
+    assert list(generator.iter_rendered_forms(["8_3", "13"], data, workers=1)) == first
+    assert form_cache.stats()["hits"] == 3
@@ -0,0 +1,116 @@
+"""
+対象労働者名簿の読み込み（roster.read_roster）
+CSV（UTF-8・Shift_JIS）とExcelの名簿から受講者データを作ること、不備のある行の報告、
+行数とエラー件数の上限（不備のある行も行数に数える）を確かめる。
+"""
+
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tool"))
+
+import pytest
+from openpyxl import Workbook
+
+import roster
+from app import app
+from roster import RosterError, flat_worker_records, read_roster
+
+CSV = """\ufeff氏名,フリガナ,雇用保険被保険者番号,雇用形態
+
+山田 太郎,ヤマダ タロウ,1234-567890-1,正社員
+鈴木花子,スズキハナコ,12345678901,有期契約
+,ナナシ,1234-567890-1,正規
+佐藤次郎,サトウジロウ,1234-5678,regular
+高橋三郎,タカハシサブロウ,,派遣
+"""
+
+
+def _csv(text, encoding="utf-8"):
+    return io.BytesIO(text.encode(encoding))
+
+
+def _xlsx(rows):
+    wb = Workbook()
+    for row in rows:
+        wb.active.append(row)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def test_read_csv():
+    workers, errors = read_roster(_csv(CSV), "roster.csv")
+    assert [(w["name"], w["insurance_number"], w["employment_type"]) for w in workers] == [
+        ("山田 太郎", "1234-567890-1", "regular"), ("鈴木花子", "1234-567890-1", "contract")]
+    assert (workers[1]["insurance_1"], workers[1]["insurance_2"], workers[1]["insurance_3"]) == ("1234", "567890", "1")
+    # 行番号は空行も含めたファイルの行
+    assert errors == [
+        {"line": 5, "errors": ["氏名がありません"]},
+        {"line": 6, "errors": ["雇用保険被保険者番号は4桁-6桁-1桁の数字で入力してください"]},
+        {"line": 7, "errors": ["雇用形態が不明です: 派遣"]},
+    ]
+
+
+def test_read_cp932_csv():
+    workers, errors = read_roster(_csv(CSV.lstrip("\ufeff"), "cp932"), "ROSTER.CSV")
+    assert [w["name"] for w in workers] == ["山田 太郎", "鈴木花子"]
+    assert len(errors) == 3
+
+
+def test_read_xlsx():
+    stream = _xlsx([
+        ("No.", "対象労働者名", "被保険者番号1", "被保険者番号2", "被保険者番号3", "雇用形態"),
+        (1, "山田太郎", 12, 34567, 1, "正規雇用"),
+        (None, None, None, None, None, None),
+        (2, "ＳＡＴＯ　ＪＩＲＯ", "0012", "034567", "1", None),
+        (3, "鈴木花子", 1234, 567890, None, "契約社員"),
+    ])
+    workers, errors = read_roster(stream, "roster.xlsx")
+    # Excelで数値になった番号は桁数まで0埋めし、全角は半角にそろえる
+    assert [(w["name"], w["insurance_number"], w["employment_type"]) for w in workers] == [
+        ("山田太郎", "0012-034567-1", "regular"), ("SATO JIRO", "0012-034567-1", "regular")]
+    assert errors == [{"line": 5, "errors": ["雇用保険被保険者番号は4桁-6桁-1桁の数字で入力してください"]}]
+
+
+def test_missing_header_or_empty():
+    with pytest.raises(RosterError, match="氏名"):
+        read_roster(_csv("番号,部署\n1,営業\n"), "roster.csv")
+    with pytest.raises(RosterError, match="空"):
+        read_roster(_csv("\n,,\n"), "roster.csv")
+    with pytest.raises(RosterError, match="氏名"):
+        read_roster(_xlsx([("番号",), (1,)]), "roster.xlsx")
+
+
+def test_max_rows_counts_invalid_rows():
+    # データ行は5行（うち3行は不備）。見出しと空行は数えない
+    assert len(read_roster(_csv(CSV), "roster.csv", max_rows=5)[0]) == 2
+    with pytest.raises(RosterError, match="4行"):
+        read_roster(_csv(CSV), "roster.csv", max_rows=4)
+    with pytest.raises(RosterError, match="2行"):
+        read_roster(_xlsx([("氏名", "部署")] + [(None, "営業")] * 3), "roster.xlsx", max_rows=2)
+
+
+def test_max_errors(monkeypatch):
+    monkeypatch.setattr(roster, "ROSTER_MAX_ERRORS", 2)
+    workers, errors = read_roster(_csv(CSV), "roster.csv")
+    assert len(workers) == 2
+    assert [error["line"] for error in errors] == [5, 6]
+
+
+def test_flat_worker_records():
+    data = {"worker_10_name": "C", "worker_2_name": "B", "worker_1_name": "A", "worker_2_type": "contract",
+            "company_name": "株式会社テスト"}
+    assert flat_worker_records(data) == [{"name": "A"}, {"name": "B", "type": "contract"}, {"name": "C"}]
+
+
+def test_roster_endpoint():
+    client = app.test_client()
+    response = client.post("/roster", data={"file": (_csv(CSV), "roster.csv")}, content_type="multipart/form-data")
+    body = response.get_json()
+    assert (response.status_code, body["count"], len(body["errors"])) == (200, 2, 3)
+    response = client.post("/roster", data={"file": (_csv("部署\n営業\n"), "roster.csv")},
+                           content_type="multipart/form-data")
+    assert response.status_code == 400
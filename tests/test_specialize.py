@@ -0,0 +1,80 @@
+"""
+分岐ごとのテンプレートの変種（mapping.specialize）
+分岐の値で決まる書き込みを焼き込んだ後に残りの手順を書いた結果が、
+全様式・分岐（form_specs.BRANCH_KEYS）の組み合わせで evaluate と同じになるか確かめる。
+"""
+
+import itertools
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tool"))
+
+import pytest
+
+import generator
+from form_specs import BRANCH_KEYS, FORM_SPECS
+from mapping import (CHECKED, Check, Choice, Const, Field, Form, OneOf, Write, When, branch_domains, branch_of,
+                     compile_form, evaluate, specialize)
+
+BASE = {"company_name": "株式会社テスト", "office_name": "本社", "course_name": "DX講座", "submit_year": "2026",
+        "has_agent": "yes", "workers": [{"name": f"受講者{i}"} for i in range(1, 4)]}
+# 項目を入れない（既定値を使う）分岐
+UNSET = object()
+
+
+def _cells(writes):
+    """書き込み計画を順に反映した結果（後の書き込みが勝つ）"""
+    return {write.cell: (write.value, write.safe) for write in writes}
+
+
+def _specialized(steps, data, sheet=0):
+    baked, remaining = specialize(steps, branch_of(branch_domains(steps, BRANCH_KEYS), data), sheet)
+    return baked, evaluate(remaining, data, sheet)
+
+
+def test_specialize_bakes_branch_constants():
+    steps = compile_form(Form("t", [
+        When(OneOf("offjt_type", ("3",)), [Check("A1")], [Const("A2", "事業内")]),
+        Choice("training_method", {"1": "B1", "2": "B2"}, otherwise="B3"),
+        When(OneOf("offjt_type", ("3",)), [Field("C1", "course_name")]),
+    ]), {})
+    data = {"offjt_type": "3", "training_method": "2", "course_name": "DX講座"}
+    baked, writes = _specialized(steps, data)
+    assert baked == [Write(0, "A1", CHECKED, False), Write(0, "B2", CHECKED, False)]
+    assert writes == [Write(0, "C1", "DX講座", False)]
+    # 手順が区別しない値は「その他」としてまとめる
+    baked, writes = _specialized(steps, dict(data, offjt_type="9", training_method="9"))
+    assert baked == [Write(0, "A2", "事業内", False), Write(0, "B3", CHECKED, False)]
+    assert writes == []
+
+
+def test_specialize_keeps_later_writes_last():
+    # 前の手順が書きうるセルへの定数は焼き込まない（焼き込みは先に反映されるので、後勝ちが逆になる）
+    steps = compile_form(Form("t", [Field("A1", "note"), Check("A1"), Check("A2")]), {})
+    baked, writes = _specialized(steps, {"note": "メモ"})
+    assert baked == [Write(0, "A2", CHECKED, False)]
+    assert _cells(baked + writes) == _cells(evaluate(steps, {"note": "メモ"}))
+
+
+def _branches(steps):
+    """手順が区別する分岐の値と、区別しない値・項目なしの組み合わせ"""
+    domains = branch_domains(steps, BRANCH_KEYS)
+    keys = sorted(domains)
+    choices = [sorted(domains[key]) + ["other", UNSET] if domains[key] else ["yes", "", UNSET] for key in keys]
+    for values in itertools.product(*choices):
+        yield {key: value for key, value in zip(keys, values) if value is not UNSET}
+
+
+@pytest.mark.parametrize("form_id", [form_id for form_id in FORM_SPECS
+                                     if os.path.exists(generator.FORM_TEMPLATES[form_id])])
+def test_variants_match_evaluate(form_id):
+    steps = generator.form_steps(form_id, "patch")
+    sheet = FORM_SPECS[form_id].sheet
+    for branch in _branches(steps):
+        data = generator.preprocess_data(dict(BASE, **branch))
+        expected = _cells(evaluate(steps, data, sheet))
+        baked, writes = _specialized(steps, data, sheet)
+        assert _cells(baked + writes) == expected, branch
+        variant, writes = generator.form_variant_writes(form_id, data)
+        assert _cells(list(variant[1] if variant else ()) + writes) == expected, branch
@@ -0,0 +1,56 @@
+"""
+テンプレートの登録簿（template_registry）の書き込み先の確認
+セル番地の書式、結合セルの左上以外への書き込み、同じセルに入る2つの項目を問題として見つけ、
+シートの使用範囲の外は警告だけにするか確かめる。
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tool"))
+
+from mapping import Check, Choice, Field, OneOf, When, ops_targets
+from template_registry import _cell_problem, _cell_warning, _collisions, _dimension_bounds, load_registry
+
+BOUNDS = _dimension_bounds("A1:AM108")
+MERGE_INDEX = {"C8": "C8", "D8": "C8", "K8": "C8"}
+
+
+def test_cell_problem():
+    assert _cell_problem("C8", MERGE_INDEX) is None
+    assert "不正" in _cell_problem("c8", MERGE_INDEX)
+    assert "C8" in _cell_problem("K8", MERGE_INDEX)
+    # シートを読めなかったときは番地の書式だけを確かめる
+    assert _cell_problem("K8") is None
+
+
+def test_cell_outside_dimension_is_warning():
+    assert _cell_warning("AM108", BOUNDS) is None
+    assert "使用範囲" in _cell_warning("AN1", BOUNDS)
+    assert "使用範囲" in _cell_warning("A109", BOUNDS)
+    # <dimension> がないときは確かめない
+    assert _cell_warning("A109", None) is None
+    assert _cell_problem("A109", MERGE_INDEX) is None
+
+
+def test_collisions():
+    def collisions(ops):
+        return _collisions(list(ops_targets(ops)), MERGE_INDEX)
+
+    # 結合セルの左上に解決されて重なる
+    assert collisions([Field("C8", "a"), Field("C8", "b")])
+    # 条件の両側・重ならない OneOf・選択肢の別の値は同時に書かれない
+    assert not collisions([When(OneOf("t", ("1",)), [Field("C8", "a")], [Field("C8", "b")])])
+    assert not collisions([When(OneOf("t", ("1",), "3"), [Field("C8", "a")]),
+                           When(OneOf("t", ("2",), "3"), [Field("C8", "b")])])
+    assert collisions([When(OneOf("t", ("1", "2"), "3"), [Field("C8", "a")]),
+                       When(OneOf("t", ("2",), "3"), [Field("C8", "b")])])
+    assert not collisions([Choice("t", {"1": "C8", "2": "E8"}, otherwise="F8")])
+    assert collisions([Choice("t", {"1": "C8"}), Check("C8")])
+
+
+def test_mapped_cells_match_templates():
+    # テンプレートがある様式は、対応表の書き込み先がすべてシートに合っている
+    problems = [problem for info in load_registry(strict=False).values() if info.sha256
+                for problem in info.problems]
+    assert problems == []
@@ -0,0 +1,61 @@
+"""
+ワークスペースの掃除（workspace.cleanup_workspaces）
+期限切れの削除、合計サイズの超過での古い順の削除と、生成中・作成直後のものを残すことを確かめる。
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tool"))
+
+import pytest
+
+import workspace
+from workspace import cleanup_workspaces, in_use
+
+NOW = 1_000_000.0
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    monkeypatch.setattr(workspace, "OUTPUT_ROOT", str(tmp_path))
+    return tmp_path
+
+
+def _workspace(root, index, age, size=100):
+    """age秒前に更新した、sizeバイトのファイルを1つ持つワークスペースを作ってジョブIDを返す"""
+    job_id = f"{index:032x}"
+    path = root / job_id
+    path.mkdir()
+    (path / "out.zip").write_bytes(b"x" * size)
+    os.utime(path, (NOW - age, NOW - age))
+    return job_id
+
+
+def test_expired_workspaces_are_removed(root):
+    old = _workspace(root, 1, age=7200)
+    new = _workspace(root, 2, age=60)
+    (root / "not-a-job").mkdir()
+    assert cleanup_workspaces(max_age=3600, max_bytes=10 ** 9, now=NOW) == [old]
+    assert sorted(os.listdir(root)) == [new, "not-a-job"]
+
+
+def test_size_limit_removes_oldest_first(root):
+    oldest = _workspace(root, 1, age=3000)
+    older = _workspace(root, 2, age=2000)
+    newer = _workspace(root, 3, age=1000)
+    removed = cleanup_workspaces(max_age=3600, max_bytes=150, now=NOW, min_age=300)
+    assert removed == [oldest, older]
+    assert os.listdir(root) == [newer]
+
+
+def test_size_limit_keeps_busy_and_recent_workspaces(root):
+    busy = _workspace(root, 1, age=7200)
+    idle = _workspace(root, 2, age=2000)
+    recent = _workspace(root, 3, age=60)
+    with in_use(busy):
+        removed = cleanup_workspaces(max_age=3600, max_bytes=0, now=NOW, min_age=300)
+    assert removed == [idle]
+    assert sorted(os.listdir(root)) == sorted([busy, recent])
+    # 生成が終われば期限切れとして消える
+    assert cleanup_workspaces(max_age=3600, max_bytes=10 ** 9, now=NOW) == [busy]
@@ -3,14 +3,27 @@
 質問に答えるだけで全書類が完成するWebアプリケーション
 """
 
+import json
 import os
 import sys
+import time
+from urllib.parse import quote
 
 # Vercel環境ではプロジェクトルートをパスに追加
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from flask import Flask, render_template, request, jsonify, send_file, Response
-from generator import generate_all_documents
+from flask import Flask, g, render_template, request, jsonify, send_file, Response, stream_with_context
+from form_specs import FORM_SPECS
+from generator import (ZIP_NAME, build_document_plan, form_pages, generate_all_documents, iter_documents_zip,
+                       preprocess_data, preview_documents)
+from workspace import create_workspace, in_use, new_job_id, workspace_path
+from batch import BATCH_ZIP_NAME, generate_batch, parse_payloads
+from jobs import get_job, submit
+from archive import ZipStats
+from roster import RosterError, read_roster
+from template_registry import TemplateUnavailable, load_registry
+from timing import (METRICS_ENABLED, observe_request, render_metrics, server_timing, stage, start_recording,
+                    stop_recording)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'jinzai-kaihatsu-joseikin-tool-2026'
@@ -23,25 +36,162 @@ def index():
     return render_template('index.html')
 
 
+if METRICS_ENABLED:
+    # 計測（JINZAI_METRICS=1 のときだけ登録する。無効なら各リクエストの処理には何も足さない）
+    @app.before_request
+    def _start_timing():
+        g.timing_start = time.perf_counter()
+        g.timing_totals, g.timing_previous = start_recording()
+
+    @app.after_request
+    def _add_server_timing(response):
+        """Server-Timing ヘッダーを付け、リクエストの処理時間を記録する
+
+        生成しながら返すレスポンス（/generate_and_download。send_file は除く）では、ヘッダーは
+        最初のチャンクまでの時間しか含まない（partial と示す）。処理時間は送り終えて閉じたときに記録する。
+        """
+        start = g.pop("timing_start", None)
+        if start is None:
+            return response
+        rule = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        status = response.status_code
+        elapsed = time.perf_counter() - start
+        streamed = response.is_streamed and not response.direct_passthrough
+        response.headers["Server-Timing"] = server_timing(g.timing_totals, elapsed, partial=streamed)
+        if streamed:
+            response.call_on_close(lambda: observe_request(rule, status, time.perf_counter() - start))
+        else:
+            observe_request(rule, status, elapsed)
+        return response
+
+    @app.teardown_request
+    def _stop_timing(exc):
+        if "timing_previous" in g:
+            stop_recording(g.pop("timing_previous"))
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheusのテキスト形式のメトリクス（JINZAI_METRICS=1 のときのみ）"""
+    if not METRICS_ENABLED:
+        return "メトリクスは無効です（JINZAI_METRICS=1 で有効になります）", 404
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+class InvalidRequest(Exception):
+    """入力データに問題がある（400で返す）"""
+
+    def __init__(self, body):
+        super().__init__(body.get("error"))
+        self.body = body
+
+
+def _request_data():
+    """リクエストの入力データ
+
+    JSON本文のほか、マルチパート（data欄に入力データのJSON、roster欄に名簿ファイル）を受け付ける。
+    名簿ファイルを添付した場合は、その受講者で workers を置き換える。
+    """
+    with stage("parse"):
+        upload = request.files.get("roster")
+        if upload is None:
+            data = request.get_json(silent=True)
+        else:
+            try:
+                data = json.loads(request.form.get("data") or "{}")
+            except json.JSONDecodeError as e:
+                raise InvalidRequest({"error": f"入力データを読み込めません: {e}"})
+            if isinstance(data, dict):
+                data["workers"] = _read_roster_upload(upload)
+    if not data or not isinstance(data, dict):
+        raise InvalidRequest({"error": "データが送信されていません"})
+    return data
+
+
+def _read_roster_upload(upload):
+    try:
+        workers, errors = read_roster(upload.stream, upload.filename or "")
+    except (RosterError, ValueError, OSError) as e:
+        raise InvalidRequest({"error": f"名簿を読み込めません: {e}"})
+    if errors:
+        raise InvalidRequest({"error": "名簿に不備のある行があります", "rows": errors})
+    return workers
+
+
+@app.errorhandler(InvalidRequest)
+def invalid_request(e):
+    return jsonify(e.body), 400
+
+
+@app.route('/roster', methods=['POST'])
+def import_roster():
+    """名簿ファイル（CSV / Excel）を読み込み、受講者データと行ごとのエラーを返す
+
+    返した workers はそのまま入力データの workers 配列として /generate 等に渡せる。
+    """
+    upload = request.files.get("file") or request.files.get("roster")
+    if upload is None:
+        return jsonify({"error": "名簿ファイルが送信されていません"}), 400
+    try:
+        with stage("parse"):
+            workers, errors = read_roster(upload.stream, upload.filename or "")
+    except (RosterError, ValueError, OSError) as e:
+        return jsonify({"error": f"名簿を読み込めません: {e}"}), 400
+    return jsonify({"success": True, "count": len(workers), "workers": workers, "errors": errors})
+
+
+@app.route('/plan', methods=['POST'])
+def plan():
+    """入力に対して生成される書類の一覧（様式ID、名前、ZIP内のパス、ページ数）を返す"""
+    data = _request_data()
+    with stage("preprocess"):
+        processed = preprocess_data(data)
+    forms = [{"form_id": form_id, "title": FORM_SPECS[form_id].title, "path": path,
+              "pages": len(form_pages(form_id, processed))}
+             for form_id, path in build_document_plan(processed)]
+    return jsonify({"success": True, "forms": forms})
+
+
+@app.route('/preview', methods=['POST'])
+def preview():
+    """生成される書類と、各書類のどのセルに何を書くかをJSONで返す（ブックは作らない）
+
+    確認画面から入力の変更ごとに呼べるよう、ファイルの生成もopenpyxlも使わない。
+    """
+    data = _request_data()
+    with stage("preprocess"):
+        processed = preprocess_data(data)
+    with stage("preview"):
+        documents = preview_documents(processed)
+    return jsonify({"success": True, "documents": documents})
+
+
 @app.route('/generate', methods=['POST'])
 def generate():
+    data = _request_data()
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "データが送信されていません"}), 400
-
         # データの前処理
-        processed = preprocess_data(data)
+        with stage("preprocess"):
+            processed = preprocess_data(data)
 
-        # 全書類を生成
-        zip_path, files = generate_all_documents(processed)
+        # 全書類をジョブ専用のワークスペースに生成（生成中は掃除で消さない）
+        job_id = new_job_id()
+        zip_stats = ZipStats()
+        with in_use(job_id):
+            _, output_dir = create_workspace(job_id)
+            zip_path, files = generate_all_documents(processed, output_dir=output_dir, zip_stats=zip_stats)
 
         return jsonify({
             "success": True,
+            "job_id": job_id,
+            "download_url": f"/download/{job_id}",
             "zip_path": zip_path,
             "files": [os.path.basename(f) for f in files],
+            "zip": zip_stats.as_dict(),
             "message": f"{len(files)}件の書類を生成しました"
         })
+    except TemplateUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         import traceback
         return jsonify({"error": str(e), "trace": traceback.format_exc()}), 500
@@ -49,81 +199,128 @@ def generate():
 
 @app.route('/generate_and_download', methods=['POST'])
 def generate_and_download():
-    """生成とダウンロードを1リクエストで完結（Vercel serverless対応）"""
+    """生成とダウンロードを1リクエストで完結（Vercel serverless対応）
+
+    ディスクを使わずメモリ上でZIPを組み立て、書類ができた順にストリーミングする。
+    """
+    data = _request_data()
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "データが送信されていません"}), 400
+        with stage("preprocess"):
+            processed = preprocess_data(data)
+        chunks = iter_documents_zip(processed)
+        # 最初の書類までは先に生成し、エラーなら通常の500応答を返す
+        first = next(chunks)
 
-        processed = preprocess_data(data)
-        zip_path, files = generate_all_documents(processed)
+        def stream():
+            yield first
+            yield from chunks
 
-        return send_file(zip_path, as_attachment=True,
-                        download_name="人材開発支援助成金_申請書類一式.zip",
-                        mimetype="application/zip")
+        return Response(stream_with_context(stream()), mimetype="application/zip", headers={
+            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(ZIP_NAME)}",
+        })
+    except TemplateUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         import traceback
         return jsonify({"error": str(e), "trace": traceback.format_exc()}), 500
 
 
-@app.route('/download')
-def download():
-    # Vercel環境では/tmpから配信
-    if os.environ.get("VERCEL"):
-        zip_path = "/tmp/jinzai_output/人材開発支援助成金_申請書類一式.zip"
-    else:
-        zip_path = os.path.join(BASE_DIR, "tool", "output", "人材開発支援助成金_申請書類一式.zip")
+@app.route('/download/<job_id>')
+def download(job_id):
+    """/generate で作ったジョブのZIPを配信する"""
+    output_dir = workspace_path(job_id)
+    if output_dir is None:
+        return "ファイルが見つかりません", 404
 
+    zip_path = os.path.join(output_dir, ZIP_NAME)
     if os.path.exists(zip_path):
-        return send_file(zip_path, as_attachment=True,
-                        download_name="人材開発支援助成金_申請書類一式.zip")
+        return send_file(zip_path, as_attachment=True, download_name=ZIP_NAME)
     return "ファイルが見つかりません", 404
 
 
-def preprocess_data(data):
-    """フォームデータを各書類生成関数が使いやすい形に変換"""
-    processed = dict(data)
-
-    # 労働者データの整形
-    workers = []
-    i = 1
-    while f"worker_{i}_name" in data:
-        worker = {
-            "name": data.get(f"worker_{i}_name", ""),
-            "name_kana": data.get(f"worker_{i}_name_kana", ""),
-            "insurance_1": data.get(f"worker_{i}_insurance_1", ""),
-            "insurance_2": data.get(f"worker_{i}_insurance_2", ""),
-            "insurance_3": data.get(f"worker_{i}_insurance_3", ""),
-            "insurance_number": f"{data.get(f'worker_{i}_insurance_1', '')}-{data.get(f'worker_{i}_insurance_2', '')}-{data.get(f'worker_{i}_insurance_3', '')}",
-            "employment_type": data.get(f"worker_{i}_type", "regular"),
-        }
-        if worker["name"]:
-            workers.append(worker)
-        i += 1
-    processed["workers"] = workers
-
-    # bool変換
-    processed["has_agent"] = data.get("has_agent") == "yes"
-    processed["is_subscription"] = data.get("is_subscription") == "yes"
-    processed["has_exam"] = data.get("has_exam") == "yes"
-    processed["auto_renewal"] = data.get("auto_renewal") == "yes"
-    processed["is_sme"] = data.get("is_sme", "yes") == "yes"
-    processed["is_voluntary"] = data.get("is_voluntary") == "yes"
-    processed["is_batch_application"] = data.get("is_batch_application") == "yes"
-
-    # 支給申請の日付（計画届と同じにデフォルト設定）
-    if not processed.get("app_year"):
-        processed["app_year"] = processed.get("submit_year")
-        processed["app_month"] = processed.get("submit_month")
-        processed["app_day"] = processed.get("submit_day")
-
-    # 証明日付（提出日と同じにデフォルト設定）
-    if not processed.get("cert_year"):
-        processed["cert_year"] = processed.get("submit_year")
-        processed["cert_month"] = processed.get("submit_month")
-        processed["cert_day"] = processed.get("submit_day")
-
-    return processed
+def _generation_job(job_id, data, progress):
+    """非同期ジョブ: 1事業主分の書類一式をジョブのワークスペースに生成する"""
+    _, output_dir = create_workspace(job_id)
+    zip_stats = ZipStats()
+    zip_path, files = generate_all_documents(preprocess_data(data), output_dir=output_dir, zip_stats=zip_stats)
+    return {
+        "files": [os.path.basename(f) for f in files],
+        "zip": zip_stats.as_dict(),
+        "message": f"{len(files)}件の書類を生成しました",
+        "download_url": f"/download/{job_id}",
+    }
+
+
+def _batch_job(job_id, payloads, progress):
+    """非同期ジョブ: 複数事業主の書類をまとめて生成する"""
+    _, output_dir = create_workspace(job_id)
+    zip_stats = ZipStats()
+    errors = generate_batch(payloads, os.path.join(output_dir, BATCH_ZIP_NAME), progress=progress,
+                            zip_stats=zip_stats)
+    return {
+        "errors": [{"folder": folder, "error": message} for folder, message in errors],
+        "zip": zip_stats.as_dict(),
+        "download_url": f"/batch/{job_id}/download",
+    }
+
+
+def _job_response(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "ジョブが見つかりません"}), 404
+    return jsonify(job)
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """書類生成を非同期ジョブとして登録し、すぐにジョブIDを返す（/jobs/<id> で状態を確認）"""
+    data = _request_data()
+    job_id = submit("generate", _generation_job, data)
+    return jsonify({"success": True, "job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    return _job_response(job_id)
+
+
+@app.route('/batch', methods=['POST'])
+def batch_generate():
+    """複数事業主の書類を一括生成する（非同期ジョブとして実行し、/batch/<id> で進捗を返す）
+
+    JSON配列、{"applicants": [...]}、またはファイル（JSONL / CSV / JSON）を受け付ける。
+    """
+    try:
+        upload = request.files.get("file")
+        if upload is not None:
+            payloads = parse_payloads(upload.read(), upload.filename or "")
+        else:
+            payloads = parse_payloads(request.get_data())
+    except ValueError as e:
+        raise InvalidRequest({"error": f"バッチデータを読み込めません: {e}"})
+    if not payloads:
+        raise InvalidRequest({"error": "データが送信されていません"})
+
+    batch_id = submit("batch", _batch_job, payloads, total=len(payloads))
+    return jsonify({"success": True, "batch_id": batch_id, "total": len(payloads),
+                    "status_url": f"/batch/{batch_id}"}), 202
+
+
+@app.route('/batch/<batch_id>')
+def batch_status(batch_id):
+    return _job_response(batch_id)
+
+
+@app.route('/batch/<batch_id>/download')
+def batch_download(batch_id):
+    output_dir = workspace_path(batch_id)
+    if output_dir is None:
+        return "ファイルが見つかりません", 404
+
+    zip_path = os.path.join(output_dir, BATCH_ZIP_NAME)
+    if os.path.exists(zip_path):
+        return send_file(zip_path, as_attachment=True, download_name=BATCH_ZIP_NAME)
+    return "ファイルが見つかりません", 404
 
 
 if __name__ == '__main__':
@@ -134,4 +331,5 @@ if __name__ == '__main__':
     print("\nブラウザで以下のURLを開いてください：")
     print("  http://localhost:5000")
     print("\n終了するには Ctrl+C を押してください\n")
+    load_registry()
     app.run(debug=True, port=5000)
@@ -0,0 +1,162 @@
+"""
+申請データのモデル
+preprocess_data がリクエストごとに1回作り、以後の生成処理はこれだけを読む。
+- 書類が読む入力項目（対応表と書類の選択から求める）だけを __slots__ の属性として持つ
+- 代表者欄・賃金助成の単価など計算で求める欄は、作成時に1回だけ求めておく（form_specs.DERIVED_FIELDS）
+- 受講者は列ごとのタプル（WorkerTable）で持ち、大きな名簿でも1人ずつのdictを作らない
+対応表・書類の選択・結果キャッシュは data.get("項目名") で読むので、読み取り専用のマッピングとしても振る舞う。
+"""
+
+from dependencies import derive_inputs
+from document_plan import PLAN_INPUTS
+from form_specs import DERIVED_FIELDS, FORM_SPECS
+from mapping import ops_inputs
+
+# 受講者1人分の項目（roster.normalize_worker の出力と同じ）
+WORKER_FIELDS = ("name", "name_kana", "insurance_1", "insurance_2", "insurance_3", "insurance_number",
+                 "employment_type")
+_WORKER_COLUMNS = {key: i for i, key in enumerate(WORKER_FIELDS)}
+
+
+def _application_fields():
+    keys = set(PLAN_INPUTS)
+    for form in FORM_SPECS.values():
+        keys |= ops_inputs(form.ops)
+    for derive in DERIVED_FIELDS.values():
+        keys |= derive_inputs(derive)
+    keys -= set(DERIVED_FIELDS) | {"workers"}
+    return tuple(sorted(keys))
+
+
+# 入力から取り込む項目（計算で求める欄と受講者を除く）
+APPLICATION_FIELDS = _application_fields()
+
+
+class WorkerRow:
+    """WorkerTable の1行（受講者1人分）。dictと同じく get / [] で項目を読む"""
+
+    __slots__ = ("_columns", "_index")
+
+    def __init__(self, columns, index):
+        self._columns = columns
+        self._index = index
+
+    def get(self, key, default=None):
+        column = _WORKER_COLUMNS.get(key)
+        return default if column is None else self._columns[column][self._index]
+
+    def __getitem__(self, key):
+        column = _WORKER_COLUMNS.get(key)
+        if column is None:
+            raise KeyError(key)
+        return self._columns[column][self._index]
+
+    def to_json(self):
+        return {key: column[self._index] for key, column in zip(WORKER_FIELDS, self._columns)}
+
+    def __repr__(self):
+        return f"WorkerRow({self.to_json()!r})"
+
+
+class WorkerTable:
+    """受講者の一覧（項目ごとのタプル）。len、添字、スライス、反復はリストと同じように使える"""
+
+    __slots__ = ("_columns",)
+
+    def __init__(self, columns):
+        self._columns = columns
+
+    @classmethod
+    def from_records(cls, records):
+        """正規化済みの受講者（roster.normalize_worker の出力）の並びから作る"""
+        records = list(records)
+        return cls(tuple(tuple(record[key] for record in records) for key in WORKER_FIELDS))
+
+    def __len__(self):
+        return len(self._columns[0])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return WorkerTable(tuple(column[index] for column in self._columns))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return WorkerRow(self._columns, index)
+
+    def __iter__(self):
+        columns = self._columns
+        return (WorkerRow(columns, i) for i in range(len(columns[0])))
+
+    def __eq__(self, other):
+        return isinstance(other, WorkerTable) and self._columns == other._columns
+
+    __hash__ = None
+
+    def to_json(self):
+        """受講者ごとのdictのリスト（JSON・キャッシュキー用）"""
+        return [dict(zip(WORKER_FIELDS, values)) for values in zip(*self._columns)]
+
+    def __repr__(self):
+        return f"WorkerTable({len(self)}人)"
+
+
+class Application:
+    """前処理済みの申請データ
+
+    入力になかった項目は属性を持たず、get は既定値を返す（dictで項目がないときと同じ）。
+    """
+
+    __slots__ = APPLICATION_FIELDS + tuple(DERIVED_FIELDS) + ("workers",)
+
+    _FIELDS = frozenset(__slots__)
+
+    def __init__(self, values):
+        """values: 項目名 -> 正規化済みの値（workers は正規化済みの受講者のリスト）"""
+        for key in APPLICATION_FIELDS:
+            if key in values:
+                setattr(self, key, values[key])
+        self.workers = WorkerTable.from_records(values.get("workers", ()))
+        for key, derive in DERIVED_FIELDS.items():
+            setattr(self, key, derive(self))
+
+    def get(self, key, default=None):
+        if key not in self._FIELDS:
+            return default
+        return getattr(self, key, default)
+
+    def __getitem__(self, key):
+        if key not in self._FIELDS:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        return key in self._FIELDS and hasattr(self, key)
+
+    def keys(self):
+        return [key for key in self.__slots__ if hasattr(self, key)]
+
+    def replace(self, **changes):
+        """一部の項目を差し替えたコピー（workers には WorkerTable を渡す。計算で求める欄は求め直さない）"""
+        clone = object.__new__(Application)
+        for key in self.__slots__:
+            if key in changes:
+                setattr(clone, key, changes[key])
+            elif hasattr(self, key):
+                setattr(clone, key, getattr(self, key))
+        return clone
+
+    def to_json(self):
+        """項目名 -> 値のdict（受講者は WorkerTable のまま。JSONにするときは to_json を辿る）"""
+        return {key: getattr(self, key) for key in self.keys()}
+
+    def __eq__(self, other):
+        return isinstance(other, Application) and self.to_json() == other.to_json()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Application({self.get('company_name', '')!r}, workers={len(self.workers)})"
@@ -0,0 +1,96 @@
+"""
+出力ZIPの作成
+書類（xlsx）はそれ自体がDEFLATEで圧縮済みのZIPなので、圧縮し直しても縮み方はエントリによって違う
+（同じ内容のパーツが多いxlsxは1～4割縮むが、縮まないものは圧縮し直す時間が無駄になる）。
+エントリごとに先頭部分を軽く圧縮してみて、十分縮むものだけDEFLATEで格納する。
+
+JINZAI_ZIP_MODE: auto（既定、見積もりで選ぶ）/ store（圧縮しない）/ deflate（すべて圧縮する）
+JINZAI_ZIP_LEVEL: DEFLATEの圧縮レベル（0-9、既定はzlibの既定値。1にすると少し大きくなるが速い）
+JINZAI_ZIP_MIN_SAVING: auto のとき圧縮するのに必要な縮小率の見積もり（既定0.05）
+"""
+
+import io
+import os
+import threading
+import time
+import zipfile
+import zlib
+
+from timing import count_zip_entry
+
+ZIP_MODE = os.environ.get("JINZAI_ZIP_MODE", "auto")
+ZIP_LEVEL = int(os.environ["JINZAI_ZIP_LEVEL"]) if os.environ.get("JINZAI_ZIP_LEVEL") else None
+ZIP_MIN_SAVING = float(os.environ.get("JINZAI_ZIP_MIN_SAVING", "0.05"))
+
+# 見積もりに使う先頭部分の大きさ（xlsxでは全体を圧縮したときの縮小率とほぼ同じになる）
+PROBE_BYTES = 16 * 1024
+
+
+def compress_type(content, mode=None):
+    """エントリの格納方式（zipfile.ZIP_STORED / ZIP_DEFLATED）"""
+    mode = mode or ZIP_MODE
+    if mode == "store":
+        return zipfile.ZIP_STORED
+    if mode == "deflate":
+        return zipfile.ZIP_DEFLATED
+    if mode != "auto":
+        raise ValueError(f"不明なZIPの格納方式です: {mode}")
+    sample = content[:PROBE_BYTES]
+    if not sample:
+        return zipfile.ZIP_STORED
+    saved = 1 - len(zlib.compress(sample, 1)) / len(sample)
+    return zipfile.ZIP_DEFLATED if saved >= ZIP_MIN_SAVING else zipfile.ZIP_STORED
+
+
+class ZipStats:
+    """ZIPに書いたエントリの集計（格納方式ごとの件数、入力・出力のバイト数、所要時間）"""
+
+    def __init__(self):
+        self.stored = 0
+        self.deflated = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, info, seconds):
+        with self._lock:
+            if info.compress_type == zipfile.ZIP_STORED:
+                self.stored += 1
+            else:
+                self.deflated += 1
+            self.bytes_in += info.file_size
+            self.bytes_out += info.compress_size
+            self.seconds += seconds
+
+    def add_archive(self, content):
+        """出来上がったZIP（キャッシュにあったものなど）のエントリを、書き直さずに集計に加える（所要時間は0）"""
+        with zipfile.ZipFile(io.BytesIO(content)) as zf:
+            for info in zf.infolist():
+                self.add(info, 0.0)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "entries": self.stored + self.deflated,
+                "stored": self.stored,
+                "deflated": self.deflated,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "ms": round(self.seconds * 1000, 1),
+            }
+
+
+def write_entry(zf, arcname, content, mode=None, level=None, stats=None):
+    """エントリを1つ書き込む（格納方式は compress_type で選ぶ）"""
+    start = time.perf_counter()
+    method = compress_type(content, mode)
+    level = ZIP_LEVEL if level is None else level
+    zf.writestr(arcname, content, compress_type=method,
+                compresslevel=level if method == zipfile.ZIP_DEFLATED else None)
+    elapsed = time.perf_counter() - start
+    info = zf.getinfo(arcname)
+    count_zip_entry("stored" if method == zipfile.ZIP_STORED else "deflated", info.file_size, info.compress_size)
+    if stats is not None:
+        stats.add(info, elapsed)
+    return info
@@ -0,0 +1,122 @@
+"""
+複数事業主の書類一式をまとめて生成するバッチ処理
+申請者データのリスト（JSON / JSONL / CSV）から、事業主ごとのフォルダを持つ1つのZIPを作る
+"""
+
+import csv
+import io
+import json
+import os
+import re
+import zipfile
+
+from archive import write_entry
+from generator import get_executor, preprocess_data, render_documents
+
+# バッチの並列数（既定は全コア）
+BATCH_WORKERS = int(os.environ.get("JINZAI_BATCH_WORKERS", str(os.cpu_count() or 1)))
+BATCH_ZIP_NAME = "人材開発支援助成金_申請書類一括.zip"
+
+_UNSAFE_CHARS_RE = re.compile(r'[\\/:*?"<>|\r\n\t]')
+
+
+class BatchError(ValueError):
+    """バッチファイルの形が申請者データのリストになっていない"""
+
+
+def parse_payloads(content, filename=""):
+    """アップロードされたバッチファイルを申請者データのリストに変換する
+
+    .csv はヘッダー行をフィールド名とみなし、1行を1事業主とする。
+    それ以外はJSON配列、{"applicants": [...]}、またはJSONL（1行1事業主）として読む。
+    申請者データがJSONオブジェクトでなければ BatchError を送出する。
+    """
+    return _check_payloads(_parse_payloads(content, filename))
+
+
+def _check_payloads(payloads):
+    if not isinstance(payloads, list):
+        raise BatchError("申請者データは配列で指定してください")
+    for index, data in enumerate(payloads):
+        if not isinstance(data, dict):
+            raise BatchError(f"{index + 1}件目の申請者データがJSONオブジェクトではありません")
+    return payloads
+
+
+def _parse_payloads(content, filename):
+    if isinstance(content, bytes):
+        content = content.decode("utf-8-sig")
+
+    if filename.lower().endswith(".csv"):
+        reader = csv.DictReader(io.StringIO(content))
+        return [{k: v for k, v in row.items() if k} for row in reader]
+
+    stripped = content.strip()
+    if not stripped:
+        return []
+    if stripped[0] in "[{":
+        try:
+            parsed = json.loads(stripped)
+        except json.JSONDecodeError:
+            parsed = None
+        if isinstance(parsed, list):
+            return parsed
+        if isinstance(parsed, dict):
+            return parsed.get("applicants", [parsed])
+
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def company_folder(index, data):
+    """ZIP内の事業主フォルダ名（連番_事業主名）"""
+    name = data.get("company_name") or data.get("office_name") or data.get("representative_name") or "事業主"
+    name = _UNSAFE_CHARS_RE.sub("_", str(name).strip()).strip() or "事業主"
+    return f"{index + 1:03d}_{name[:60]}"
+
+
+def render_applicant(data):
+    """1事業主分の書類一式を生成する（プロセスプールの各ワーカーで実行）"""
+    return render_documents(preprocess_data(data), workers=1)
+
+
+def generate_batch(payloads, zip_path, workers=None, executor=None, progress=None, zip_stats=None):
+    """複数事業主の書類一式を1つのZIPにまとめる
+
+    payloads: 申請者データ（フォームの生データ）のリスト
+    progress: 1事業主終わるごとに progress(完了数, 総数) を呼ぶ
+    zip_stats: archive.ZipStats を渡すと、ZIPに書いたエントリの集計を加える
+    戻り値は失敗した事業主の [(フォルダ名, エラーメッセージ)]。
+    失敗した事業主のフォルダにはエラー内容を書いたテキストを入れる。
+    """
+    workers = BATCH_WORKERS if workers is None else workers
+    total = len(payloads)
+    done = 0
+    errors = []
+
+    if workers > 1 and total > 1:
+        pool = get_executor(executor or "process", workers)
+        futures = [pool.submit(render_applicant, data) for data in payloads]
+    else:
+        futures = None
+
+    with zipfile.ZipFile(zip_path, 'w') as zf:
+        for index, data in enumerate(payloads):
+            folder = f"{index + 1:03d}_事業主"
+            try:
+                folder = company_folder(index, data)
+                if futures is not None:
+                    entries = futures[index].result()
+                    futures[index] = None
+                else:
+                    entries = render_applicant(data)
+                for arcname, content in entries:
+                    write_entry(zf, f"{folder}/{arcname}", content, stats=zip_stats)
+            except Exception as e:
+                errors.append((folder, str(e)))
+                write_entry(zf, f"{folder}/エラー.txt", f"書類を生成できませんでした: {e}\n".encode("utf-8"),
+                            stats=zip_stats)
+            done += 1
+            if progress is not None:
+                progress(done, total)
+
+    return errors
@@ -0,0 +1,56 @@
+"""
+生成方式の比較ベンチマーク（openpyxl / patch）
+各様式を両方の方式で生成し、初回（テンプレートの解析込み）と2回目以降の中央値、出力サイズを表示する。
+
+    python tool/bench_fill.py            # 全様式、各5回
+    python tool/bench_fill.py -n 20 1_1 8_1
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark import synthetic_payload
+from generator import FILL_ENGINES, FORM_TEMPLATES, fill_form, preprocess_data
+
+
+def bench(form_id, engine, data, repeat):
+    times = []
+    size = 0
+    for _ in range(repeat + 1):
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        fill_form(form_id, data, buffer, engine)
+        times.append(time.perf_counter() - start)
+        size = len(buffer.getvalue())
+    return times[0], statistics.median(times[1:]), size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("forms", nargs="*", help="様式ID（省略時は全様式）")
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="2回目以降の計測回数")
+    args = parser.parse_args(argv)
+
+    data = preprocess_data(synthetic_payload(roster=3))
+    form_ids = args.forms or [f for f, path in FORM_TEMPLATES.items() if os.path.exists(path)]
+    print(f"{'様式':<6}" + "".join(f"{e + ' 初回':>14}{e + ' 中央値':>14}{'サイズ':>10}" for e in FILL_ENGINES)
+          + f"{'速度比':>8}")
+    for form_id in form_ids:
+        row = f"{form_id:<6}"
+        medians = []
+        for engine in FILL_ENGINES:
+            first, median, size = bench(form_id, engine, data, args.repeat)
+            medians.append(median)
+            row += f"{first * 1000:>12.1f}ms{median * 1000:>12.1f}ms{size:>10}"
+        row += f"{medians[0] / medians[1]:>7.1f}x"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
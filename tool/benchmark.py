@@ -0,0 +1,365 @@
+"""
+生成処理のベンチマーク
+合成した入力データ（分岐の組み合わせ × 受講者数）で preprocess_data + generate_all_documents と
+各様式の生成関数（generate_form_*）を繰り返し実行し、段階別（テンプレート読込・書き込み・保存・ZIP）の
+所要時間、p50/p95、ピークRSSをJSONで出力する。コミット間で結果を比べられる。
+
+    python tool/benchmark.py -o before.json              # 分岐ごと（受講者1人）＋受講者数ごと
+    python tool/benchmark.py --matrix full -n 3 -o after.json
+    python tool/benchmark.py --engine patch --rosters 1,500 --forms 3_1 5
+    python tool/benchmark.py --compare before.json after.json
+    JINZAI_ZIP_MODE=deflate python tool/benchmark.py -o deflate.json   # ZIPの格納方式を比べる
+
+各シナリオは別プロセスで実行し（--no-isolate で同じプロセス）、1回目はテンプレートの解析を含む
+初回の時間として別に記録する。結果キャッシュは毎回空にしてから計測する。
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import generator
+import result_cache
+import archive
+from archive import ZipStats
+from generator import (FILL_ENGINES, FORM_GENERATORS, FORM_TEMPLATES, build_document_plan, generate_all_documents,
+                       preprocess_data)
+from template_registry import BASE_DIR
+from timing import STAGES, record_stages
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 分岐の軸（値の並びの先頭が基準の分岐）
+BRANCHES = {
+    "is_subscription": ("no", "yes"),
+    "training_method": ("1", "2", "3", "4"),
+    "offjt_type": ("3", "1", "2"),
+    "is_batch_application": ("no", "yes"),
+}
+ROSTER_SIZES = (1, 50, 500, 5000)
+
+SAMPLE = {
+    "submit_year": "7", "submit_month": "4", "submit_day": "1",
+    "labor_bureau": "東京",
+    "applicant_type": "corporate",
+    "postal_code_1": "100", "postal_code_2": "0001",
+    "company_address": "東京都千代田区千代田1-1",
+    "company_name": "株式会社サンプル",
+    "representative_title": "代表取締役", "representative_name": "山田太郎",
+    "corporate_number": "1234567890123",
+    "has_agent": "yes", "agent_type": "代行",
+    "agent_postal_1": "220", "agent_postal_2": "0012", "agent_address": "神奈川県横浜市西区みなとみらい1-1",
+    "agent_name_org": "サンプル社会保険労務士法人", "agent_name_person": "高橋次郎",
+    "agent_phone_1": "045", "agent_phone_2": "123", "agent_phone_3": "4567",
+    "office_name": "本社", "office_number_1": "1301", "office_number_2": "123456", "office_number_3": "7",
+    "office_postal_1": "100", "office_postal_2": "0001", "office_address": "東京都千代田区千代田1-1",
+    "contact_name": "佐藤花子", "contact_dept": "総務部", "contact_email": "info@example.com",
+    "contact_phone_1": "03", "contact_phone_2": "1234", "contact_phone_3": "5678",
+    "total_employees": "120", "main_business": "製造業", "is_sme": "yes",
+    "subsidy_type": "1", "is_subscription": "no", "training_method": "1", "offjt_type": "3",
+    "course_name": "DX推進研修", "num_trainees": "3",
+    "training_start_year": "7", "training_start_month": "5", "training_start_day": "1",
+    "training_end_year": "7", "training_end_month": "6", "training_end_day": "30",
+    "contract_start_year": "7", "contract_start_month": "5", "contract_start_day": "1",
+    "contract_end_year": "8", "contract_end_month": "4", "contract_end_day": "30",
+    "contract_reason": "1", "total_subscribers": "10", "auto_renewal": "yes",
+    "total_hours": "20", "total_minutes": "00", "offjt_hours": "20", "offjt_minutes": "00",
+    "standard_hours": "15", "standard_minutes": "00",
+    "has_exam": "yes", "exam_name": "ITパスポート試験", "exam_year": "7", "exam_month": "7", "exam_day": "1",
+    "expansion_year": "7", "expansion_month": "4", "expansion_content": "新分野への進出", "dx_content": "業務のデジタル化",
+    "training_location": "本社研修室",
+    "instructor_name": "田中講師", "instructor_dept": "開発部", "instructor_title": "部長", "instructor_duties": "研修講師",
+    "training_org_name": "サンプル研修センター", "training_org_rep": "鈴木一郎",
+    "training_org_address": "大阪府大阪市北区梅田1-1", "training_org_corp_number": "9876543210987",
+    "plan_receipt_number": "R7-0001",
+    "instructor_fee": "100000", "travel_fee": "20000", "facility_fee": "30000", "material_fee": "15000",
+    "development_fee": "0", "tuition_fee": "250000", "total_training_fee": "415000", "employer_fee_share": "415000",
+    "wage_subsidy_hours": "20", "wage_subsidy_minutes": "00",
+    "is_voluntary": "yes", "is_batch_application": "no",
+}
+
+
+def synthetic_workers(count):
+    return [{"name": f"受講者{i}", "name_kana": f"ジュコウシャ{i}",
+             "insurance_1": "1234", "insurance_2": f"{i % 1000000:06d}", "insurance_3": str(i % 10),
+             "employment_type": "regular" if i % 3 else "contract"}
+            for i in range(1, count + 1)]
+
+
+def synthetic_payload(branch=None, roster=1):
+    """分岐（BRANCHESの軸 -> 値）と受講者数を指定した入力データ（フォームの生データ）"""
+    return dict(SAMPLE, **(branch or {}), workers=synthetic_workers(roster))
+
+
+def branch_name(branch, roster):
+    labels = {"is_subscription": "sub", "training_method": "method", "offjt_type": "offjt",
+              "is_batch_application": "batch"}
+    return ",".join(f"{labels[key]}={value}" for key, value in branch.items()) + f",workers={roster}"
+
+
+def scenarios(matrix, rosters):
+    """計測するシナリオ [(名前, 分岐, 受講者数)]
+
+    matrix="branches": 全分岐を受講者1人で＋基準の分岐を各受講者数で
+    matrix="full": 全分岐 × 全受講者数、matrix="rosters": 基準の分岐を各受講者数で
+    基準の分岐は定額制サービスの有無の2つ（受講者一覧が様式第3-1号と第3-2号で異なるため）。
+    """
+    bases = [{key: value if key == "is_subscription" else values[0] for key, values in BRANCHES.items()}
+             for value in BRANCHES["is_subscription"]]
+    branches = [dict(zip(BRANCHES, values)) for values in itertools.product(*BRANCHES.values())]
+    if matrix == "full":
+        pairs = [(branch, roster) for branch in branches for roster in rosters]
+    elif matrix == "branches":
+        pairs = [(branch, min(rosters)) for branch in branches]
+        pairs += [(base, roster) for base in bases for roster in rosters if roster != min(rosters)]
+    else:
+        pairs = [(base, roster) for base in bases for roster in rosters]
+    return [(branch_name(branch, roster), branch, roster) for branch, roster in pairs]
+
+
+def percentile(values, q):
+    """最近接順位法によるパーセンタイル"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, -(-q * len(ordered) // 100) - 1))
+    return ordered[int(index)]
+
+
+def summarize(samples):
+    """秒のリストを ms の統計値にする"""
+    if not samples:
+        return None
+    return {
+        "p50": round(percentile(samples, 50) * 1000, 3),
+        "p95": round(percentile(samples, 95) * 1000, 3),
+        "mean": round(statistics.fmean(samples) * 1000, 3),
+        "min": round(min(samples) * 1000, 3),
+        "max": round(max(samples) * 1000, 3),
+    }
+
+
+def peak_rss_kb():
+    """このプロセスのピークRSS（KB）。取得できない環境ではNone"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _measure(func, repeat):
+    """funcを repeat + 1 回実行し、初回と2回目以降の (合計, 段階別) の時間を集める"""
+    first = None
+    totals = []
+    stages = {name: [] for name in ("preprocess",) + STAGES}
+    for iteration in range(repeat + 1):
+        result_cache.clear()
+        with record_stages() as recorded:
+            start = time.perf_counter()
+            extra = func(recorded)
+            elapsed = time.perf_counter() - start
+        if iteration == 0:
+            first = elapsed
+            continue
+        totals.append(elapsed)
+        for name in stages:
+            stages[name].append(recorded.get(name, 0.0))
+    return first, totals, stages, extra
+
+
+def run_pipeline(branch, roster, repeat, engine):
+    """1シナリオ分の preprocess_data + generate_all_documents を計測する"""
+    generator.FILL_ENGINE = engine
+    raw = synthetic_payload(branch, roster)
+    output_dir = tempfile.mkdtemp(prefix="jinzai_bench_")
+
+    def run(recorded):
+        start = time.perf_counter()
+        data = preprocess_data(raw)
+        recorded["preprocess"] = time.perf_counter() - start
+        zip_stats = ZipStats()
+        zip_path, files = generate_all_documents(data, output_dir=output_dir, workers=1, zip_stats=zip_stats)
+        return {"forms": [form_id for form_id, _ in build_document_plan(data)],
+                "documents": len(files), "zip_bytes": os.path.getsize(zip_path), "zip": zip_stats.as_dict()}
+
+    try:
+        first, totals, stages, info = _measure(run, repeat)
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}", "peak_rss_kb": peak_rss_kb()}
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    stage_stats = {name: summarize(samples) for name, samples in stages.items()}
+    other = [total - sum(samples[i] for samples in stages.values()) for i, total in enumerate(totals)]
+    stage_stats["other"] = summarize(other)
+    return dict(info, first_ms=round(first * 1000, 3), total=summarize(totals), stages=stage_stats,
+                peak_rss_kb=peak_rss_kb())
+
+
+def run_forms(form_ids, roster, repeat, engine):
+    """各様式の生成関数（generate_form_*）を単体で計測する（受講者一覧は1ページ目のみ）"""
+    generator.FILL_ENGINE = engine
+    data = preprocess_data(synthetic_payload(roster=roster))
+    results = {}
+    for form_id in form_ids:
+        generate = FORM_GENERATORS[form_id]
+        output_path = os.path.join(tempfile.gettempdir(), f"jinzai_bench_{os.getpid()}_{form_id}.xlsx")
+
+        def run(recorded):
+            generate(data, output_path)
+            return {"bytes": os.path.getsize(output_path)}
+
+        try:
+            first, totals, stages, info = _measure(run, repeat)
+        except Exception as e:
+            results[form_id] = {"error": f"{type(e).__name__}: {e}"}
+            continue
+        finally:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+        results[form_id] = dict(info, first_ms=round(first * 1000, 3), total=summarize(totals),
+                                stages={name: summarize(stages[name]) for name in STAGES})
+    return {"forms": results, "peak_rss_kb": peak_rss_kb()}
+
+
+def _isolated(func, *args):
+    """funcを使い捨ての子プロセスで実行する（ピークRSSをシナリオごとに分けるため）"""
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(func, *args).result()
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(matrix="branches", rosters=ROSTER_SIZES, repeat=5, engine=None, form_ids=None,
+                  isolate=True, log=None):
+    """ベンチマークを実行し、結果（JSONにできる辞書）を返す"""
+    engine = engine or generator.FILL_ENGINE
+    call = _isolated if isolate else (lambda func, *args: func(*args))
+    log = log or (lambda message: None)
+    if form_ids is None:
+        form_ids = [form_id for form_id in FORM_GENERATORS if os.path.exists(FORM_TEMPLATES[form_id])]
+
+    result = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "engine": engine,
+            "zip_mode": archive.ZIP_MODE,
+            "repeat": repeat,
+            "matrix": matrix,
+            "rosters": list(rosters),
+            "isolated": isolate,
+            "baseline_rss_kb": peak_rss_kb(),
+        },
+        "pipeline": [],
+        "forms": [],
+    }
+    for name, branch, roster in scenarios(matrix, rosters):
+        entry = call(run_pipeline, branch, roster, repeat, engine)
+        result["pipeline"].append(dict(name=name, branch=branch, workers=roster, **entry))
+        log(_pipeline_line(name, entry))
+    if form_ids:
+        for roster in rosters:
+            entry = call(run_forms, form_ids, roster, repeat, engine)
+            for form_id, stats in entry["forms"].items():
+                result["forms"].append(dict(form=form_id, workers=roster, peak_rss_kb=entry["peak_rss_kb"],
+                                            **stats))
+                log(_form_line(form_id, roster, stats))
+    return result
+
+
+def _fmt(stats, key="p50"):
+    return f"{stats[key]:>9.1f}" if stats else f"{'-':>9}"
+
+
+def _pipeline_line(name, entry):
+    if "error" in entry:
+        return f"{name:<52} エラー: {entry['error']}"
+    stages = entry["stages"]
+    return (f"{name:<52}{_fmt(entry['total'])}{_fmt(entry['total'], 'p95')}"
+            + "".join(_fmt(stages[s]) for s in ("preprocess",) + STAGES)
+            + f"{entry['peak_rss_kb'] or 0:>10}")
+
+
+def _form_line(form_id, roster, stats):
+    if "error" in stats:
+        return f"{'form ' + form_id + ',workers=' + str(roster):<52} エラー: {stats['error']}"
+    return (f"{'form ' + form_id + ',workers=' + str(roster):<52}{_fmt(stats['total'])}{_fmt(stats['total'], 'p95')}"
+            + f"{'':>9}" + "".join(_fmt(stats["stages"][s]) for s in STAGES))
+
+
+def compare(before_path, after_path):
+    """2つの結果ファイルのp50を比べて表示する"""
+    with open(before_path, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(after_path, encoding="utf-8") as f:
+        after = json.load(f)
+    print(f"{before['meta'].get('commit')} -> {after['meta'].get('commit')}  (p50 ms)")
+    rows = [(entry["name"], entry) for entry in before["pipeline"]]
+    rows += [(f"form {entry['form']},workers={entry['workers']}", entry) for entry in before["forms"]]
+    current = {entry["name"]: entry for entry in after["pipeline"]}
+    current.update({f"form {entry['form']},workers={entry['workers']}": entry for entry in after["forms"]})
+    for name, old in rows:
+        new = current.get(name)
+        if new is None or not old.get("total") or not new.get("total"):
+            continue
+        a, b = old["total"]["p50"], new["total"]["p50"]
+        print(f"{name:<52}{a:>10.1f}{b:>10.1f}{b / a if a else 0:>8.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="初回を除いた計測回数")
+    parser.add_argument("--matrix", choices=("branches", "full", "rosters"), default="branches",
+                        help="分岐と受講者数の組み合わせ方")
+    parser.add_argument("--rosters", default=",".join(map(str, ROSTER_SIZES)), help="受講者数（カンマ区切り）")
+    parser.add_argument("--engine", choices=FILL_ENGINES, help="生成方式（省略時は JINZAI_FILL_ENGINE）")
+    parser.add_argument("--forms", nargs="*", help="単体で計測する様式ID（省略時は全様式、指定なしで計測しない）")
+    parser.add_argument("--no-isolate", action="store_true", help="シナリオを同じプロセスで実行する")
+    parser.add_argument("-o", "--output", help="結果のJSONの出力先（省略時は標準出力）")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="2つの結果を比べる")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    rosters = tuple(int(value) for value in args.rosters.split(",") if value.strip())
+    print(f"{'シナリオ':<48}{'p50':>9}{'p95':>9}{'前処理':>6}{'load':>9}{'fill':>9}{'save':>9}{'zip':>9}"
+          f"{'RSS(KB)':>10}", file=sys.stderr)
+    result = run_benchmark(args.matrix, rosters, args.repeat, args.engine, args.forms,
+                           isolate=not args.no_isolate, log=lambda line: print(line, file=sys.stderr))
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
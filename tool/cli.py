@@ -0,0 +1,154 @@
+"""
+コマンドラインからの一括生成（Webアプリを通さない）
+JSONL（1行1申請のフォームデータ）をファイルまたは標準入力から読み、1件ずつ preprocess_data と
+書類一式の生成を行って、出力先のディレクトリに1件1つのZIPを書く。
+1件ごとの所要時間と失敗を表示し、失敗があれば終了コード1で終わる。
+app.py（Flask）は読み込まないので、Webアプリの依存がない環境でも動く。
+
+    python tool/cli.py payloads.jsonl -o out/                    # 1件ずつ順に生成
+    python tool/cli.py payloads.jsonl -o out/ -j 4               # 4プロセスで並列に生成
+    cat payloads.jsonl | python tool/cli.py - -o out/ --json     # 結果もJSONLで出力
+
+ZIPの名前は batch.py の事業主フォルダと同じ「連番_事業主名.zip」（連番は入力の行番号）。
+"""
+
+import argparse
+import functools
+import io
+import json
+import os
+import sys
+import time
+import zipfile
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from archive import write_entry
+from batch import company_folder
+from generator import get_executor, preprocess_data, render_documents
+from template_registry import load_registry
+
+# 並列実行のとき、出力を待たずに投入しておく件数（ワーカー数あたり）
+PENDING_PER_WORKER = 2
+
+
+def read_records(stream):
+    """JSONLを1行ずつ読み、(行番号, 申請データ or None, エラーメッセージ or None) を順に返す
+
+    空行は飛ばす。JSONとして読めない行や、オブジェクトでない行はその行だけを失敗として返す。
+    """
+    for number, line in enumerate(stream, 1):
+        line = line.strip().lstrip("\ufeff")
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, None, f"JSONとして読めません: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "1行に1つのJSONオブジェクトが必要です"
+            continue
+        yield number, record, None
+
+
+def generate_record(data, zip_path):
+    """1件分の書類一式を生成してZIPに書く（プロセスプールの各ワーカーで実行）
+
+    戻り値は (書類の数, ZIPのバイト数, 所要秒数)。書きかけのZIPは残さない。
+    """
+    start = time.perf_counter()
+    documents = render_documents(preprocess_data(data), workers=1)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        for arcname, content in documents:
+            write_entry(zf, arcname, content)
+    content = buffer.getvalue()
+    partial = zip_path + ".part"
+    with open(partial, "wb") as f:
+        f.write(content)
+    os.replace(partial, zip_path)
+    return len(documents), len(content), time.perf_counter() - start
+
+
+def _failure(number, error):
+    return {"line": number, "ok": False, "error": error}
+
+
+def _finish(number, zip_path, compute):
+    """compute()（generate_record の結果を返す）を待って、1件分の結果のdictにする"""
+    try:
+        documents, size, seconds = compute()
+    except Exception as e:
+        return _failure(number, f"{type(e).__name__}: {e}")
+    return {"line": number, "ok": True, "path": zip_path, "documents": documents, "bytes": size,
+            "ms": round(seconds * 1000, 1)}
+
+
+def run(records, output_dir, jobs=1):
+    """申請データを生成し、1件終わるごとに結果のdictを入力の順に返す
+
+    records: read_records の戻り値
+    jobs: 並列数（2以上ならプロセスプールで生成し、先の行を投入しながら前の行の完了を待つ）
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    pool = get_executor("process", jobs) if jobs > 1 else None
+    limit = jobs * PENDING_PER_WORKER if pool is not None else 0
+    pending = deque()
+    for number, data, error in records:
+        if error is not None:
+            pending.append(functools.partial(_failure, number, error))
+        else:
+            zip_path = os.path.join(output_dir, company_folder(number - 1, data) + ".zip")
+            if pool is not None:
+                compute = pool.submit(generate_record, data, zip_path).result
+            else:
+                compute = functools.partial(generate_record, data, zip_path)
+            pending.append(functools.partial(_finish, number, zip_path, compute))
+        while len(pending) > limit:
+            yield pending.popleft()()
+    while pending:
+        yield pending.popleft()()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python tool/cli.py", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="JSONLファイル（- で標準入力）")
+    parser.add_argument("-o", "--output-dir", required=True, help="ZIPの出力先ディレクトリ")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="並列に生成するプロセス数（既定1）")
+    parser.add_argument("--json", action="store_true", help="1件ごとの結果をJSONLで標準出力に書く")
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("-j は1以上を指定してください")
+
+    # テンプレートの問題は最初に1回だけ表示する（並列のワーカーは確認済みの登録簿を引き継ぐ）
+    load_registry()
+    stream = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8-sig")
+    start = time.perf_counter()
+    succeeded = failed = 0
+    try:
+        for outcome in run(read_records(stream), args.output_dir, args.jobs):
+            if args.json:
+                print(json.dumps(outcome, ensure_ascii=False), flush=True)
+            elif outcome["ok"]:
+                print(f"OK  {outcome['line']:>6}  {outcome['ms']:>9.1f}ms  {outcome['documents']:>2}書類  "
+                      f"{outcome['path']}", flush=True)
+            if outcome["ok"]:
+                succeeded += 1
+            else:
+                failed += 1
+                print(f"NG  {outcome['line']:>6}  {outcome['error']}", file=sys.stderr, flush=True)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+    elapsed = time.perf_counter() - start
+    rate = (succeeded + failed) / elapsed if elapsed > 0 else 0.0
+    print(f"{succeeded}件成功 / {failed}件失敗  {elapsed:.1f}秒（{rate:.2f}件/秒、{args.jobs}並列）",
+          file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
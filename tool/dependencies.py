@@ -0,0 +1,50 @@
+"""
+書類生成関数の入力項目の解析
+関数のソースから data.get("項目名") / data["項目名"] を拾い、読み出す入力項目を求める。
+書類の対応表のうち計算で求める欄（mapping.Computed の関数）に使う。
+data を受け取る補助関数の中も辿る。
+"""
+
+import ast
+import inspect
+import textwrap
+
+
+class DynamicKeyError(Exception):
+    """入力項目名が実行時まで決まらない読み出しがある"""
+
+
+def _is_data(node):
+    return isinstance(node, ast.Name) and node.id == "data"
+
+
+def _literal_key(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    raise DynamicKeyError(ast.dump(node))
+
+
+def derive_inputs(func, _seen=None):
+    """関数が読む入力項目名の集合を返す
+
+    項目名が文字列リテラルでない読み出しがあると DynamicKeyError を送出する
+    （その書類は入力全体に依存するものとして扱うこと）。
+    """
+    seen = set() if _seen is None else _seen
+    seen.add(func)
+    tree = ast.parse(textwrap.dedent(inspect.getsource(func)))
+    keys = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            target = node.func
+            if isinstance(target, ast.Attribute) and target.attr == "get" and _is_data(target.value):
+                keys.add(_literal_key(node.args[0]))
+            elif isinstance(target, ast.Name) and any(_is_data(arg) for arg in node.args):
+                helper = func.__globals__.get(target.id)
+                if inspect.isfunction(helper) and helper not in seen:
+                    keys |= derive_inputs(helper, seen)
+        elif isinstance(node, ast.Subscript) and _is_data(node.value):
+            keys.add(_literal_key(node.slice))
+        elif isinstance(node, ast.Compare) and any(_is_data(c) for c in node.comparators):
+            keys.add(_literal_key(node.left))
+    return keys
@@ -0,0 +1,130 @@
+"""
+生成する書類の決定
+入力のうち書類の選択に関わる項目（定額制か、OFF-JTの種別、実施方法など）だけから、
+必要な書類とZIP内のパスを決める。結果は項目の組み合わせごとに使い回す。
+"""
+
+import functools
+
+PLAN_FOLDER = "01_計画届"
+APP_FOLDER = "02_支給申請"
+
+# 様式ID -> ZIP内のパス
+DOCUMENT_PATHS = {
+    "1_1": PLAN_FOLDER + "/様式第1-1号_職業訓練実施計画届.xlsx",
+    "2_1": PLAN_FOLDER + "/様式第2-1号_職業訓練実施計画変更届.xlsx",
+    "1_3": PLAN_FOLDER + "/様式第1-3号_事業展開等実施計画.xlsx",
+    "3_1": PLAN_FOLDER + "/様式第3-1号_対象労働者一覧.xlsx",
+    "3_2": PLAN_FOLDER + "/様式第3-2号_定額制対象労働者一覧.xlsx",
+    "11": PLAN_FOLDER + "/様式第11号_事前確認書.xlsx",
+    "10": PLAN_FOLDER + "/様式第10号_OFF-JT講師要件確認書.xlsx",
+    "14_1": PLAN_FOLDER + "/様式第14-1号_定額制サービス事業所確認票.xlsx",
+    "14_2": PLAN_FOLDER + "/様式第14-2号_本社一括申請事業所確認票.xlsx",
+    "4_2": APP_FOLDER + "/様式第4-2号_支給申請書.xlsx",
+    "5": APP_FOLDER + "/様式第5号_賃金助成の内訳.xlsx",
+    "6_2": APP_FOLDER + "/様式第6-2号_経費助成の内訳.xlsx",
+    "6_3": APP_FOLDER + "/様式第6-3号_定額制経費助成の内訳.xlsx",
+    "7": APP_FOLDER + "/様式第7号_自発的職業能力開発申立書.xlsx",
+    "8_1": APP_FOLDER + "/様式第8-1号_OFF-JT実施状況報告書.xlsx",
+    "8_3": APP_FOLDER + "/様式第8-3号_eラーニング訓練実施結果報告書.xlsx",
+    "8_4": APP_FOLDER + "/様式第8-4号_通信制訓練実施結果報告書.xlsx",
+    "8_5": APP_FOLDER + "/様式第8-5号_定額制訓練実施結果報告書.xlsx",
+    "12": APP_FOLDER + "/様式第12号_支給申請承諾書.xlsx",
+    "13": APP_FOLDER + "/様式第13号_事業所確認票.xlsx",
+}
+
+# 書類の選択に使う項目と既定値（フラグは真偽、それ以外は選択肢の値で判定する）
+PLAN_FLAGS = (("is_subscription", False), ("is_voluntary", False), ("is_sme", True),
+              ("is_batch_application", False), ("is_plan_change", False))
+PLAN_CHOICES = (("offjt_type", "3"), ("training_method", "1"))
+PLAN_INPUTS = tuple(key for key, _ in PLAN_FLAGS + PLAN_CHOICES)
+
+
+@functools.lru_cache(maxsize=256)
+def resolve_plan(is_subscription, is_voluntary, is_sme, is_batch_application, is_plan_change,
+                 offjt_type, training_method):
+    """必要な書類の様式IDを、ZIP内に並べる順のタプルで返す"""
+    plan = []
+
+    # === 計画届 ===
+    # 様式第1-1号（必須）。計画の変更では代わりに様式第2-1号 変更届
+    plan.append("2_1" if is_plan_change else "1_1")
+
+    # 様式第1-3号（必須）
+    plan.append("1_3")
+
+    # 様式第3-1号 or 3-2号（必須）
+    plan.append("3_2" if is_subscription else "3_1")
+
+    # 様式第11号（必須）
+    plan.append("11")
+
+    # 様式第10号（事業内訓練の場合）
+    if offjt_type in ("1", "2"):
+        plan.append("10")
+
+    # 様式第14-1号（定額制サービスの場合）
+    if is_subscription:
+        plan.append("14_1")
+
+    # 様式第14-2号（本社一括申請の場合）
+    if is_batch_application:
+        plan.append("14_2")
+
+    # === 支給申請 ===
+    # 様式第4-2号（必須）
+    plan.append("4_2")
+
+    # 様式第5号 賃金助成の内訳（通学制/同時双方向の場合）
+    if training_method in ("1", "2"):
+        plan.append("5")
+
+    # 様式第6-2号 or 6-3号 経費助成
+    plan.append("6_3" if is_subscription else "6_2")
+
+    # 様式第7号（自発的職業能力開発の場合）
+    if is_voluntary:
+        plan.append("7")
+
+    # 様式第8系 実施状況報告書
+    if training_method in ("1", "2"):
+        plan.append("8_1")
+    elif training_method == "3":
+        plan.append("8_3")
+    elif training_method == "4":
+        plan.append("8_4")
+
+    # 様式第8-5号（定額制サービスの場合）
+    if is_subscription:
+        plan.append("8_5")
+
+    # 様式第12号 支給申請承諾書（事業外訓練の場合）
+    if offjt_type == "3":
+        plan.append("12")
+
+    # 様式第13号 事業所確認票
+    if is_sme:
+        plan.append("13")
+
+    return tuple(plan)
+
+
+def plan_args(data):
+    """入力データから resolve_plan の引数（書類の選択に使う項目だけ）を取り出す
+
+    フラグは真偽値に、選択肢は文字列以外をNoneにそろえる（どの分岐にも当たらない値として扱う）。
+    """
+    flags = tuple(bool(data.get(key, default)) for key, default in PLAN_FLAGS)
+    choices = tuple(value if isinstance(value, str) else None
+                    for value in (data.get(key, default) for key, default in PLAN_CHOICES))
+    return flags + choices
+
+
+def document_plan(data):
+    """生成する書類の一覧を ((様式ID, ZIP内のパス), ...) のタプルで返す（前処理済みの入力データ）"""
+    return _document_plan(*plan_args(data))
+
+
+@functools.lru_cache(maxsize=256)
+def _document_plan(*args):
+    return tuple((form_id, DOCUMENT_PATHS[form_id]) for form_id in resolve_plan(*args))
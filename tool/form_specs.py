@@ -0,0 +1,554 @@
+"""
+書類ごとのセル対応表
+入力項目 -> セル番地、チェックボックス、条件付きの欄、受講者の繰り返し行を宣言的に書く。
+実行は mapping.py が行う。書き込み順は対応表の順（同じセルへの書き込みは後勝ち）。
+"""
+
+from mapping import (Check, Choice, Field, Flag, Form, OneOf, PageCount,
+                     PageNumber, RowBlock, RowChoice, RowField, RowNumber, Rows, When)
+
+
+# --- 計算で求める欄 ---
+
+def representative(data):
+    """法人の代表者欄（役職　氏名）"""
+    title = data.get("representative_title", "")
+    name = data.get("representative_name", "")
+    return (title + "　" + name).strip() if title else name
+
+
+def representative_with_company(data):
+    """様式第1-3号の代表者欄（役職　事業主名）"""
+    return data.get("representative_title", "") + "　" + data.get("company_name", "")
+
+
+def representative_title_and_name(data):
+    """様式第11号の代表者欄（役職　氏名）"""
+    return data.get("representative_title", "") + "　" + data.get("representative_name", "")
+
+
+def wage_unit_price(data):
+    """賃金助成の単価（中小企業1000円、それ以外500円）"""
+    return 1000 if data.get("is_sme", True) else 500
+
+
+# 計算で求める欄（項目名 -> 関数）。申請データ（application.Application）の作成時に1回だけ求め、
+# 対応表からは通常の項目と同じく Field で読む
+DERIVED_FIELDS = {
+    "representative": representative,
+    "representative_with_company": representative_with_company,
+    "representative_title_and_name": representative_title_and_name,
+    "wage_unit_price": wage_unit_price,
+}
+
+
+# --- 共通の欄 ---
+
+IS_CORPORATE = OneOf("applicant_type", ("corporate",), "corporate")
+
+
+def applicant_section(postal_1, postal_2, address, name, rep, corporate_number=None):
+    """事業主情報（法人・個人事業主対応）"""
+    corporate = [Field(name, "company_name"), Field(rep, "representative")]
+    if corporate_number:
+        corporate.append(When(Flag("corporate_number"), [Field(corporate_number, "corporate_number")]))
+    # 個人事業主: 名称欄に屋号（あれば）、氏名欄に本人氏名
+    individual = [
+        When(Flag("company_name"), [Field(name, "company_name")]),
+        Field(rep, "representative_name", ""),
+    ]
+    return [
+        Field(postal_1, "postal_code_1"),
+        Field(postal_2, "postal_code_2"),
+        Field(address, "company_address"),
+        When(IS_CORPORATE, corporate, individual),
+    ]
+
+
+AGENT_FIELDS = [
+    Field("AG16", "agent_postal_1"),
+    Field("AL16", "agent_postal_2"),
+    Field("AF17", "agent_address"),
+    Field("AF19", "agent_name_org"),
+    Field("AF20", "agent_name_person"),
+    Field("AF21", "agent_phone_1"),
+    Field("AM21", "agent_phone_2"),
+    Field("AT21", "agent_phone_3"),
+]
+
+OFFJT_IN_HOUSE = OneOf("offjt_type", ("1", "2"), "3")
+
+
+# --- 書類ごとの対応表 ---
+
+FORM_1_1 = Form("様式第1-1号 職業訓練実施計画届", [
+    # 提出日
+    Field("AL5", "submit_year"),
+    Field("AR5", "submit_month"),
+    Field("AU5", "submit_day"),
+    # 労働局
+    Field("B7", "labor_bureau"),
+    # 事業主情報
+    *applicant_section("AG9", "AL9", "AF10", "AF12", "AF13", "AF14"),
+    # 代理人（該当する場合）
+    When(Flag("has_agent"), [
+        *AGENT_FIELDS,
+        Choice("agent_type", {"代行": "Y20"}, "代行", otherwise="Y21"),
+    ]),
+    # 雇用保険適用事業所
+    Field("K26", "office_name"),
+    Field("AN26", "office_number_1"),
+    Field("AS26", "office_number_2"),
+    Field("AZ26", "office_number_3", safe=True),
+    Field("K28", "office_address"),
+    Field("M27", "office_postal_1"),
+    Field("Q27", "office_postal_2"),
+    # 担当者
+    Field("R29", "contact_name"),
+    Field("AM29", "contact_dept"),
+    Field("R30", "contact_phone_1"),
+    Field("W30", "contact_phone_2"),
+    Field("AB30", "contact_phone_3"),
+    Field("AM30", "contact_email"),
+    # 助成区分（1=事業展開, 2=DX, 3=グリーン）
+    Choice("subsidy_type", {"1": "K38", "2": "Y38", "3": "AM38"}, "1"),
+    When(Flag("is_subscription"), [Check("AF39")], [Check("K39")]),
+    # 訓練コース名・受講者数
+    Field("K41", "course_name"),
+    Field("AN41", "num_trainees"),
+    # 訓練の実施期間
+    Field("N42", "training_start_year"),
+    Field("T42", "training_start_month"),
+    Field("Z42", "training_start_day"),
+    Field("AI42", "training_end_year"),
+    Field("AO42", "training_end_month"),
+    Field("AU42", "training_end_day"),
+    # 定額制サービスの契約期間
+    When(Flag("is_subscription"), [
+        Field("N43", "contract_start_year"),
+        Field("T43", "contract_start_month"),
+        Field("Z43", "contract_start_day"),
+        Field("AI43", "contract_end_year"),
+        Field("AO43", "contract_end_month"),
+        Field("AU43", "contract_end_day"),
+        When(Flag("auto_renewal"), [Check("K44")]),
+    ]),
+    # 資格試験
+    When(Flag("has_exam"), [
+        Field("O45", "exam_name"),
+        Field("AI45", "exam_year"),
+        Field("AO45", "exam_month"),
+        Field("AU45", "exam_day"),
+    ]),
+    # 訓練の実施場所
+    Field("K46", "training_location"),
+    # 訓練の実施方法（1=通学制, 2=同時双方向, 3=eラーニング, 4=通信制）
+    Choice("training_method", {"1": "K48", "2": "U48", "3": "AF48", "4": "AP48"}, "1"),
+    # 訓練時間数
+    When(OneOf("training_method", ("1", "2"), "1"), [
+        Field("R50", "total_hours"),
+        Field("Y50", "total_minutes", "00"),
+        Field("R51", "offjt_hours"),
+        Field("Y51", "offjt_minutes", "00"),
+    ]),
+    When(OneOf("training_method", ("3", "4"), "1"), [
+        Field("R54", "standard_hours"),
+        Field("Y54", "standard_minutes", "00"),
+    ]),
+    # 第2面 - OFF-JT訓練種別（1=部内講師, 2=部外講師, 3=事業外訓練）
+    When(OneOf("offjt_type", ("1",), "3"), [Check("K59"), Field("K60", "instructor_name")]),
+    When(OneOf("offjt_type", ("2",), "3"), [Check("Y59"), Field("K60", "instructor_name")]),
+    When(OneOf("offjt_type", ("3",), "3"), [Check("AM59")]),
+    # 教育訓練機関情報（事業外訓練の場合）
+    When(OneOf("offjt_type", ("2", "3"), "3"), [
+        Field("R61", "training_org_name"),
+        Field("AM61", "training_org_rep"),
+        Field("R62", "training_org_address"),
+        # 契約経緯
+        Choice("contract_reason", {"1": "L65", "2": "L66", "3": "L67"}, "2"),
+        When(OneOf("contract_reason", ("3",), "2"), [Field("S67", "contract_reason_other", "")]),
+        # 負担軽減チェック
+        Check("L71"),
+    ]),
+])
+
+FORM_1_3 = Form("様式第1-3号 事業展開等実施計画", [
+    # 事業展開等の種類チェック
+    Choice("subsidy_type", {"1": "P8"}, "1", otherwise="P9"),
+    # 事業展開の実施（予定）時期
+    Field("B13", "expansion_year"),
+    Field("E13", "expansion_month"),
+    # 事業展開の内容 or DX化の内容
+    When(OneOf("subsidy_type", ("1",), "1"),
+         [Field("A19", "expansion_content")],
+         [Field("A29", "dx_content")]),
+    # 証明日付
+    Field("H37", "cert_year"),
+    Field("L37", "cert_month"),
+    Field("O37", "cert_day"),
+    # 代表者
+    Field("K40", "representative_with_company"),
+    Field("K41", "representative_name"),
+])
+
+FORM_3_1 = Form("様式第3-1号 対象労働者一覧", [
+    # ページ番号（本紙 V3枚中 Y3枚目、継紙 V60枚中 Y60枚目。本紙・継紙をそれぞれ1枚と数える）
+    PageCount("V3", safe=True, block=0),
+    PageNumber("Y3", safe=True, block=0),
+    PageCount("V60", safe=True, block=1),
+    PageNumber("Y60", safe=True, block=1),
+    # 事業所名、訓練コース名
+    Field("C8", "office_name"),
+    Field("C9", "course_name"),
+    # 労働者一覧（正規/有期の選択肢行があるため2行ずつ。No.1-20は行13-51、継紙のNo.21-40は行68-106）
+    Rows([RowBlock(13, 2, 51), RowBlock(68, 2, 106)], [
+        # No.（2ページ目以降は1ページ目からの通し番号）
+        RowNumber("A"),
+        RowField("B", "name"),
+        # 雇用保険被保険者番号（4桁 C、6桁 F、1桁 I。E・Hは区切りの「ー」）
+        RowField("C", "insurance_1"),
+        RowField("F", "insurance_2"),
+        RowField("I", "insurance_3"),
+        # 雇用形態チェック
+        RowChoice("employment_type", {"regular": ("J", 0)}, "regular", otherwise=("J", 1)),
+    ]),
+])
+
+FORM_3_2 = Form("様式第3-2号 定額制サービスによる訓練に関する対象労働者一覧", [
+    # ページ番号（本紙 G3枚中 I3枚目、継紙 G46枚中 I46枚目。本紙・継紙をそれぞれ1枚と数える）
+    PageCount("G3", safe=True, block=0),
+    PageNumber("I3", safe=True, block=0),
+    PageCount("G46", safe=True, block=1),
+    PageNumber("I46", safe=True, block=1),
+    # 証明日付
+    Field("E8", "submit_year", safe=True),
+    Field("G8", "submit_month", safe=True),
+    Field("I8", "submit_day", safe=True),
+    # 事業所名、訓練コース名
+    Field("B11", "office_name"),
+    Field("B12", "course_name"),
+    # 労働者一覧（行16-35、継紙は行55-79）
+    Rows([RowBlock(16, 1, 35), RowBlock(55, 1, 79)], [
+        # No.（1枚目からの通し番号。継紙のNo.欄はテンプレートでは空欄）
+        RowNumber("A"),
+        RowField("B", "name"),
+        RowChoice("employment_type", {"regular": ("C", 0)}, "regular", otherwise=("G", 0)),
+    ]),
+])
+
+FORM_11 = Form("様式第11号 事前確認書", [
+    # 提出日
+    Field("E12", "submit_year", safe=True),
+    Field("H12", "submit_month", safe=True),
+    Field("K12", "submit_day", safe=True),
+    # 事業主情報
+    Field("S13", "postal_code_1"),
+    Field("W13", "postal_code_2"),
+    Field("O14", "company_address"),
+    Field("O16", "company_name"),
+    Field("O18", "representative_title_and_name"),
+    Field("O19", "contact_phone_1"),
+    Field("V19", "contact_phone_2"),
+    Field("Z19", "contact_phone_3"),
+    # 労働局
+    Field("A30", "labor_bureau", safe=True),
+])
+
+FORM_4_2 = Form("様式第4-2号 支給申請書", [
+    # 申請日
+    Field("AL5", "app_year"),
+    Field("AR5", "app_month"),
+    Field("AU5", "app_day"),
+    # 労働局
+    Field("B7", "labor_bureau"),
+    # 事業主情報（様式1-1号と同じ構造）
+    *applicant_section("AG9", "AL9", "AF10", "AF12", "AF13", "AF14"),
+    # 代理人
+    When(Flag("has_agent"), AGENT_FIELDS),
+    # 計画届の受付番号
+    Field("K25", "plan_receipt_number"),
+    # 主たる事業
+    Field("K26", "main_business"),
+    # 常時雇用する労働者数
+    Field("K27", "total_employees"),
+    # 雇用保険適用事業所（行28は支給申請額の欄なので、名称・番号は行29）
+    Field("K29", "office_name"),
+    Field("AN29", "office_number_1"),
+    Field("AS29", "office_number_2"),
+    Field("AZ29", "office_number_3", safe=True),
+])
+
+FORM_5 = Form("様式第5号 賃金助成の内訳", [
+    # 受付番号・事業所名
+    Field("B7", "plan_receipt_number"),
+    Field("BA7", "office_name"),
+    # 賃金助成対象時間数
+    Field("C11", "wage_subsidy_hours"),
+    Field("H11", "wage_subsidy_minutes", "00"),
+    # 賃金助成の単価
+    Field("O10", "wage_unit_price"),
+    # 対象労働者一覧（No.1-100は行22-121）
+    Rows([RowBlock(22, 1, 121)], [
+        RowField("B", "name"),
+        RowField("K", "name_kana"),
+        RowField("T", "insurance_number"),
+    ]),
+])
+
+FORM_6_2 = Form("様式第6-2号 経費助成の内訳", [
+    # 受付番号・事業所名
+    Field("K7", "plan_receipt_number"),
+    Field("AD7", "office_name"),
+    # 経費情報は訓練タイプにより異なる（事業内訓練のみ）
+    When(OFFJT_IN_HOUSE, [
+        Field("E12", "instructor_fee", 0, safe=True),
+        Field("M12", "travel_fee", 0, safe=True),
+        Field("U12", "facility_fee", 0, safe=True),
+        Field("AC12", "material_fee", 0, safe=True),
+        Field("AK12", "development_fee", 0, safe=True),
+    ]),
+])
+
+FORM_6_3 = Form("様式第6-3号 定額制サービスによる訓練に関する経費助成の内訳", [
+    # 助成区分 - 事業展開等リスキリング支援コースをチェック
+    Check("AJ5"),
+    # 受付番号
+    Field("J6", "plan_receipt_number"),
+    # 訓練コース名
+    Field("Y6", "course_name"),
+    # 助成対象労働者数
+    Field("J7", "num_trainees"),
+    # 契約者数
+    Field("Y7", "total_subscribers"),
+    # 訓練の実施期間
+    Field("M8", "training_start_year"),
+    Field("R8", "training_start_month"),
+    Field("W8", "training_start_day"),
+    Field("AB8", "training_end_year"),
+    Field("AJ8", "training_end_month"),
+    Field("AO8", "training_end_day"),
+])
+
+FORM_8_1 = Form("様式第8-1号 OFF-JT実施状況報告書", [
+    # 受付番号・訓練コース名
+    Field("K6", "plan_receipt_number"),
+    Field("AB6", "course_name"),
+    # OFF-JT種別
+    When(OFFJT_IN_HOUSE, [Check("K7")], [Check("S7")]),
+    # 教育訓練機関名
+    When(OneOf("offjt_type", ("3",), "3"), [Field("AB7", "training_org_name")]),
+])
+
+FORM_8_3 = Form("様式第8-3号 eラーニング訓練実施結果報告書", [
+    # 事業所名
+    Field("I5", "office_name"),
+    # 訓練期間
+    Field("J6", "training_start_year"),
+    Field("N6", "training_start_month"),
+    Field("Q6", "training_start_day"),
+    Field("X6", "training_end_year"),
+    Field("AB6", "training_end_month"),
+    Field("AE6", "training_end_day"),
+])
+
+FORM_12 = Form("様式第12号 支給申請承諾書（訓練実施者）", [
+    # 労働局
+    Field("A24", "labor_bureau", safe=True),
+    # 確認日
+    Field("R24", "app_year"),
+    Field("U24", "app_month"),
+    Field("X24", "app_day"),
+    # 教育訓練機関情報
+    Field("C26", "training_org_address"),
+    Field("C28", "training_org_name"),
+    Field("C30", "training_org_rep"),
+    Field("C32", "training_org_corp_number"),
+    # 訓練情報（行39は見出しなので、記入欄は行40）
+    Field("B40", "plan_receipt_number"),
+    Field("F40", "course_name"),
+])
+
+FORM_13 = Form("様式第13号 事業所確認票", [
+    # 提出日
+    Field("N3", "app_year"),
+    Field("R3", "app_month"),
+    Field("T3", "app_day"),
+    # 労働局
+    Field("A4", "labor_bureau", safe=True),
+    # 事業主
+    Field("L8", "company_name"),
+    Field("L10", "company_address"),
+    # 事業所（行15は見出しなので、記入欄は行16）
+    Field("A16", "office_name"),
+    Field("D16", "office_number_1"),
+    Field("I16", "office_number_2"),
+    Field("P16", "office_number_3", safe=True),
+    Field("Q16", "total_employees"),
+])
+
+FORM_10 = Form("様式第10号 OFF-JT講師要件確認書", [
+    # 日付
+    Field("AA5", "submit_year", safe=True),
+    Field("AD5", "submit_month", safe=True),
+    Field("AG5", "submit_day", safe=True),
+    # 講師情報
+    When(OneOf("offjt_type", ("1",), "3"), [  # 部内講師
+        Field("H8", "instructor_name"),
+        Field("H9", "instructor_dept"),
+        Field("H10", "instructor_title"),
+        Field("H11", "instructor_duties"),
+    ]),
+    When(OneOf("offjt_type", ("2",), "3"), [  # 部外講師
+        Field("Z8", "instructor_name"),
+    ]),
+])
+
+FORM_2_1 = Form("様式第2-1号 職業訓練実施計画変更届", [
+    # 提出日
+    Field("AQ5", "submit_year"),
+    Field("AT5", "submit_month"),
+    Field("AW5", "submit_day"),
+    # 労働局
+    Field("B7", "labor_bureau"),
+    # 事業主情報
+    *applicant_section("AF9", "AK9", "AC10", "AC12", "AC13"),
+    # 受付番号
+    Field("K25", "plan_receipt_number"),
+    # 事業所名・番号
+    Field("K26", "office_name"),
+    Field("AN26", "office_number_1"),
+    Field("AR26", "office_number_2"),
+    Field("AZ26", "office_number_3", safe=True),
+    # 担当者
+    Field("K27", "contact_name"),
+    Field("AF27", "contact_dept"),
+    Field("K28", "contact_phone_1"),
+    Field("V28", "contact_phone_2"),
+    Field("AA28", "contact_phone_3"),
+    Field("AF28", "contact_email"),
+    # 助成区分 - 事業展開等リスキリング支援コース
+    Choice("subsidy_type", {"1": "M36", "2": "AA36", "3": "AO36"}, "1"),
+    When(Flag("is_subscription"), [Check("AH37")], [Check("M37")]),
+    # コース名・受講者数
+    Field("K40", "course_name"),
+    Field("AG40", "num_trainees"),
+    # 訓練期間
+    Field("N42", "training_start_year"),
+    Field("T42", "training_start_month"),
+    Field("Z42", "training_start_day"),
+    Field("AI42", "training_end_year"),
+    Field("AO42", "training_end_month"),
+    Field("AU42", "training_end_day"),
+    # 実施場所
+    Field("K45", "training_location"),
+    # 実施方法
+    Choice("training_method", {"1": "M47", "2": "W47", "3": "AH47", "4": "AR47"}, "1"),
+    # 変更理由
+    Field("B63", "change_reason", ""),
+])
+
+FORM_14_1 = Form("様式第14-1号 定額制サービスによる訓練に関する事業所確認票", [
+    # 提出日
+    Field("R3", "submit_year", safe=True),
+    Field("U3", "submit_month", safe=True),
+    Field("W3", "submit_day", safe=True),
+    # 労働局
+    Field("A4", "labor_bureau", safe=True),
+    # 事業主
+    Field("L8", "company_name"),
+    Field("L10", "company_address"),
+    # 訓練コース名
+    Field("F12", "course_name"),
+    # 申請事業所
+    Field("A16", "office_name"),
+    Field("G16", "office_number_1"),
+    Field("L16", "office_number_2"),
+    Field("S16", "office_number_3", safe=True),
+    Field("T16", "num_trainees"),
+    # 他事業所から申請しないチェック
+    Check("B46"),
+])
+
+FORM_14_2 = Form("様式第14-2号 本社一括申請に関する事業所確認票", [
+    # 提出日
+    Field("T3", "submit_year", safe=True),
+    Field("W3", "submit_month", safe=True),
+    Field("Y3", "submit_day", safe=True),
+    # 労働局
+    Field("B5", "labor_bureau", safe=True),
+    # 事業主
+    Field("M9", "company_name"),
+    Field("M10", "company_address"),
+    # 訓練コース名
+    Field("F12", "course_name"),
+    # 本社事業所
+    Field("A17", "office_name"),
+    Field("G17", "office_number_1"),
+    Field("L17", "office_number_2"),
+    Field("S17", "office_number_3", safe=True),
+    # 一括申請チェック
+    Check("A45"),
+])
+
+FORM_7 = Form("様式第7号 自発的職業能力開発に関する申立書", [
+    # コース名・機関名
+    Field("I9", "course_name"),
+    Field("I10", "training_org_name"),
+    # 受講料
+    Field("I11", "total_training_fee"),
+    Field("I12", "employer_fee_share"),
+    Field("I13", "worker_fee_share", "0"),
+    # 日付
+    Field("A21", "app_year", safe=True),
+    Field("E21", "app_month", safe=True),
+    Field("H21", "app_day", safe=True),
+    # 労働局
+    Field("A23", "labor_bureau", safe=True),
+])
+
+FORM_8_4 = Form("様式第8-4号 通信制訓練実施結果報告書", [
+    # 事業所名
+    Field("C6", "office_name"),
+    # 訓練コース名
+    Field("C7", "course_name"),
+    # 訓練期間
+    Field("J8", "training_start_year", safe=True),
+    Field("N8", "training_start_month", safe=True),
+    Field("Q8", "training_start_day", safe=True),
+    Field("X8", "training_end_year", safe=True),
+    Field("AB8", "training_end_month", safe=True),
+    Field("AE8", "training_end_day", safe=True),
+])
+
+FORM_8_5 = Form("様式第8-5号 定額制サービスによる訓練実施結果報告書", [
+    # 事業所名
+    Field("A5", "office_name"),
+])
+
+# 様式ID -> 対応表
+FORM_SPECS = {
+    "1_1": FORM_1_1,
+    "1_3": FORM_1_3,
+    "3_1": FORM_3_1,
+    "3_2": FORM_3_2,
+    "11": FORM_11,
+    "4_2": FORM_4_2,
+    "5": FORM_5,
+    "6_2": FORM_6_2,
+    "6_3": FORM_6_3,
+    "8_1": FORM_8_1,
+    "8_3": FORM_8_3,
+    "12": FORM_12,
+    "13": FORM_13,
+    "10": FORM_10,
+    "2_1": FORM_2_1,
+    "14_1": FORM_14_1,
+    "14_2": FORM_14_2,
+    "7": FORM_7,
+    "8_4": FORM_8_4,
+    "8_5": FORM_8_5,
+}
+
+# 申請の分岐を決める項目（選択肢が少なく、申請者ごとに変わる値ではない）。
+# これらの値だけで決まるチェック・定数は、分岐ごとのテンプレートの変種に焼き込んでおく
+BRANCH_KEYS = ("is_subscription", "offjt_type", "training_method", "subsidy_type")
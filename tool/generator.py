@@ -1,1036 +1,699 @@
 """
 人材開発支援助成金（事業展開等リスキリング支援コース）書類自動生成エンジン
 テンプレートのxlsxファイルをコピーし、ユーザー入力データで埋める
+コマンドラインからの一括生成は cli.py（python tool/cli.py payloads.jsonl -o out/）。
 """
 
+import atexit
+import functools
+import io
 import os
-import shutil
+import sys
+import threading
 import zipfile
-from copy import copy
-from datetime import datetime
-from openpyxl import load_workbook
-from openpyxl.utils import get_column_letter
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-PLAN_DIR = os.path.join(BASE_DIR, "計画届（変更届）を提出する場合")
-APP_DIR = os.path.join(BASE_DIR, "支給申請を行う場合")
-
-
-def col_to_num(col_str):
-    """A->1, B->2, ..., AA->27, etc."""
-    num = 0
-    for c in col_str:
-        num = num * 26 + (ord(c.upper()) - ord('A') + 1)
-    return num
-
-
-def safe_write(ws, cell_ref, value):
-    """セルに安全に書き込む（マージされたセルの場合はマージ解除なしで書込み）"""
-    if value is None or value == "":
-        return
-    try:
-        ws[cell_ref] = value
-    except (AttributeError, ValueError):
-        pass
-
-
-def write_to_merged(ws, cell_ref, value):
-    """マージされたセルの左上に書き込む"""
-    if value is None or value == "":
-        return
-    for merged_range in ws.merged_cells.ranges:
-        if cell_ref in merged_range:
-            top_left = f"{get_column_letter(merged_range.min_col)}{merged_range.min_row}"
-            ws[top_left] = value
-            return
-    ws[cell_ref] = value
-
-
-def set_checkbox(ws, cell_ref, checked=True):
-    """チェックボックスを設定（☑ or □）"""
-    write_to_merged(ws, cell_ref, "☑" if checked else "□")
-
-
-def write_applicant_info(ws, data):
-    """事業主情報を共通フォーマットで書き込む（法人・個人事業主対応）"""
-    is_corporate = data.get("applicant_type", "corporate") == "corporate"
-
-    write_to_merged(ws, "AG9", data.get("postal_code_1"))
-    write_to_merged(ws, "AL9", data.get("postal_code_2"))
-    write_to_merged(ws, "AF10", data.get("company_address"))
-
-    if is_corporate:
-        write_to_merged(ws, "AF12", data.get("company_name"))
-        title = data.get("representative_title", "")
-        name = data.get("representative_name", "")
-        rep_str = (title + "　" + name).strip() if title else name
-        write_to_merged(ws, "AF13", rep_str)
-        if data.get("corporate_number"):
-            write_to_merged(ws, "AF14", data.get("corporate_number"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from application import Application
+from archive import write_entry
+from dependencies import DynamicKeyError
+from document_plan import APP_FOLDER, PLAN_FOLDER, document_plan
+from form_specs import BRANCH_KEYS, FORM_SPECS
+from mapping import (SINGLE_PAGE, Page, apply_writes, branch_domains, branch_of, compiled_form, evaluate, ops_inputs,
+                     rows_capacity, specialize)
+from result_cache import form_digest, lookup_form, payload_digest, store_form, zip_cache
+from roster import flat_worker_records, normalize_worker
+from template_registry import FORM_TEMPLATES, require_templates
+from template_store import open_template, preload, template_merge_index, template_stamp
+from timing import add_bytes, recording, stage
+from workspace import create_workspace
+from xlsx_patch import VARIANT_CACHE_ENTRIES, PatchUnsupported, patch_template, patch_variant, sheet_merge_index
+from xlsx_patch import fill as patch_fill
+
+# 出力ZIPの名前（中のフォルダ名は document_plan.py）
+ZIP_NAME = "人材開発支援助成金_申請書類一式.zip"
+
+
+def preprocess_data(data):
+    """フォームデータを正規化し、書類の生成に使う申請データ（application.Application）にする"""
+    processed = dict(data)
+
+    # 労働者データの整形（JSONの workers 配列、またはフォームの worker_{番号}_{項目}）
+    records = data.get("workers")
+    if not isinstance(records, list):
+        records = flat_worker_records(data)
+    workers = [normalize_worker(record) for record in records if isinstance(record, dict)]
+    workers = [worker for worker in workers if worker["name"]]
+    processed["workers"] = workers
+
+    # bool変換
+    processed["has_agent"] = data.get("has_agent") == "yes"
+    processed["is_subscription"] = data.get("is_subscription") == "yes"
+    processed["has_exam"] = data.get("has_exam") == "yes"
+    processed["auto_renewal"] = data.get("auto_renewal") == "yes"
+    processed["is_sme"] = data.get("is_sme", "yes") == "yes"
+    processed["is_voluntary"] = data.get("is_voluntary") == "yes"
+    processed["is_batch_application"] = data.get("is_batch_application") == "yes"
+    processed["is_plan_change"] = data.get("is_plan_change") == "yes"
+
+    # 支給申請の日付（計画届と同じにデフォルト設定）
+    if not processed.get("app_year"):
+        processed["app_year"] = processed.get("submit_year")
+        processed["app_month"] = processed.get("submit_month")
+        processed["app_day"] = processed.get("submit_day")
+
+    # 証明日付（提出日と同じにデフォルト設定）
+    if not processed.get("cert_year"):
+        processed["cert_year"] = processed.get("submit_year")
+        processed["cert_month"] = processed.get("submit_month")
+        processed["cert_day"] = processed.get("submit_day")
+
+    return Application(processed)
+
+
+# 書類の生成方式: openpyxl（テンプレートを解析して保存）/ patch（シートXMLを直接書き換え）
+FILL_ENGINE = os.environ.get("JINZAI_FILL_ENGINE", "openpyxl")
+# 様式ごとの指定（例: "8_1=patch,5=patch"）。対応表の engine より優先する
+FORM_ENGINES = dict(item.split("=", 1) for item in os.environ.get("JINZAI_FORM_ENGINES", "").split(",") if "=" in item)
+FILL_ENGINES = ("openpyxl", "patch")
+
+
+def form_engine(form_id):
+    """様式の生成方式"""
+    engine = FORM_ENGINES.get(form_id) or FORM_SPECS[form_id].engine or FILL_ENGINE
+    if engine not in FILL_ENGINES:
+        raise ValueError(f"不明な生成方式です: {engine}")
+    return engine
+
+
+def form_stamp(form_id):
+    """結果キャッシュ用のスタンプ（テンプレートの更新と生成方式の違いを区別する）"""
+    return template_stamp(FORM_TEMPLATES[form_id]), form_engine(form_id)
+
+
+def form_steps(form_id, engine=None):
+    """書類の前処理済みの書き込み手順
+
+    対応表はテンプレートのマージ構造に合わせて一度だけ前処理し、以後は使い回す。
+    patch方式ではマージ構造をシートXMLから読むので、openpyxlでの解析を待たない。
+    """
+    template = FORM_TEMPLATES[form_id]
+    form = FORM_SPECS[form_id]
+    if (engine or form_engine(form_id)) == "patch":
+        loader = functools.partial(sheet_merge_index, template, form.sheet)
     else:
-        # 個人事業主: 名称欄に屋号（あれば）、氏名欄に本人氏名
-        if data.get("company_name"):
-            write_to_merged(ws, "AF12", data.get("company_name"))
-        write_to_merged(ws, "AF13", data.get("representative_name", ""))
+        loader = functools.partial(template_merge_index, template, form.sheet)
+    return compiled_form(form_id, form, template_stamp(template), loader)
+
+
+def form_writes(form_id, data, engine=None, page=SINGLE_PAGE):
+    """書類の書き込み計画（(シート, セル番地, 値, safe) のリスト）を返す
+
+    page: 受講者一覧を複数ページに分ける書類の、生成するページ
+    """
+    return evaluate(form_steps(form_id, engine), data, FORM_SPECS[form_id].sheet, page)
+
+
+# 様式ID -> (手順, 分岐の項目が取る値, {分岐: (焼き込む書き込み計画, 残りの手順)})
+_specializations = {}
+
+
+def form_variant_writes(form_id, data, page=SINGLE_PAGE):
+    """patch方式の、分岐（form_specs.BRANCH_KEYS の値）ごとのテンプレートの変種と、その上に書く書き込み計画
+
+    戻り値は (変種, 書き込み計画)。変種は (分岐, 焼き込む書き込み計画) で、焼き込むものがなければNone。
+    変種の上に書き込み計画を反映した結果は、テンプレートに form_writes を反映した結果と同じになる。
+    """
+    steps = form_steps(form_id, "patch")
+    sheet = FORM_SPECS[form_id].sheet
+    if not VARIANT_CACHE_ENTRIES:
+        return None, evaluate(steps, data, sheet, page)
+    entry = _specializations.get(form_id)
+    if entry is None or entry[0] is not steps:
+        entry = _specializations[form_id] = (steps, branch_domains(steps, BRANCH_KEYS), {})
+    _, domains, branches = entry
+    branch = branch_of(domains, data)
+    specialized = branches.get(branch)
+    if specialized is None:
+        specialized = branches[branch] = specialize(steps, branch, sheet)
+    baked, remaining = specialized
+    return ((branch, tuple(baked)) if baked else None), evaluate(remaining, data, sheet, page)
+
+
+def fill_form(form_id, data, output_path, engine=None, page=SINGLE_PAGE):
+    """テンプレートに対応表どおり入力データを書き込んで保存する
+
+    patch方式では、分岐だけで決まるチェック・定数を分岐ごとのテンプレートの変種に焼き込んでおき、
+    リクエストごとには残りの欄だけを書き込む。
+    patch方式で扱えないテンプレート・値（共有数式の起点セルへの書き込みなど）は
+    openpyxlで生成し直す。
+    """
+    engine = engine or form_engine(form_id)
+    template = FORM_TEMPLATES[form_id]
+    if engine == "patch":
+        try:
+            with stage("load", form_id):
+                patch_template(template)
+            with stage("fill", form_id):
+                variant, writes = form_variant_writes(form_id, data, page)
+            with stage("save", form_id):
+                size = patch_fill(template, writes, output_path, variant)
+            add_bytes("save", size, form_id)
+            return
+        except PatchUnsupported:
+            pass
+    with stage("load", form_id):
+        wb = open_template(template)
+    with stage("fill", form_id):
+        apply_writes(wb, form_writes(form_id, data, "openpyxl", page))
+    with stage("save", form_id):
+        wb.save(output_path)
+    wb.close()
+    if recording():
+        add_bytes("save", output_path.tell() if hasattr(output_path, "tell") else os.path.getsize(output_path),
+                  form_id)
 
 
 def generate_form_1_1(data, output_path):
     """様式第1-1号 職業訓練実施計画届"""
-    template = os.path.join(PLAN_DIR,
-        "様式第1-1号人材開発支援助成金（事業展開等リスキリング支援コース）職業訓練実施計画届.xlsx")
-    shutil.copy2(template, output_path)
-    wb = load_workbook(output_path)
-    ws = wb[wb.sheetnames[0]]
-
-    # 提出日
-    write_to_merged(ws, "AL5", data.get("submit_year"))
-    write_to_merged(ws, "AR5", data.get("submit_month"))
-    write_to_merged(ws, "AU5", data.get("submit_day"))
-
-    # 労働局
-    write_to_merged(ws, "B7", data.get("labor_bureau"))
-
-    # 事業主情報
-    write_applicant_info(ws, data)
-
-    # 代理人（該当する場合）
-    if data.get("has_agent"):
-        write_to_merged(ws, "AG16", data.get("agent_postal_1"))
-        write_to_merged(ws, "AL16", data.get("agent_postal_2"))
-        write_to_merged(ws, "AF17", data.get("agent_address"))
-        write_to_merged(ws, "AF19", data.get("agent_name_org"))
-        write_to_merged(ws, "AF20", data.get("agent_name_person"))
-        write_to_merged(ws, "AF21", data.get("agent_phone_1"))
-        write_to_merged(ws, "AM21", data.get("agent_phone_2"))
-        write_to_merged(ws, "AT21", data.get("agent_phone_3"))
-        agent_type = data.get("agent_type", "代行")
-        if agent_type == "代行":
-            set_checkbox(ws, "Y20", True)
-        else:
-            set_checkbox(ws, "Y21", True)
-
-    # 雇用保険適用事業所
-    write_to_merged(ws, "K26", data.get("office_name"))
-    write_to_merged(ws, "AN26", data.get("office_number_1"))
-    write_to_merged(ws, "AS26", data.get("office_number_2"))
-    # 1桁目 - AZ26付近
-    safe_write(ws, "AZ26", data.get("office_number_3"))
-    write_to_merged(ws, "K28", data.get("office_address"))
-    write_to_merged(ws, "M27", data.get("office_postal_1"))
-    write_to_merged(ws, "Q27", data.get("office_postal_2"))
-
-    # 担当者
-    write_to_merged(ws, "R29", data.get("contact_name"))
-    write_to_merged(ws, "AM29", data.get("contact_dept"))
-    write_to_merged(ws, "R30", data.get("contact_phone_1"))
-    write_to_merged(ws, "W30", data.get("contact_phone_2"))
-    write_to_merged(ws, "AB30", data.get("contact_phone_3"))
-    write_to_merged(ws, "AM30", data.get("contact_email"))
-
-    # 助成区分 - 事業展開等リスキリング支援コース
-    subsidy_type = data.get("subsidy_type", "1")  # 1=事業展開, 2=DX, 3=グリーン
-    is_subscription = data.get("is_subscription", False)
-
-    if subsidy_type == "1":
-        set_checkbox(ws, "K38", True)
-    elif subsidy_type == "2":
-        set_checkbox(ws, "Y38", True)
-    elif subsidy_type == "3":
-        set_checkbox(ws, "AM38", True)
-
-    if is_subscription:
-        set_checkbox(ws, "AF39", True)
-    else:
-        set_checkbox(ws, "K39", True)
-
-    # 訓練コース名・受講者数
-    write_to_merged(ws, "K41", data.get("course_name"))
-    write_to_merged(ws, "AN41", data.get("num_trainees"))
-
-    # 訓練の実施期間
-    write_to_merged(ws, "N42", data.get("training_start_year"))
-    write_to_merged(ws, "T42", data.get("training_start_month"))
-    write_to_merged(ws, "Z42", data.get("training_start_day"))
-    write_to_merged(ws, "AI42", data.get("training_end_year"))
-    write_to_merged(ws, "AO42", data.get("training_end_month"))
-    write_to_merged(ws, "AU42", data.get("training_end_day"))
-
-    # 定額制サービスの契約期間
-    if is_subscription:
-        write_to_merged(ws, "N43", data.get("contract_start_year"))
-        write_to_merged(ws, "T43", data.get("contract_start_month"))
-        write_to_merged(ws, "Z43", data.get("contract_start_day"))
-        write_to_merged(ws, "AI43", data.get("contract_end_year"))
-        write_to_merged(ws, "AO43", data.get("contract_end_month"))
-        write_to_merged(ws, "AU43", data.get("contract_end_day"))
-        if data.get("auto_renewal"):
-            set_checkbox(ws, "K44", True)
-
-    # 資格試験
-    if data.get("has_exam"):
-        write_to_merged(ws, "O45", data.get("exam_name"))
-        write_to_merged(ws, "AI45", data.get("exam_year"))
-        write_to_merged(ws, "AO45", data.get("exam_month"))
-        write_to_merged(ws, "AU45", data.get("exam_day"))
-
-    # 訓練の実施場所
-    write_to_merged(ws, "K46", data.get("training_location"))
-
-    # 訓練の実施方法
-    method = data.get("training_method", "1")  # 1=通学制, 2=同時双方向, 3=eラーニング, 4=通信制
-    if method == "1":
-        set_checkbox(ws, "K48", True)
-    elif method == "2":
-        set_checkbox(ws, "U48", True)
-    elif method == "3":
-        set_checkbox(ws, "AF48", True)
-    elif method == "4":
-        set_checkbox(ws, "AP48", True)
-
-    # 訓練時間数
-    if method in ("1", "2"):
-        write_to_merged(ws, "R50", data.get("total_hours"))
-        write_to_merged(ws, "Y50", data.get("total_minutes", "00"))
-        write_to_merged(ws, "R51", data.get("offjt_hours"))
-        write_to_merged(ws, "Y51", data.get("offjt_minutes", "00"))
-    elif method in ("3", "4"):
-        write_to_merged(ws, "R54", data.get("standard_hours"))
-        write_to_merged(ws, "Y54", data.get("standard_minutes", "00"))
-
-    # 第2面 - OFF-JT訓練種別
-    offjt_type = data.get("offjt_type", "3")  # 1=部内講師, 2=部外講師, 3=事業外訓練
-    if offjt_type == "1":
-        set_checkbox(ws, "K59", True)
-        write_to_merged(ws, "K60", data.get("instructor_name"))
-    elif offjt_type == "2":
-        set_checkbox(ws, "Y59", True)
-        write_to_merged(ws, "K60", data.get("instructor_name"))
-    elif offjt_type == "3":
-        set_checkbox(ws, "AM59", True)
-
-    # 教育訓練機関情報（事業外訓練の場合）
-    if offjt_type in ("2", "3"):
-        write_to_merged(ws, "R61", data.get("training_org_name"))
-        write_to_merged(ws, "AM61", data.get("training_org_rep"))
-        write_to_merged(ws, "R62", data.get("training_org_address"))
-
-        # 契約経緯
-        contract_reason = data.get("contract_reason", "2")
-        if contract_reason == "1":
-            set_checkbox(ws, "L65", True)
-        elif contract_reason == "2":
-            set_checkbox(ws, "L66", True)
-        elif contract_reason == "3":
-            set_checkbox(ws, "L67", True)
-            write_to_merged(ws, "S67", data.get("contract_reason_other", ""))
-
-        # 負担軽減チェック
-        set_checkbox(ws, "L71", True)
-
-    wb.save(output_path)
-    wb.close()
+    fill_form("1_1", data, output_path)
 
 
 def generate_form_1_3(data, output_path):
     """様式第1-3号 事業展開等実施計画"""
-    template = os.path.join(PLAN_DIR,
-        "様式第1-3号人材開発支援助成金（事業展開等リスキリング支援コース）事業展開等実施計画.xlsx")
-    shutil.copy2(template, output_path)
-    wb = load_workbook(output_path)
-    ws = wb[wb.sheetnames[0]]
-
-    subsidy_type = data.get("subsidy_type", "1")
-
-    # 事業展開等の種類チェック
-    if subsidy_type == "1":
-        set_checkbox(ws, "P8", True)
-    else:
-        set_checkbox(ws, "P9", True)
-
-    # 事業展開の実施（予定）時期
-    write_to_merged(ws, "B13", data.get("expansion_year"))
-    write_to_merged(ws, "E13", data.get("expansion_month"))
-
-    # 事業展開の内容 or DX化の内容
-    if subsidy_type == "1":
-        write_to_merged(ws, "A19", data.get("expansion_content"))
-    else:
-        write_to_merged(ws, "A29", data.get("dx_content"))
-
-    # 証明日付
-    write_to_merged(ws, "H37", data.get("cert_year"))
-    write_to_merged(ws, "L37", data.get("cert_month"))
-    write_to_merged(ws, "O37", data.get("cert_day"))
-
-    # 代表者
-    write_to_merged(ws, "K40", data.get("representative_title", "") + "　" + data.get("company_name", ""))
-    write_to_merged(ws, "K41", data.get("representative_name"))
-
-    wb.save(output_path)
-    wb.close()
+    fill_form("1_3", data, output_path)
 
 
 def generate_form_3_1(data, output_path):
     """様式第3-1号 対象労働者一覧"""
-    template = os.path.join(PLAN_DIR,
-        "様式第3-1号人材開発支援助成金（事業展開等リスキリング支援コース）対象労働者一覧.xlsx")
-    shutil.copy2(template, output_path)
-    wb = load_workbook(output_path)
-    ws = wb[wb.sheetnames[0]]
-
-    # ページ番号
-    safe_write(ws, "V3", "1")
-    safe_write(ws, "AA3", "1")
-
-    # 事業所名、訓練コース名
-    write_to_merged(ws, "K8", data.get("office_name"))  # Row 8 has input area
-    write_to_merged(ws, "K9", data.get("course_name"))
-
-    # 労働者一覧
-    workers = data.get("workers", [])
-    base_row = 13  # 1人目は行13から
-    row_step = 2   # 2行ずつ（正規/有期の選択肢行があるため）
-
-    for i, w in enumerate(workers):
-        row = base_row + (i * row_step)
-        if row > 107:  # フォームの限界
-            break
-        safe_write(ws, f"B{row}", w.get("name"))
-        safe_write(ws, f"D{row}", w.get("insurance_1"))
-        safe_write(ws, f"E{row}", w.get("insurance_1"))
-        safe_write(ws, f"H{row}", w.get("insurance_2"))
-        # 雇用形態チェック
-        emp_type = w.get("employment_type", "regular")
-        if emp_type == "regular":
-            set_checkbox(ws, f"J{row}", True)
-        else:
-            set_checkbox(ws, f"J{row+1}", True)
-
-    wb.save(output_path)
-    wb.close()
+    fill_form("3_1", data, output_path)
 
 
 def generate_form_3_2(data, output_path):
     """様式第3-2号 定額制サービスによる訓練に関する対象労働者一覧"""
-    template = os.path.join(PLAN_DIR, "様式第3-2号.xlsx")
-    shutil.copy2(template, output_path)
-    wb = load_workbook(output_path)
-    ws = wb[wb.sheetnames[0]]
-
-    # ページ番号
-    safe_write(ws, "G3", "1")
-    safe_write(ws, "I3", "1")
-
-    # 証明日付
-    safe_write(ws, "E8", data.get("submit_year"))
-    safe_write(ws, "G8", data.get("submit_month"))
-    safe_write(ws, "I8", data.get("submit_day"))
-
-    # 事業所名、訓練コース名
-    write_to_merged(ws, "B11", data.get("office_name"))
-    write_to_merged(ws, "B12", data.get("course_name"))
-
-    # 労働者一覧
-    workers = data.get("workers", [])
-    for i, w in enumerate(workers):
-        row = 16 + i
-        if row > 75:
-            break
-        safe_write(ws, f"B{row}", w.get("name"))
-        emp_type = w.get("employment_type", "regular")
-        if emp_type == "regular":
-            set_checkbox(ws, f"C{row}", True)
-        else:
-            set_checkbox(ws, f"G{row}", True)
-
-    wb.save(output_path)
-    wb.close()
+    fill_form("3_2", data, output_path)
 
 
 def generate_form_11(data, output_path):
     """様式第11号 事前確認書"""
-    template = os.path.join(PLAN_DIR,
-        "様式第11号人材開発支援助成金（事業展開等リスキリング支援コース）事前確認書.xlsx")
-    shutil.copy2(template, output_path)
-    wb = load_workbook(output_path)
-    ws = wb[wb.sheetnames[0]]
-
-    # 提出日
-    safe_write(ws, "E12", data.get("submit_year"))
-    safe_write(ws, "H12", data.get("submit_month"))
-    safe_write(ws, "K12", data.get("submit_day"))
-
-    # 事業主情報
-    write_to_merged(ws, "S13", data.get("postal_code_1"))
-    write_to_merged(ws, "W13", data.get("postal_code_2"))
-    write_to_merged(ws, "O14", data.get("company_address"))
-    write_to_merged(ws, "O16", data.get("company_name"))
-    write_to_merged(ws, "O18", data.get("representative_title", "") + "　" + data.get("representative_name", ""))
-    write_to_merged(ws, "O19", data.get("contact_phone_1"))
-    write_to_merged(ws, "V19", data.get("contact_phone_2"))
-    write_to_merged(ws, "Z19", data.get("contact_phone_3"))
-
-    # 労働局
-    safe_write(ws, "C30", data.get("labor_bureau"))
-
-    # 全チェック項目にチェックを入れる（事前確認なので全て☑）
-    # 注意事項の確認チェック欄は元のフォームの構造に依存
-
-    wb.save(output_path)
-    wb.close()
+    fill_form("11", data, output_path)
 
 
 def generate_form_4_2(data, output_path):
     """様式第4-2号 支給申請書"""
-    template = os.path.join(APP_DIR,
-        "様式第4-2号人材開発支援助成金（事業展開等リスキリング支援コース）支給申請書.xlsx")
-    shutil.copy2(template, output_path)
-    wb = load_workbook(output_path)
-    ws = wb[wb.sheetnames[0]]
-
-    # 申請日
-    write_to_merged(ws, "AL5", data.get("app_year"))
-    write_to_merged(ws, "AR5", data.get("app_month"))
-    write_to_merged(ws, "AU5", data.get("app_day"))
-
-    # 労働局
-    write_to_merged(ws, "B7", data.get("labor_bureau"))
-
-    # 事業主情報（様式1-1号と同じ構造）
-    write_applicant_info(ws, data)
-
-    # 代理人
-    if data.get("has_agent"):
-        write_to_merged(ws, "AG16", data.get("agent_postal_1"))
-        write_to_merged(ws, "AL16", data.get("agent_postal_2"))
-        write_to_merged(ws, "AF17", data.get("agent_address"))
-        write_to_merged(ws, "AF19", data.get("agent_name_org"))
-        write_to_merged(ws, "AF20", data.get("agent_name_person"))
-        write_to_merged(ws, "AF21", data.get("agent_phone_1"))
-        write_to_merged(ws, "AM21", data.get("agent_phone_2"))
-        write_to_merged(ws, "AT21", data.get("agent_phone_3"))
-
-    # 計画届の受付番号
-    write_to_merged(ws, "K25", data.get("plan_receipt_number"))
-
-    # 主たる事業
-    write_to_merged(ws, "K26", data.get("main_business"))
-
-    # 常時雇用する労働者数
-    write_to_merged(ws, "K27", data.get("total_employees"))
-
-    # 雇用保険適用事業所
-    write_to_merged(ws, "K28", data.get("office_name"))
-    write_to_merged(ws, "AN28", data.get("office_number_1"))
-    write_to_merged(ws, "AS28", data.get("office_number_2"))
-    safe_write(ws, "AZ28", data.get("office_number_3"))
-
-    wb.save(output_path)
-    wb.close()
+    fill_form("4_2", data, output_path)
 
 
 def generate_form_5(data, output_path):
     """様式第5号 賃金助成の内訳"""
-    template = os.path.join(APP_DIR,
-        "様式第5号人材開発支援助成金（事業展開等リスキリング支援コース）賃金助成の内訳.xlsx")
-    shutil.copy2(template, output_path)
-    wb = load_workbook(output_path)
-    ws = wb[wb.sheetnames[0]]
-
-    # 受付番号・事業所名
-    write_to_merged(ws, "K7", data.get("plan_receipt_number"))
-    write_to_merged(ws, "BA7", data.get("office_name"))
-
-    # 賃金助成対象時間数
-    write_to_merged(ws, "D11", data.get("wage_subsidy_hours"))
-    write_to_merged(ws, "H11", data.get("wage_subsidy_minutes", "00"))
-
-    # 賃金助成の単価
-    is_sme = data.get("is_sme", True)
-    unit_price = 1000 if is_sme else 500
-    write_to_merged(ws, "O10", unit_price)
-
-    # 対象労働者一覧
-    workers = data.get("workers", [])
-    base_row = 21
-    for i, w in enumerate(workers):
-        row = base_row + i
-        if row > 120:
-            break
-        safe_write(ws, f"B{row}", w.get("name"))
-        safe_write(ws, f"C{row}", w.get("name_kana"))
-        safe_write(ws, f"J{row}", w.get("insurance_number"))
-
-    wb.save(output_path)
-    wb.close()
+    fill_form("5", data, output_path)
 
 
 def generate_form_6_2(data, output_path):
     """様式第6-2号 経費助成の内訳"""
-    template = os.path.join(APP_DIR,
-        "様式第6-2号人材開発支援助成金（事業展開等リスキリング支援コース）経費助成の内訳.xlsx")
-    shutil.copy2(template, output_path)
-    wb = load_workbook(output_path)
-    ws = wb[wb.sheetnames[0]]
-
-    # 受付番号・事業所名
-    write_to_merged(ws, "K7", data.get("plan_receipt_number"))
-    write_to_merged(ws, "AD7", data.get("office_name"))
-
-    # 経費情報は訓練タイプにより異なる
-    offjt_type = data.get("offjt_type", "3")
-    if offjt_type in ("1", "2"):  # 事業内訓練
-        safe_write(ws, "E12", data.get("instructor_fee", 0))
-        safe_write(ws, "M12", data.get("travel_fee", 0))
-        safe_write(ws, "U12", data.get("facility_fee", 0))
-        safe_write(ws, "AC12", data.get("material_fee", 0))
-        safe_write(ws, "AK12", data.get("development_fee", 0))
-
-    wb.save(output_path)
-    wb.close()
+    fill_form("6_2", data, output_path)
 
 
 def generate_form_6_3(data, output_path):
     """様式第6-3号 定額制サービスによる訓練に関する経費助成の内訳"""
-    template = os.path.join(APP_DIR,
-        "様式第6-3号人材開発支援助成金（事業展開等リスキリング支援コース） 定額制サービスによる訓練に関する経費助成の内訳.xlsx")
-    shutil.copy2(template, output_path)
-    wb = load_workbook(output_path)
-    ws = wb[wb.sheetnames[0]]
-
-    # 助成区分 - 事業展開等リスキリング支援コースをチェック
-    set_checkbox(ws, "AJ5", True)
-
-    # 受付番号
-    write_to_merged(ws, "L6", data.get("plan_receipt_number"))
-
-    # 訓練コース名
-    write_to_merged(ws, "AE6", data.get("course_name"))
-
-    # 助成対象労働者数
-    write_to_merged(ws, "L7", data.get("num_trainees"))
-
-    # 契約者数
-    write_to_merged(ws, "AE7", data.get("total_subscribers"))
-
-    # 訓練の実施期間
-    write_to_merged(ws, "M8", data.get("training_start_year"))
-    write_to_merged(ws, "R8", data.get("training_start_month"))
-    write_to_merged(ws, "W8", data.get("training_start_day"))
-    write_to_merged(ws, "AE8", data.get("training_end_year"))
-    write_to_merged(ws, "AJ8", data.get("training_end_month"))
-    write_to_merged(ws, "AO8", data.get("training_end_day"))
-
-    wb.save(output_path)
-    wb.close()
+    fill_form("6_3", data, output_path)
 
 
 def generate_form_8_1(data, output_path):
     """様式第8-1号 OFF-JT実施状況報告書"""
-    template = os.path.join(APP_DIR,
-        "様式第8-1号人材開発支援助成金（事業展開等リスキリング支援コース）OFF-JT実施状況報告書保護解除.xlsx")
-    shutil.copy2(template, output_path)
-    wb = load_workbook(output_path)
-    ws = wb[wb.sheetnames[0]]
-
-    # 受付番号・訓練コース名
-    write_to_merged(ws, "K6", data.get("plan_receipt_number"))
-    write_to_merged(ws, "AE6", data.get("course_name"))
-
-    # OFF-JT種別
-    offjt_type = data.get("offjt_type", "3")
-    if offjt_type in ("1", "2"):
-        set_checkbox(ws, "K7", True)
-    else:
-        set_checkbox(ws, "S7", True)
-
-    # 教育訓練機関名
-    if offjt_type == "3":
-        write_to_merged(ws, "AE7", data.get("training_org_name"))
-
-    wb.save(output_path)
-    wb.close()
+    fill_form("8_1", data, output_path)
 
 
 def generate_form_8_3(data, output_path):
     """様式第8-3号 eラーニング訓練実施結果報告書"""
-    template = os.path.join(APP_DIR,
-        "様式第8-3号人材開発支援助成金（事業展開等リスキリング支援コース）eラーニング訓練実施結果報告書.xlsx")
-    shutil.copy2(template, output_path)
-    wb = load_workbook(output_path)
-    ws = wb[wb.sheetnames[0]]
-
-    # 事業所名
-    write_to_merged(ws, "K5", data.get("office_name"))
-
-    # 訓練期間
-    write_to_merged(ws, "K6", data.get("training_start_year"))
-    write_to_merged(ws, "N6", data.get("training_start_month"))
-    write_to_merged(ws, "Q6", data.get("training_start_day"))
-    write_to_merged(ws, "Y6", data.get("training_end_year"))
-    write_to_merged(ws, "AB6", data.get("training_end_month"))
-    write_to_merged(ws, "AE6", data.get("training_end_day"))
-
-    wb.save(output_path)
-    wb.close()
+    fill_form("8_3", data, output_path)
 
 
 def generate_form_12(data, output_path):
     """様式第12号 支給申請承諾書（訓練実施者）"""
-    template = os.path.join(APP_DIR,
-        "様式第12号人材開発支援助成金（事業展開等リスキリング支援コース）支給申請承諾書（訓練実施者）.xlsx")
-    shutil.copy2(template, output_path)
-    wb = load_workbook(output_path)
-    ws = wb[wb.sheetnames[0]]
-
-    # 労働局
-    safe_write(ws, "B24", data.get("labor_bureau"))
-
-    # 確認日
-    write_to_merged(ws, "R24", data.get("app_year"))
-    write_to_merged(ws, "U24", data.get("app_month"))
-    write_to_merged(ws, "X24", data.get("app_day"))
-
-    # 教育訓練機関情報
-    write_to_merged(ws, "E26", data.get("training_org_address"))
-    write_to_merged(ws, "E28", data.get("training_org_name"))
-    write_to_merged(ws, "E30", data.get("training_org_rep"))
-    write_to_merged(ws, "E32", data.get("training_org_corp_number"))
-
-    # 訓練情報
-    write_to_merged(ws, "K39", data.get("plan_receipt_number"))
-    write_to_merged(ws, "Q39", data.get("course_name"))
-
-    wb.save(output_path)
-    wb.close()
+    fill_form("12", data, output_path)
 
 
 def generate_form_13(data, output_path):
     """様式第13号 事業所確認票"""
-    template = os.path.join(APP_DIR,
-        "様式第13号人材開発支援助成金（事業展開等リスキリング支援コース）事業所確認票.xlsx")
-    shutil.copy2(template, output_path)
-    wb = load_workbook(output_path)
-    ws = wb[wb.sheetnames[0]]
-
-    # 提出日
-    write_to_merged(ws, "N3", data.get("app_year"))
-    write_to_merged(ws, "P3", data.get("app_month"))
-    write_to_merged(ws, "R3", data.get("app_day"))
-
-    # 労働局
-    safe_write(ws, "A4", data.get("labor_bureau"))
-
-    # 事業主
-    write_to_merged(ws, "L8", data.get("company_name"))
-    write_to_merged(ws, "L10", data.get("company_address"))
-
-    # 事業所
-    write_to_merged(ws, "B15", data.get("office_name"))
-    write_to_merged(ws, "H16", data.get("office_number_1"))
-    write_to_merged(ws, "L16", data.get("office_number_2"))
-    safe_write(ws, "P16", data.get("office_number_3"))
-    write_to_merged(ws, "Q15", data.get("total_employees"))
-
-    wb.save(output_path)
-    wb.close()
+    fill_form("13", data, output_path)
 
 
 def generate_form_10(data, output_path):
     """様式第10号 OFF-JT講師要件確認書"""
-    template = os.path.join(PLAN_DIR,
-        "様式第10号人材開発支援助成金（事業展開等リスキリング支援コース）OFF-JT講師要件確認書.xlsx")
-    shutil.copy2(template, output_path)
-    wb = load_workbook(output_path)
-    ws = wb[wb.sheetnames[0]]
-
-    # 日付
-    safe_write(ws, "AA5", data.get("submit_year"))
-    safe_write(ws, "AD5", data.get("submit_month"))
-    safe_write(ws, "AG5", data.get("submit_day"))
-
-    # 講師情報
-    offjt_type = data.get("offjt_type", "3")
-    if offjt_type == "1":  # 部内講師
-        write_to_merged(ws, "I8", data.get("instructor_name"))
-        write_to_merged(ws, "I9", data.get("instructor_dept"))
-        write_to_merged(ws, "I10", data.get("instructor_title"))
-        write_to_merged(ws, "I11", data.get("instructor_duties"))
-    elif offjt_type == "2":  # 部外講師
-        write_to_merged(ws, "AE8", data.get("instructor_name"))
-
-    wb.save(output_path)
-    wb.close()
+    fill_form("10", data, output_path)
 
 
 def generate_form_2_1(data, output_path):
     """様式第2-1号 職業訓練実施計画変更届"""
-    template = os.path.join(PLAN_DIR,
-        "様式第2-1号人材開発支援助成金（事業展開等リスキリング支援コース）職業訓練実施計画変更届.xlsx")
-    shutil.copy2(template, output_path)
-    wb = load_workbook(output_path)
-    ws = wb[wb.sheetnames[0]]
-
-    # 提出日
-    write_to_merged(ws, "AQ5", data.get("submit_year"))
-    write_to_merged(ws, "AT5", data.get("submit_month"))
-    write_to_merged(ws, "AW5", data.get("submit_day"))
-
-    # 労働局
-    write_to_merged(ws, "B7", data.get("labor_bureau"))
-
-    # 事業主情報
-    write_to_merged(ws, "AF9", data.get("postal_code_1"))
-    write_to_merged(ws, "AK9", data.get("postal_code_2"))
-    write_to_merged(ws, "AC10", data.get("company_address"))
-    is_corporate = data.get("applicant_type", "corporate") == "corporate"
-    if is_corporate:
-        write_to_merged(ws, "AC12", data.get("company_name"))
-        title = data.get("representative_title", "")
-        name = data.get("representative_name", "")
-        rep_str = (title + "　" + name).strip() if title else name
-        write_to_merged(ws, "AC13", rep_str)
-    else:
-        if data.get("company_name"):
-            write_to_merged(ws, "AC12", data.get("company_name"))
-        write_to_merged(ws, "AC13", data.get("representative_name", ""))
-
-    # 受付番号
-    write_to_merged(ws, "K25", data.get("plan_receipt_number"))
-
-    # 事業所名・番号
-    write_to_merged(ws, "K26", data.get("office_name"))
-    write_to_merged(ws, "AN26", data.get("office_number_1"))
-    write_to_merged(ws, "AR26", data.get("office_number_2"))
-    safe_write(ws, "AZ26", data.get("office_number_3"))
-
-    # 担当者
-    write_to_merged(ws, "K27", data.get("contact_name"))
-    write_to_merged(ws, "AF27", data.get("contact_dept"))
-    write_to_merged(ws, "K28", data.get("contact_phone_1"))
-    write_to_merged(ws, "V28", data.get("contact_phone_2"))
-    write_to_merged(ws, "AA28", data.get("contact_phone_3"))
-    write_to_merged(ws, "AF28", data.get("contact_email"))
-
-    # 助成区分 - 事業展開等リスキリング支援コース
-    subsidy_type = data.get("subsidy_type", "1")
-    is_subscription = data.get("is_subscription", False)
-    if subsidy_type == "1":
-        set_checkbox(ws, "M36", True)
-    elif subsidy_type == "2":
-        set_checkbox(ws, "AA36", True)
-    elif subsidy_type == "3":
-        set_checkbox(ws, "AO36", True)
-    if is_subscription:
-        set_checkbox(ws, "AH37", True)
-    else:
-        set_checkbox(ws, "M37", True)
-
-    # コース名・受講者数
-    write_to_merged(ws, "K40", data.get("course_name"))
-    write_to_merged(ws, "AG40", data.get("num_trainees"))
-
-    # 訓練期間
-    write_to_merged(ws, "N42", data.get("training_start_year"))
-    write_to_merged(ws, "T42", data.get("training_start_month"))
-    write_to_merged(ws, "Z42", data.get("training_start_day"))
-    write_to_merged(ws, "AI42", data.get("training_end_year"))
-    write_to_merged(ws, "AO42", data.get("training_end_month"))
-    write_to_merged(ws, "AU42", data.get("training_end_day"))
-
-    # 実施場所
-    write_to_merged(ws, "K45", data.get("training_location"))
-
-    # 実施方法
-    method = data.get("training_method", "1")
-    if method == "1":
-        set_checkbox(ws, "M47", True)
-    elif method == "2":
-        set_checkbox(ws, "W47", True)
-    elif method == "3":
-        set_checkbox(ws, "AH47", True)
-    elif method == "4":
-        set_checkbox(ws, "AR47", True)
-
-    # 変更理由
-    write_to_merged(ws, "B63", data.get("change_reason", ""))
-
-    wb.save(output_path)
-    wb.close()
+    fill_form("2_1", data, output_path)
 
 
 def generate_form_14_1(data, output_path):
     """様式第14-1号 定額制サービスによる訓練に関する事業所確認票"""
-    template = os.path.join(PLAN_DIR,
-        "様式第14-1号人材開発支援助成金（事業展開等リスキリング支援コース） 定額制サービスによる訓練に関する事業所確認票.xlsx")
-    shutil.copy2(template, output_path)
-    wb = load_workbook(output_path)
-    ws = wb[wb.sheetnames[0]]
-
-    # 提出日
-    safe_write(ws, "R3", data.get("submit_year"))
-    safe_write(ws, "U3", data.get("submit_month"))
-    safe_write(ws, "W3", data.get("submit_day"))
-
-    # 労働局
-    safe_write(ws, "B4", data.get("labor_bureau"))
-
-    # 事業主
-    write_to_merged(ws, "L8", data.get("company_name"))
-    write_to_merged(ws, "L10", data.get("company_address"))
-
-    # 訓練コース名
-    write_to_merged(ws, "F12", data.get("course_name"))
-
-    # 申請事業所
-    write_to_merged(ws, "B16", data.get("office_name"))
-    write_to_merged(ws, "G16", data.get("office_number_1"))
-    write_to_merged(ws, "L16", data.get("office_number_2"))
-    safe_write(ws, "S16", data.get("office_number_3"))
-    write_to_merged(ws, "T16", data.get("num_trainees"))
-
-    # 他事業所から申請しないチェック
-    set_checkbox(ws, "B46", True)
-
-    wb.save(output_path)
-    wb.close()
+    fill_form("14_1", data, output_path)
 
 
 def generate_form_14_2(data, output_path):
     """様式第14-2号 本社一括申請に関する事業所確認票"""
-    template = os.path.join(PLAN_DIR,
-        "様式第14-2号人材開発支援助成金（事業展開等リスキリング支援コース） 本社一括申請に関する事業所確認票.xlsx")
-    shutil.copy2(template, output_path)
-    wb = load_workbook(output_path)
-    ws = wb[wb.sheetnames[0]]
-
-    # 提出日
-    safe_write(ws, "T3", data.get("submit_year"))
-    safe_write(ws, "W3", data.get("submit_month"))
-    safe_write(ws, "Y3", data.get("submit_day"))
-
-    # 労働局
-    safe_write(ws, "B5", data.get("labor_bureau"))
-
-    # 事業主
-    write_to_merged(ws, "M9", data.get("company_name"))
-    write_to_merged(ws, "M10", data.get("company_address"))
-
-    # 訓練コース名
-    write_to_merged(ws, "F12", data.get("course_name"))
-
-    # 本社事業所
-    write_to_merged(ws, "B17", data.get("office_name"))
-    write_to_merged(ws, "G17", data.get("office_number_1"))
-    write_to_merged(ws, "L17", data.get("office_number_2"))
-    safe_write(ws, "S17", data.get("office_number_3"))
-
-    # 一括申請チェック
-    set_checkbox(ws, "B45", True)
-
-    wb.save(output_path)
-    wb.close()
+    fill_form("14_2", data, output_path)
 
 
 def generate_form_7(data, output_path):
     """様式第7号 自発的職業能力開発に関する申立書"""
-    template = os.path.join(APP_DIR,
-        "様式第7号人材開発支援助成金（事業展開等リスキリング支援コース）自発的職業能力開発に関する申立書.xlsx")
-    shutil.copy2(template, output_path)
-    wb = load_workbook(output_path)
-    ws = wb[wb.sheetnames[0]]
-
-    # コース名・機関名
-    write_to_merged(ws, "I9", data.get("course_name"))
-    write_to_merged(ws, "I10", data.get("training_org_name"))
-
-    # 受講料
-    write_to_merged(ws, "I11", data.get("total_training_fee"))
-    write_to_merged(ws, "I12", data.get("employer_fee_share"))
-    write_to_merged(ws, "I13", data.get("worker_fee_share", "0"))
-
-    # 日付
-    safe_write(ws, "A21", data.get("app_year"))
-    safe_write(ws, "E21", data.get("app_month"))
-    safe_write(ws, "H21", data.get("app_day"))
-
-    # 労働局
-    safe_write(ws, "B23", data.get("labor_bureau"))
-
-    wb.save(output_path)
-    wb.close()
+    fill_form("7", data, output_path)
 
 
 def generate_form_8_4(data, output_path):
     """様式第8-4号 通信制訓練実施結果報告書"""
-    template = os.path.join(APP_DIR,
-        "様式第8-4号人材開発支援助成金（事業展開等リスキリング支援コース）通信制訓練実施結果報告書.xlsx")
-    shutil.copy2(template, output_path)
-    wb = load_workbook(output_path)
-    ws = wb[wb.sheetnames[0]]
-
-    # 事業所名
-    write_to_merged(ws, "C6", data.get("office_name"))
-
-    # 訓練コース名
-    write_to_merged(ws, "C7", data.get("course_name"))
-
-    # 訓練期間
-    safe_write(ws, "J8", data.get("training_start_year"))
-    safe_write(ws, "N8", data.get("training_start_month"))
-    safe_write(ws, "Q8", data.get("training_start_day"))
-    safe_write(ws, "X8", data.get("training_end_year"))
-    safe_write(ws, "AB8", data.get("training_end_month"))
-    safe_write(ws, "AE8", data.get("training_end_day"))
-
-    wb.save(output_path)
-    wb.close()
+    fill_form("8_4", data, output_path)
 
 
 def generate_form_8_5(data, output_path):
     """様式第8-5号 定額制サービスによる訓練実施結果報告書"""
-    template = os.path.join(APP_DIR,
-        "様式第8-5号人材開発支援助成金（事業展開等リスキリング支援コース） 定額制サービスによる訓練実施結果報告書.xlsx")
-    shutil.copy2(template, output_path)
-    wb = load_workbook(output_path)
-    ws = wb[wb.sheetnames[0]]
-
-    # 事業所名
-    write_to_merged(ws, "A5", data.get("office_name"))
+    fill_form("8_5", data, output_path)
+
+
+# 様式ID -> 生成関数
+FORM_GENERATORS = {
+    "1_1": generate_form_1_1,
+    "1_3": generate_form_1_3,
+    "3_1": generate_form_3_1,
+    "3_2": generate_form_3_2,
+    "11": generate_form_11,
+    "4_2": generate_form_4_2,
+    "5": generate_form_5,
+    "6_2": generate_form_6_2,
+    "6_3": generate_form_6_3,
+    "8_1": generate_form_8_1,
+    "8_3": generate_form_8_3,
+    "12": generate_form_12,
+    "13": generate_form_13,
+    "10": generate_form_10,
+    "2_1": generate_form_2_1,
+    "14_1": generate_form_14_1,
+    "14_2": generate_form_14_2,
+    "7": generate_form_7,
+    "8_4": generate_form_8_4,
+    "8_5": generate_form_8_5,
+}
+
+
+# 並列生成の設定（ワーカー数1なら逐次実行）
+GENERATION_WORKERS = int(os.environ.get("JINZAI_WORKERS", "1"))
+GENERATION_EXECUTOR = os.environ.get("JINZAI_EXECUTOR", "process")  # process / thread
+# プロセスプールのワーカーの起動方式（fork / spawn / forkserver。空ならOSの既定）
+START_METHOD = os.environ.get("JINZAI_START_METHOD", "")
+
+_executors = {}
+# プロセスプールのワーカーに渡した共有テンプレート（shared_templates.py）
+_shared = []
+_executors_lock = threading.Lock()
+
+
+def preload_templates(form_ids=None):
+    """各様式の生成方式に合わせてテンプレートを事前に解析しておく（存在しないものは無視）"""
+    form_ids = FORM_TEMPLATES if form_ids is None else form_ids
+    preload(FORM_TEMPLATES[f] for f in form_ids if form_engine(f) == "openpyxl")
+    for form_id in form_ids:
+        if form_engine(form_id) == "patch" and os.path.exists(FORM_TEMPLATES[form_id]):
+            try:
+                patch_template(FORM_TEMPLATES[form_id]).sheet(FORM_SPECS[form_id].sheet)
+            except PatchUnsupported:
+                preload([FORM_TEMPLATES[form_id]])
+
+
+def preload_variants(samples, form_ids=None):
+    """入力の例（前処理済み）の分岐について、patch方式の様式のテンプレートの変種を先に作っておく"""
+    form_ids = FORM_TEMPLATES if form_ids is None else form_ids
+    for data in samples:
+        for form_id in form_ids:
+            template = FORM_TEMPLATES[form_id]
+            if form_engine(form_id) != "patch" or not os.path.exists(template):
+                continue
+            variant, _ = form_variant_writes(form_id, data)
+            if variant is not None:
+                try:
+                    patch_variant(template, *variant)
+                except PatchUnsupported:
+                    pass
+
+
+def get_executor(kind, workers):
+    """並列生成用のプールを返す（同じ設定のプールは使い回す）"""
+    key = (kind, workers)
+    with _executors_lock:
+        executor = _executors.get(key)
+        if executor is None:
+            # プールのモジュール（multiprocessingなど）は使うときまで読み込まない
+            if kind == "process":
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                import shared_templates
+
+                # 子プロセスはfork時点のテンプレートキャッシュを引き継ぐので、先に親で解析しておく
+                # （変種は既定の入力の分岐の分だけ。ほかの分岐は子プロセスで最初に使うときに作る）
+                # fork以外で起動する子プロセスには、解析済みのテンプレートを共有ファイルで渡す
+                preload_templates()
+                preload_variants([preprocess_data({})])
+                context = multiprocessing.get_context(START_METHOD or None)
+                if context.get_start_method() != "fork" and shared_templates.SHARED_TEMPLATES:
+                    shared = shared_templates.publish(FORM_TEMPLATES.values())
+                    _shared.append(shared)
+                    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                                   initializer=shared_templates.attach, initargs=(shared,))
+                else:
+                    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            elif kind == "thread":
+                from concurrent.futures import ThreadPoolExecutor
+
+                executor = ThreadPoolExecutor(max_workers=workers)
+            else:
+                raise ValueError(f"不明な実行方式です: {kind}")
+            _executors[key] = executor
+        return executor
+
+
+@atexit.register
+def shutdown_executors():
+    """並列生成用のプールを終了する"""
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        _executors.clear()
+        if _shared:
+            import shared_templates
+
+            for shared in _shared:
+                shared_templates.release(shared)
+            _shared.clear()
+
+
+def generate_form(form_id, data, output_path, page=SINGLE_PAGE):
+    """様式IDを指定して1つの書類（のうち1ページ）を生成する"""
+    fill_form(form_id, data, output_path, page=page)
+
+
+def render_form(form_id, data, page=SINGLE_PAGE):
+    """1つの書類をメモリ上で生成し、xlsxのバイト列を返す"""
+    buffer = io.BytesIO()
+    generate_form(form_id, data, buffer, page)
+    return buffer.getvalue()
+
+
+@functools.lru_cache(maxsize=None)
+def form_capacity(form_id):
+    """1ページに載る受講者数（受講者一覧のない書類はNone）"""
+    return rows_capacity(FORM_SPECS[form_id].ops)
+
+
+def form_pages(form_id, data):
+    """書類を何ページに分けて生成するか（Pageのリスト）
+
+    受講者一覧が1ページに収まらない書類は、テンプレートを複製してページごとに別のブックにする。
+    """
+    capacity = form_capacity(form_id)
+    if capacity is None:
+        return [SINGLE_PAGE]
+    total = len(data.get("workers", []))
+    count = max(1, -(-total // capacity))
+    return [Page(number, count, (number - 1) * capacity, total) for number in range(1, count + 1)]
+
+
+def _page_payload(form_id, data, page):
+    """プールに渡す入力（そのページの受講者だけに絞り、ページ数に比例した転送量にする）"""
+    if page.count == 1:
+        return data, page
+    capacity = form_capacity(form_id)
+    return data.replace(workers=data.workers[page.start:page.start + capacity]), page._replace(start=0)
+
+
+def page_arcname(arcname, page):
+    """ページに分けた書類のファイル名（1ページなら元の名前のまま）"""
+    if page.count == 1:
+        return arcname
+    stem, ext = os.path.splitext(arcname)
+    return f"{stem}_{page.number:0{len(str(page.count))}d}{ext}"
+
+
+def document_parts(plan, data):
+    """書類の一覧をページ単位に展開し、[(様式ID, Page, ZIP内のパス)] を返す"""
+    return [(form_id, page, page_arcname(arcname, page))
+            for form_id, arcname in plan for page in form_pages(form_id, data)]
+
+
+@functools.lru_cache(maxsize=None)
+def form_inputs(form_id):
+    """書類が依存する入力項目名のタプル（対応表から求める）
+
+    項目名を実行時に組み立てる読み出しがある書類はNone（入力全体に依存）。
+    """
+    try:
+        return tuple(sorted(ops_inputs(FORM_SPECS[form_id].ops)))
+    except DynamicKeyError:
+        return None
+
+
+def _inputs_equal(form_id, prev_data, new_data):
+    keys = form_inputs(form_id)
+    if keys is None:
+        return prev_data == new_data
+    missing = object()
+    return all(prev_data.get(k, missing) == new_data.get(k, missing) for k in keys)
+
+
+def changed_forms(prev_data, new_data, form_ids=None):
+    """前回と今回の入力で、依存する項目が変わった書類の様式IDを返す"""
+    form_ids = FORM_GENERATORS if form_ids is None else form_ids
+    return [form_id for form_id in form_ids if not _inputs_equal(form_id, prev_data, new_data)]
+
+
+def iter_rendered_forms(parts, data, workers=None, executor=None):
+    """複数の書類を生成し、xlsxのバイト列をpartsの順に返す
+
+    parts: 様式ID、または (様式ID, Page) の並び
+    結果キャッシュにある書類は作り直さない。並列実行時は未キャッシュの書類を
+    まとめてプールに投げ、完成したものから順序どおりに返す。
+    """
+    parts = [(part, SINGLE_PAGE) if isinstance(part, str) else part for part in parts]
+    # 入力のハッシュは様式ごとに一度だけ求める（ページ数に比例して重くしない）
+    digests = {}
+    stamps = {}
+    for form_id, _ in parts:
+        if form_id not in digests:
+            digests[form_id] = form_digest(form_inputs(form_id), data)
+            stamps[form_id] = form_stamp(form_id)
+    contents = [lookup_form(form_id, (stamps[form_id], page), digests[form_id])
+                for form_id, page in parts]
+    missing = [i for i, content in enumerate(contents) if content is None]
+
+    workers = GENERATION_WORKERS if workers is None else workers
+    futures = {}
+    if workers > 1 and len(missing) > 1:
+        pool = get_executor(executor or GENERATION_EXECUTOR, workers)
+        for i in missing:
+            form_id, page = parts[i]
+            futures[i] = pool.submit(render_form, form_id, *_page_payload(form_id, data, page))
+
+    for i, (form_id, page) in enumerate(parts):
+        if contents[i] is None:
+            if i in futures:
+                content = futures.pop(i).result()
+            else:
+                content = render_form(form_id, data, page)
+            store_form(form_id, (stamps[form_id], page), digests[form_id], content)
+            contents[i] = content
+        yield contents[i]
+        contents[i] = None
+
+
+def run_form_jobs(jobs, data, workers=None, executor=None):
+    """(様式ID または (様式ID, Page), 出力先) の一覧を実行する
+
+    各様式は独立したテンプレートと出力先を持つので並列に生成できる。
+    結果の順序はjobsの順序のまま（ZIP内の並びを固定するため）。
+    """
+    rendered = iter_rendered_forms((part for part, _ in jobs), data,
+                                   workers=workers, executor=executor)
+    for (_, path), content in zip(jobs, rendered):
+        with open(path, "wb") as f:
+            f.write(content)
+    return [path for _, path in jobs]
+
+
+def build_document_plan(data):
+    """生成する書類の一覧を ((様式ID, ZIP内のパス), ...) で返す（document_plan.document_plan）"""
+    return document_plan(data)
+
+
+def _documents_key(data, plan):
+    """書類一式のキャッシュキー（入力データと使うテンプレートのスタンプ）"""
+    stamps = tuple(form_stamp(form_id) for form_id, _ in plan)
+    return payload_digest(data), stamps
+
+
+def generate_all_documents(data, output_dir=None, workers=None, executor=None, zip_stats=None):
+    """全書類を生成してZIPにまとめる
+
+    output_dir: 出力先（省略時は新しいジョブ用ワークスペースを作る）
+    workers: 並列ワーカー数（省略時は環境変数 JINZAI_WORKERS）
+    executor: "process" または "thread"（省略時は環境変数 JINZAI_EXECUTOR）
+    zip_stats: archive.ZipStats を渡すと、ZIPに書いたエントリの集計を加える
+               （キャッシュのZIPを使ったときは、そのエントリを所要時間0として加える）
+    """
+    # 出力先はジョブごとに分ける（同時実行しても互いのファイルを消さない）
+    if output_dir is None:
+        _, output_dir = create_workspace()
+    os.makedirs(output_dir, exist_ok=True)
 
-    wb.save(output_path)
-    wb.close()
+    plan = build_document_plan(data)
+    require_templates(form_id for form_id, _ in plan)
+
+    os.makedirs(os.path.join(output_dir, PLAN_FOLDER), exist_ok=True)
+    os.makedirs(os.path.join(output_dir, APP_FOLDER), exist_ok=True)
+    jobs = [((form_id, page), os.path.join(output_dir, arcname))
+            for form_id, page, arcname in document_parts(plan, data)]
+    generated_files = run_form_jobs(jobs, data, workers=workers, executor=executor)
+
+    # ZIPにまとめる（同じ入力で作ったZIPがあればそれを使う）
+    zip_path = os.path.join(output_dir, ZIP_NAME)
+    key = _documents_key(data, plan)
+    content = zip_cache.get(key)
+    if content is None:
+        buffer = io.BytesIO()
+        with stage("zip"), zipfile.ZipFile(buffer, 'w') as zf:
+            for fp in generated_files:
+                with open(fp, "rb") as f:
+                    write_entry(zf, os.path.relpath(fp, output_dir), f.read(), stats=zip_stats)
+        content = buffer.getvalue()
+        add_bytes("zip", len(content))
+        zip_cache.put(key, content)
+    elif zip_stats is not None:
+        zip_stats.add_archive(content)
+    with open(zip_path, "wb") as f:
+        f.write(content)
 
+    return zip_path, generated_files
 
-def generate_all_documents(data):
-    """全書類を生成してZIPにまとめる"""
-    # Vercel環境では/tmpに出力、ローカルではtool/output
-    if os.environ.get("VERCEL"):
-        output_dir = "/tmp/jinzai_output"
-    else:
-        output_dir = os.path.join(BASE_DIR, "tool", "output")
-    # 出力ディレクトリをクリア
-    if os.path.exists(output_dir):
-        shutil.rmtree(output_dir)
-    os.makedirs(output_dir, exist_ok=True)
 
-    plan_dir = os.path.join(output_dir, "01_計画届")
-    app_dir_out = os.path.join(output_dir, "02_支給申請")
-    os.makedirs(plan_dir, exist_ok=True)
-    os.makedirs(app_dir_out, exist_ok=True)
-
-    generated_files = []
-    is_subscription = data.get("is_subscription", False)
-    offjt_type = data.get("offjt_type", "3")
-    training_method = data.get("training_method", "1")
-
-    # === 計画届 ===
-    # 様式第1-1号（必須）
-    path = os.path.join(plan_dir, "様式第1-1号_職業訓練実施計画届.xlsx")
-    generate_form_1_1(data, path)
-    generated_files.append(path)
-
-    # 様式第1-3号（必須）
-    path = os.path.join(plan_dir, "様式第1-3号_事業展開等実施計画.xlsx")
-    generate_form_1_3(data, path)
-    generated_files.append(path)
-
-    # 様式第3-1号 or 3-2号（必須）
-    if is_subscription:
-        path = os.path.join(plan_dir, "様式第3-2号_定額制対象労働者一覧.xlsx")
-        generate_form_3_2(data, path)
-    else:
-        path = os.path.join(plan_dir, "様式第3-1号_対象労働者一覧.xlsx")
-        generate_form_3_1(data, path)
-    generated_files.append(path)
-
-    # 様式第11号（必須）
-    path = os.path.join(plan_dir, "様式第11号_事前確認書.xlsx")
-    generate_form_11(data, path)
-    generated_files.append(path)
-
-    # 様式第10号（事業内訓練の場合）
-    if offjt_type in ("1", "2"):
-        path = os.path.join(plan_dir, "様式第10号_OFF-JT講師要件確認書.xlsx")
-        generate_form_10(data, path)
-        generated_files.append(path)
-
-    # 様式第14-1号（定額制サービスの場合）
-    if is_subscription:
-        path = os.path.join(plan_dir, "様式第14-1号_定額制サービス事業所確認票.xlsx")
-        generate_form_14_1(data, path)
-        generated_files.append(path)
-
-    # 様式第14-2号（本社一括申請の場合）
-    if data.get("is_batch_application", False):
-        path = os.path.join(plan_dir, "様式第14-2号_本社一括申請事業所確認票.xlsx")
-        generate_form_14_2(data, path)
-        generated_files.append(path)
-
-    # === 支給申請 ===
-    # 様式第4-2号（必須）
-    path = os.path.join(app_dir_out, "様式第4-2号_支給申請書.xlsx")
-    generate_form_4_2(data, path)
-    generated_files.append(path)
-
-    # 様式第5号 賃金助成の内訳（通学制/同時双方向の場合）
-    if training_method in ("1", "2"):
-        path = os.path.join(app_dir_out, "様式第5号_賃金助成の内訳.xlsx")
-        generate_form_5(data, path)
-        generated_files.append(path)
-
-    # 様式第6-2号 or 6-3号 経費助成
-    if is_subscription:
-        path = os.path.join(app_dir_out, "様式第6-3号_定額制経費助成の内訳.xlsx")
-        generate_form_6_3(data, path)
-    else:
-        path = os.path.join(app_dir_out, "様式第6-2号_経費助成の内訳.xlsx")
-        generate_form_6_2(data, path)
-    generated_files.append(path)
-
-    # 様式第7号（自発的職業能力開発の場合）
-    if data.get("is_voluntary", False):
-        path = os.path.join(app_dir_out, "様式第7号_自発的職業能力開発申立書.xlsx")
-        generate_form_7(data, path)
-        generated_files.append(path)
-
-    # 様式第8系 実施状況報告書
-    if training_method in ("1", "2"):
-        path = os.path.join(app_dir_out, "様式第8-1号_OFF-JT実施状況報告書.xlsx")
-        generate_form_8_1(data, path)
-        generated_files.append(path)
-    elif training_method == "3":
-        path = os.path.join(app_dir_out, "様式第8-3号_eラーニング訓練実施結果報告書.xlsx")
-        generate_form_8_3(data, path)
-        generated_files.append(path)
-    elif training_method == "4":
-        path = os.path.join(app_dir_out, "様式第8-4号_通信制訓練実施結果報告書.xlsx")
-        generate_form_8_4(data, path)
-        generated_files.append(path)
-
-    # 様式第8-5号（定額制サービスの場合）
-    if is_subscription:
-        path = os.path.join(app_dir_out, "様式第8-5号_定額制訓練実施結果報告書.xlsx")
-        generate_form_8_5(data, path)
-        generated_files.append(path)
-
-    # 様式第12号 支給申請承諾書（事業外訓練の場合）
-    if offjt_type == "3":
-        path = os.path.join(app_dir_out, "様式第12号_支給申請承諾書.xlsx")
-        generate_form_12(data, path)
-        generated_files.append(path)
-
-    # 様式第13号 事業所確認票
-    if data.get("is_sme", True):
-        path = os.path.join(app_dir_out, "様式第13号_事業所確認票.xlsx")
-        generate_form_13(data, path)
-        generated_files.append(path)
-
-    # ZIPにまとめる
-    zip_path = os.path.join(output_dir, "人材開発支援助成金_申請書類一式.zip")
-    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-        for fp in generated_files:
-            arcname = os.path.relpath(fp, output_dir)
-            zf.write(fp, arcname)
+class _ZipStream(io.RawIOBase):
+    """ZipFileの書き込み先。書かれたバイト列を溜めておき、drain()で取り出す"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._position += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def render_documents(data, workers=None, executor=None):
+    """全書類をメモリ上で生成し、(ZIP内のパス, xlsxのバイト列) のリストを返す"""
+    plan = build_document_plan(data)
+    require_templates(form_id for form_id, _ in plan)
+    parts = document_parts(plan, data)
+    rendered = iter_rendered_forms(((form_id, page) for form_id, page, _ in parts), data,
+                                   workers=workers, executor=executor)
+    return [(arcname, content) for (_, _, arcname), content in zip(parts, rendered)]
+
+
+def regenerate_documents(prev_data, new_data, previous, workers=None, executor=None):
+    """前回の生成結果を使い回して、入力が変わった書類だけを作り直す
+
+    previous: 前回の結果 {ZIP内のパス: xlsxのバイト列}
+    戻り値は ([(ZIP内のパス, xlsxのバイト列), ...], 作り直した様式IDのリスト)。
+    前回なかった書類（分岐やページ数が変わって増えたもの）も作り直しに含まれる。
+    """
+    plan = build_document_plan(new_data)
+    require_templates(form_id for form_id, _ in plan)
+    changed = set(changed_forms(prev_data, new_data, [form_id for form_id, _ in plan]))
+    parts = document_parts(plan, new_data)
+    rebuild = [part for part in parts if part[0] in changed or part[2] not in previous]
+    rendered = dict(zip((arcname for _, _, arcname in rebuild),
+                        iter_rendered_forms(((form_id, page) for form_id, page, _ in rebuild), new_data,
+                                            workers=workers, executor=executor)))
+    documents = [(arcname, rendered[arcname] if arcname in rendered else previous[arcname])
+                 for _, _, arcname in parts]
+    rebuilt = list(dict.fromkeys(form_id for form_id, _, _ in rebuild))
+    return documents, rebuilt
+
+
+def _preview_value(value):
+    return value if isinstance(value, (str, int, float, bool)) else str(value)
+
+
+def preview_documents(data):
+    """全書類の書き込み計画（どのセルに何を書くか）を、ブックを作らずに求める
+
+    書類の選び方とページ分けは generate_all_documents、セルへの当てはめは generate_form_* と同じ。
+    マージ範囲はpatch方式と同じくシートXMLから求めるので、openpyxlは使わない
+    （前処理済みの手順はテンプレートが変わるまで使い回すので、2回目以降はテンプレートも読まない）。
+    テンプレートのない書類は error を入れて返し、他の書類の計画は返す。
+    """
+    documents = []
+    for form_id, page, arcname in document_parts(build_document_plan(data), data):
+        document = {"form_id": form_id, "title": FORM_SPECS[form_id].title, "path": arcname,
+                    "page": page.number, "pages": page.count}
+        try:
+            writes = form_writes(form_id, data, "patch", page)
+        except OSError:
+            document["error"] = f"テンプレートが見つかりません: {os.path.basename(FORM_TEMPLATES[form_id])}"
+        else:
+            document["writes"] = [{"sheet": w.sheet, "cell": w.cell, "value": _preview_value(w.value)}
+                                  for w in writes]
+        documents.append(document)
+    return documents
+
+
+def iter_documents_zip(data, workers=None, executor=None, zip_stats=None):
+    """全書類をメモリ上で生成し、ZIPのバイト列を書類ごとに順次返す
+
+    一時ファイルを使わず、各書類が出来上がった時点でZIPエントリとして送り出す。
+    テンプレートの不足は最初のチャンクを返す前に例外になる。
+    同じ入力のZIPがキャッシュにあれば、それを一度に返す。
+    zip_stats: archive.ZipStats を渡すと、ZIPに書いたエントリの集計を加える
+    """
+    plan = build_document_plan(data)
+    require_templates(form_id for form_id, _ in plan)
+
+    key = _documents_key(data, plan)
+    cached = zip_cache.get(key)
+    if cached is not None:
+        if zip_stats is not None:
+            zip_stats.add_archive(cached)
+        yield cached
+        return
 
-    return zip_path, generated_files
+    parts = document_parts(plan, data)
+    rendered = iter_rendered_forms(((form_id, page) for form_id, page, _ in parts), data,
+                                   workers=workers, executor=executor)
+    sent = []
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w') as zf:
+        for (_, _, arcname), content in zip(parts, rendered):
+            with stage("zip"):
+                write_entry(zf, arcname, content, stats=zip_stats)
+            chunk = stream.drain()
+            sent.append(chunk)
+            yield chunk
+    chunk = stream.drain()
+    sent.append(chunk)
+    yield chunk
+    content = b"".join(sent)
+    add_bytes("zip", len(content))
+    zip_cache.put(key, content)
@@ -0,0 +1,136 @@
+"""
+非同期ジョブキュー
+生成処理をリクエストスレッドから切り離し、プロセス内のワーカーで実行する。
+状態はメモリ上、またはSQLite（JINZAI_JOB_DB を指定した場合）に保存し、ジョブIDで問い合わせる。
+外部のブローカーは使わない。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from workspace import WORKSPACE_TTL, in_use, new_job_id
+
+JOB_WORKERS = int(os.environ.get("JINZAI_JOB_WORKERS", "2"))
+JOB_DB = os.environ.get("JINZAI_JOB_DB", "")
+
+
+class MemoryJobStore:
+    """プロセス内の辞書にジョブ状態を持つ"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def put(self, job):
+        with self._lock:
+            self._jobs[job["id"]] = dict(job)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields, updated=time.time())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def prune(self, max_age):
+        limit = time.time() - max_age
+        with self._lock:
+            for job_id in [k for k, v in self._jobs.items() if v["updated"] < limit]:
+                del self._jobs[job_id]
+
+
+class SQLiteJobStore:
+    """SQLiteファイルにジョブ状態を持つ（同じホストの複数ワーカープロセスから参照できる）"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, body TEXT NOT NULL, updated REAL NOT NULL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def put(self, job):
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO jobs (id, body, updated) VALUES (?, ?, ?)",
+                         (job["id"], json.dumps(job, ensure_ascii=False), job["updated"]))
+
+    def update(self, job_id, **fields):
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT body FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            job = json.loads(row[0])
+            job.update(fields, updated=time.time())
+            conn.execute("UPDATE jobs SET body = ?, updated = ? WHERE id = ?",
+                         (json.dumps(job, ensure_ascii=False), job["updated"], job_id))
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT body FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def prune(self, max_age):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE updated < ?", (time.time() - max_age,))
+
+
+store = SQLiteJobStore(JOB_DB) if JOB_DB else MemoryJobStore()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+        return _executor
+
+
+def _run(job_id, func, args):
+    store.update(job_id, status="running")
+
+    def progress(done, total=None):
+        fields = {"done": done}
+        if total is not None:
+            fields["total"] = total
+        store.update(job_id, **fields)
+
+    try:
+        # 実行中はワークスペースを掃除で消さない
+        with in_use(job_id):
+            result = func(job_id, *args, progress=progress)
+        store.update(job_id, status="done", result=result)
+    except Exception as e:
+        store.update(job_id, status="error", error=str(e), trace=traceback.format_exc())
+
+
+def submit(kind, func, *args, total=None):
+    """ジョブを登録してワーカーに渡し、すぐにジョブIDを返す
+
+    funcは func(job_id, *args, progress=...) の形で呼ばれ、戻り値（JSONにできる値）が
+    ジョブの result になる。progress(done, total) で進捗を記録できる。
+    """
+    store.prune(WORKSPACE_TTL)
+    job_id = new_job_id()
+    now = time.time()
+    store.put({"id": job_id, "kind": kind, "status": "queued", "done": 0, "total": total,
+               "result": None, "error": None, "created": now, "updated": now})
+    _get_executor().submit(_run, job_id, func, args)
+    return job_id
+
+
+def get_job(job_id):
+    """ジョブの状態を返す（存在しなければNone）"""
+    return store.get(job_id)
@@ -0,0 +1,490 @@
+"""
+宣言的なセル対応表の実行エンジン
+form_specs.py の対応表（項目→セル、チェックボックス、条件付きの欄、受講者の繰り返し行）を
+テンプレートごとに平坦な書き込み計画へ前処理し、リクエストごとには値を当てはめるだけにする。
+"""
+
+import functools
+import threading
+from collections import namedtuple
+
+from dependencies import derive_inputs
+
+CHECKED = "☑"
+
+# --- 対応表の部品 ---
+# 書込みモード: safe=False はマージ範囲の中のセルならその左上に書き、
+# safe=True はマージ範囲の左上以外のセルには書かない（結合セルの一部を指す対応表でも壊さない）
+Field = namedtuple("Field", "cell key default safe", defaults=(None, False))
+Const = namedtuple("Const", "cell value safe", defaults=(False,))
+Computed = namedtuple("Computed", "cell func safe", defaults=(False,))
+# 値に応じて1つのセルにチェック（cells: 値 -> セル、該当なしはotherwise）
+Choice = namedtuple("Choice", "key cells default otherwise", defaults=(None, None))
+When = namedtuple("When", "cond ops otherwise", defaults=((),))
+# 受講者の繰り返し行（blocks: RowBlockの並び。継紙のように記入欄が途切れる様式は複数のブロックにする）
+Rows = namedtuple("Rows", "blocks columns")
+# 記入欄の行範囲（base_row から step 行ごとに last_row まで）
+RowBlock = namedtuple("RowBlock", "base_row step last_row")
+RowField = namedtuple("RowField", "column key safe", defaults=(True,))
+# 通し番号（No.欄。1ページ目の先頭からの連番を、受講者のいない行も含めてページの全行に書く）
+RowNumber = namedtuple("RowNumber", "column")
+# 値に応じて (列, 行オフセット) にチェック
+RowChoice = namedtuple("RowChoice", "key cells default otherwise", defaults=(None, None))
+# ページ番号・総ページ数（受講者が1ページに収まらないときは書類をページごとに分ける）
+# block: 繰り返し行のブロック番号（本紙0、継紙1）。指定すると、書類のページではなく受講者を書いた
+# ブロックを1枚と数え、そのブロックに受講者がいなければ書かない（継紙の「枚中・枚目」欄）
+PageNumber = namedtuple("PageNumber", "cell safe block", defaults=(False, None))
+PageCount = namedtuple("PageCount", "cell safe block", defaults=(False, None))
+
+# 条件: truthy=True なら data.get(key, default) の真偽、そうでなければ values に含まれるか
+Cond = namedtuple("Cond", "key default values truthy")
+
+# 書類の定義（engine: 生成方式 "openpyxl" / "patch"、Noneなら既定の方式）
+Form = namedtuple("Form", "title ops sheet engine", defaults=(0, None))
+
+# 書き込み計画の1件（sheetはワークブック内のシート番号）
+Write = namedtuple("Write", "sheet cell value safe")
+
+# 生成するページ（number/count: ページ番号/総ページ数、start: このページの先頭の受講者の位置、
+# total: 受講者の総数（ページに分けたときだけ。1ページなら入力の受講者数を使う））
+Page = namedtuple("Page", "number count start total", defaults=(0,))
+SINGLE_PAGE = Page(1, 1, 0)
+
+
+def Check(cell):
+    """常にチェックを入れる"""
+    return Const(cell, CHECKED)
+
+
+def Flag(key, default=False):
+    return Cond(key, default, (), True)
+
+
+def OneOf(key, values, default=None):
+    return Cond(key, default, tuple(values), False)
+
+
+# --- 入力項目の解析 ---
+
+def _cond_keys(cond):
+    return {cond.key}
+
+
+def ops_inputs(ops):
+    """対応表が読む入力項目名の集合"""
+    keys = set()
+    for op in ops:
+        if isinstance(op, (Field, Choice)):
+            keys.add(op.key)
+        elif isinstance(op, Computed):
+            keys |= derive_inputs(op.func)
+        elif isinstance(op, When):
+            keys |= _cond_keys(op.cond) | ops_inputs(op.ops) | ops_inputs(op.otherwise)
+        elif isinstance(op, (Rows, PageNumber, PageCount)):
+            keys.add("workers")
+    return keys
+
+
+# 選択肢の「該当なし」を表す分岐の値
+_OTHERWISE = object()
+
+
+def ops_targets(ops, branch=()):
+    """対応表の書き込み先を (セル番地, safe, 分岐) で列挙する（条件の両側、繰り返し行の全行を含む）
+
+    分岐は書き込みに至るまでの選択 ((条件 or 選択肢の項目, 値), ...) の並び。
+    2つの書き込みの分岐に、同じ条件・項目で値の違う選択があれば、同時には書かれない。
+    """
+    for op in ops:
+        if isinstance(op, When):
+            yield from ops_targets(op.ops, branch + ((op.cond, True),))
+            yield from ops_targets(op.otherwise, branch + ((op.cond, False),))
+        elif isinstance(op, Choice):
+            for value, cell in op.cells.items():
+                yield cell, False, branch + (((Choice, op.key), value),)
+            if op.otherwise:
+                yield op.otherwise, False, branch + (((Choice, op.key), _OTHERWISE),)
+        elif isinstance(op, Rows):
+            for row in row_numbers(op):
+                for column in op.columns:
+                    if isinstance(column, RowField):
+                        yield f"{column.column}{row}", column.safe, branch
+                    elif isinstance(column, RowNumber):
+                        yield f"{column.column}{row}", False, branch
+                    else:
+                        choice = (RowChoice, column.key, row)
+                        for value, (col, offset) in column.cells.items():
+                            yield f"{col}{row + offset}", False, branch + ((choice, value),)
+                        if column.otherwise is not None:
+                            col, offset = column.otherwise
+                            yield f"{col}{row + offset}", False, branch + ((choice, _OTHERWISE),)
+        else:
+            yield op.cell, op.safe, branch
+
+
+def ops_cells(ops):
+    """対応表の書き込み先になりうるセル番地を列挙する"""
+    return (cell for cell, _, _ in ops_targets(ops))
+
+
+def _disjoint(cond, other):
+    """どちらも成り立つことのない OneOf の条件か（同じ項目・既定値で、値の重なりがない）"""
+    return (isinstance(cond, Cond) and isinstance(other, Cond) and not cond.truthy and not other.truthy
+            and cond[:2] == other[:2] and not set(cond.values) & set(other.values))
+
+
+def exclusive(branch, other):
+    """2つの分岐が同時には成り立たないか"""
+    choices = dict(branch)
+    if any(key in choices and choices[key] != value for key, value in other):
+        return True
+    return any(value is True and choices[key] is True and _disjoint(key, cond)
+               for key in choices for cond, value in other)
+
+
+def _row_blocks(ops):
+    """対応表の繰り返し行のブロック（なければNone）"""
+    for op in ops:
+        if isinstance(op, When):
+            blocks = _row_blocks(op.ops) or _row_blocks(op.otherwise)
+            if blocks:
+                return blocks
+        elif isinstance(op, Rows):
+            return op.blocks
+    return None
+
+
+def _capacities(ops):
+    for op in ops:
+        if isinstance(op, When):
+            yield from _capacities(op.ops)
+            yield from _capacities(op.otherwise)
+        elif isinstance(op, Rows):
+            yield len(row_numbers(op))
+
+
+def row_numbers(rows):
+    """繰り返し行の記入欄の行番号（上から順）"""
+    return tuple(row for block in rows.blocks
+                 for row in range(block.base_row, block.last_row + 1, block.step))
+
+
+def rows_capacity(ops):
+    """1ページに載る受講者数（繰り返し行がなければNone）"""
+    return min(_capacities(ops), default=None)
+
+
+# --- 前処理（コンパイル） ---
+
+Step = namedtuple("Step", "guards kind cell arg safe")
+
+
+def _resolve(cell, merge_index, safe):
+    """書き込み先のセル番地。safeモードでマージ範囲の左上以外ならNone（書かない）"""
+    anchor = merge_index.get(cell, cell)
+    if safe:
+        return cell if anchor == cell else None
+    return anchor
+
+
+def _compile_ops(ops, guards, merge_index, steps, sizes=None):
+    for op in ops:
+        if isinstance(op, When):
+            _compile_ops(op.ops, guards + ((op.cond, True),), merge_index, steps, sizes)
+            _compile_ops(op.otherwise, guards + ((op.cond, False),), merge_index, steps, sizes)
+        elif isinstance(op, Choice):
+            cells = {value: _resolve(cell, merge_index, False) for value, cell in op.cells.items()}
+            otherwise = _resolve(op.otherwise, merge_index, False) if op.otherwise else None
+            steps.append(Step(guards, "choice", None, (op.key, op.default, cells, otherwise), False))
+        elif isinstance(op, Rows):
+            steps.append(Step(guards, "rows", None, (row_numbers(op), op.columns, merge_index), True))
+        elif isinstance(op, (PageNumber, PageCount)):
+            cell = _resolve(op.cell, merge_index, op.safe)
+            if op.block is not None and not sizes:
+                raise TypeError(f"ブロック番号を指定したページ欄には繰り返し行が必要です: {op!r}")
+            if cell is not None:
+                field = "number" if isinstance(op, PageNumber) else "count"
+                steps.append(Step(guards, "page", cell, (field, sizes if op.block is not None else None, op.block),
+                                  op.safe))
+        else:
+            cell = _resolve(op.cell, merge_index, op.safe)
+            if cell is None:
+                continue
+            if isinstance(op, Field):
+                steps.append(Step(guards, "field", cell, (op.key, op.default), op.safe))
+            elif isinstance(op, Const):
+                steps.append(Step(guards, "const", cell, op.value, op.safe))
+            elif isinstance(op, Computed):
+                steps.append(Step(guards, "computed", cell, op.func, op.safe))
+            else:
+                raise TypeError(f"不明な対応表の部品です: {op!r}")
+
+
+def compile_form(form, merge_index):
+    """書類の対応表を、条件をガードとして持つ平坦な手順のタプルに変換する
+
+    マージ範囲の左上への付け替えはここで済ませるので、実行時には不要。
+    """
+    steps = []
+    blocks = _row_blocks(form.ops)
+    sizes = tuple(len(range(b.base_row, b.last_row + 1, b.step)) for b in blocks) if blocks else None
+    _compile_ops(form.ops, (), merge_index, steps, sizes)
+    return tuple(steps)
+
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def compiled_form(form_id, form, stamp, merge_index_loader):
+    """前処理済みの書き込み手順（テンプレートのスタンプが変わるまで使い回す）"""
+    key = (form_id, stamp)
+    steps = _compiled.get(key)
+    if steps is None:
+        steps = compile_form(form, merge_index_loader())
+        with _compiled_lock:
+            for old in [k for k in _compiled if k[0] == form_id]:
+                del _compiled[old]
+            _compiled[key] = steps
+    return steps
+
+
+def install_compiled(form_id, stamp, steps):
+    """前処理済みの手順（スナップショットから復元したもの）を登録する"""
+    with _compiled_lock:
+        for old in [k for k in _compiled if k[0] == form_id]:
+            del _compiled[old]
+        _compiled[(form_id, stamp)] = steps
+
+
+# --- 実行 ---
+
+def _reader(data):
+    """項目の読み出し関数 read(項目名, 既定値)
+
+    申請データ（application.Application）は属性を直接読む（get を経由するより速い）。
+    対応表の項目名はすべて申請データの属性なので、メソッド名と取り違えることはない。
+    """
+    return data.get if isinstance(data, dict) else functools.partial(getattr, data)
+
+
+def _cond_value(cond, read, cache):
+    result = cache.get(cond)
+    if result is None:
+        value = read(cond.key, cond.default)
+        result = bool(value) if cond.truthy else value in cond.values
+        cache[cond] = result
+    return result
+
+
+def _page_value(arg, data, page):
+    """ページ欄の値（ブロックを1枚と数える欄で、そのブロックに受講者がいなければNone）"""
+    field, sizes, block = arg
+    if sizes is None:
+        return str(getattr(page, field))
+    total = page.total if page.count > 1 else len(data.get("workers", []))
+    capacity = sum(sizes)
+    first = (page.number - 1) * capacity + sum(sizes[:block])
+    if block and first >= total:
+        return None
+    if field == "number":
+        return str((page.number - 1) * len(sizes) + block + 1)
+    full, rest = divmod(total, capacity)
+    used = 0
+    while rest > 0:
+        rest -= sizes[used]
+        used += 1
+    return str(max(1, full * len(sizes) + used))
+
+
+def _row_writes(numbers, columns, merge_index, sheet, data, page, writes):
+    # 通し番号は受講者のいない行にも書く（テンプレートの番号は1ページ目のもの）
+    offset = (page.number - 1) * len(numbers)
+    for column in columns:
+        if isinstance(column, RowNumber):
+            for i, row in enumerate(numbers):
+                cell = _resolve(f"{column.column}{row}", merge_index, False)
+                writes.append(Write(sheet, cell, offset + i + 1, False))
+    workers = data.get("workers", [])[page.start:page.start + len(numbers)]
+    for row, worker in zip(numbers, workers):
+        for column in columns:
+            if isinstance(column, RowNumber):
+                continue
+            if isinstance(column, RowField):
+                cell = _resolve(f"{column.column}{row}", merge_index, column.safe)
+                value = worker.get(column.key)
+                if cell is not None and value is not None and value != "":
+                    writes.append(Write(sheet, cell, value, column.safe))
+            else:
+                target = column.cells.get(worker.get(column.key, column.default), column.otherwise)
+                if target is not None:
+                    col, offset = target
+                    cell = _resolve(f"{col}{row + offset}", merge_index, False)
+                    writes.append(Write(sheet, cell, CHECKED, False))
+
+
+def evaluate(steps, data, sheet=0, page=SINGLE_PAGE):
+    """前処理済みの手順に入力データを当てはめ、書き込み計画（Writeのリスト）を返す
+
+    値がNoneまたは空文字の書き込みは計画に含めない（テンプレートの内容を残す）。
+    繰り返し行には page.start 人目から1ページ分の受講者だけを書く。
+    """
+    writes = []
+    conds = {}
+    read = _reader(data)
+    for step in steps:
+        if step.guards and not all(_cond_value(cond, read, conds) == expected
+                                   for cond, expected in step.guards):
+            continue
+        kind = step.kind
+        if kind == "field":
+            key, default = step.arg
+            value = read(key, default)
+        elif kind == "const":
+            value = step.arg
+        elif kind == "computed":
+            value = step.arg(data)
+        elif kind == "page":
+            value = _page_value(step.arg, data, page)
+        elif kind == "choice":
+            key, default, cells, otherwise = step.arg
+            cell = cells.get(read(key, default), otherwise)
+            if cell is not None:
+                writes.append(Write(sheet, cell, CHECKED, False))
+            continue
+        else:
+            numbers, columns, merge_index = step.arg
+            _row_writes(numbers, columns, merge_index, sheet, data, page, writes)
+            continue
+        if value is None or value == "":
+            continue
+        writes.append(Write(sheet, step.cell, value, step.safe))
+    return writes
+
+
+# --- 分岐ごとの部分評価 ---
+
+# 分岐の値の代わりに使う印（項目がない / 手順が区別しない値。truthy はその値の真偽）
+_UNSET = object()
+_Other = namedtuple("_Other", "truthy")
+
+
+def branch_domains(steps, keys):
+    """手順の条件・チェックが区別する値を {項目名: 値のfrozenset} で返す（keys のうち手順が使うものだけ）"""
+    domains = {}
+    for step in steps:
+        for cond, _ in step.guards:
+            if cond.key in keys:
+                domains.setdefault(cond.key, set()).update(cond.values)
+        if step.kind == "choice" and step.arg[0] in keys:
+            domains.setdefault(step.arg[0], set()).update(step.arg[2])
+    return {key: frozenset(values) for key, values in domains.items()}
+
+
+def _branch_token(value, values):
+    if value is _UNSET:
+        return value
+    try:
+        if value in values:
+            return value
+    except TypeError:
+        pass
+    return _Other(bool(value))
+
+
+def branch_of(domains, data):
+    """入力データの分岐（((項目名, 値), ...)）。手順が区別しない値は真偽だけを残してまとめる"""
+    read = _reader(data)
+    return tuple((key, _branch_token(read(key, _UNSET), values)) for key, values in sorted(domains.items()))
+
+
+def _branch_value(token, default):
+    return default if token is _UNSET else token
+
+
+def _branch_cond(cond, token):
+    if isinstance(token, _Other):
+        return token.truthy if cond.truthy else False
+    value = _branch_value(token, cond.default)
+    return bool(value) if cond.truthy else value in cond.values
+
+
+def _branch_choice(arg, token):
+    _, default, cells, otherwise = arg
+    if isinstance(token, _Other):
+        return otherwise
+    return cells.get(_branch_value(token, default), otherwise)
+
+
+def _step_cells(step):
+    """手順が書きうるセル番地"""
+    if step.kind == "choice":
+        _, _, cells, otherwise = step.arg
+        return {*cells.values(), otherwise} - {None}
+    if step.kind == "rows":
+        numbers, columns, merge_index = step.arg
+        cells = set()
+        for row in numbers:
+            for column in columns:
+                if isinstance(column, RowField):
+                    cells.add(_resolve(f"{column.column}{row}", merge_index, column.safe))
+                elif isinstance(column, RowNumber):
+                    cells.add(_resolve(f"{column.column}{row}", merge_index, False))
+                else:
+                    targets = [*column.cells.values(), column.otherwise]
+                    cells.update(_resolve(f"{col}{row + offset}", merge_index, False)
+                                 for col, offset in filter(None, targets))
+        return cells - {None}
+    return {step.cell}
+
+
+def specialize(steps, branch, sheet=0):
+    """手順を分岐の値で部分評価し、(焼き込む書き込み, 残りの手順) を返す
+
+    分岐の値だけで決まる定数・チェックはテンプレートに焼き込む書き込みとして取り出し、
+    残りの手順からは分岐で決まる条件を外す。焼き込みは残りの書き込みより先に反映されるので、
+    それより前の手順が書きうるセルへの書き込みは（後勝ちの順が変わらないよう）焼き込まない。
+    """
+    tokens = dict(branch)
+    baked = []
+    remaining = []
+    earlier = set()
+    for step in steps:
+        guards = []
+        for cond, expected in step.guards:
+            if cond.key not in tokens:
+                guards.append((cond, expected))
+            elif _branch_cond(cond, tokens[cond.key]) != expected:
+                break
+        else:
+            write = None
+            if not guards and step.kind == "const" and step.arg is not None and step.arg != "":
+                write = Write(sheet, step.cell, step.arg, step.safe)
+            elif not guards and step.kind == "choice" and step.arg[0] in tokens:
+                cell = _branch_choice(step.arg, tokens[step.arg[0]])
+                if cell is None:
+                    continue
+                write = Write(sheet, cell, CHECKED, False)
+            if write is not None and write.cell not in earlier:
+                baked.append(write)
+                continue
+            step = step._replace(guards=tuple(guards))
+            remaining.append(step)
+            earlier |= _step_cells(step)
+    return baked, tuple(remaining)
+
+
+def apply_writes(wb, writes):
+    """書き込み計画をopenpyxlのワークブックに反映する"""
+    sheets = {}
+    for write in writes:
+        ws = sheets.get(write.sheet)
+        if ws is None:
+            ws = sheets[write.sheet] = wb[wb.sheetnames[write.sheet]]
+        if write.safe:
+            try:
+                ws[write.cell] = write.value
+            except (AttributeError, ValueError):
+                pass
+        else:
+            ws[write.cell] = write.value
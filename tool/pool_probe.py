@@ -0,0 +1,143 @@
+"""
+プロセスプールのワーカーの計測（起動方式と共有テンプレートの比較）
+起動方式（fork / spawn / forkserver）と共有テンプレート（shared_templates.py）の有無の組み合わせごとに
+新しいPythonプロセスで generator.get_executor のプールを作り、
+- プールの作成（親でのテンプレートの解析と共有ファイルの書き出しを含む）にかかった時間
+- 各ワーカーが最初の書類一式に取りかかるまでの時間（プロセスの起動、import、共有テンプレートの割り当て）と
+  その生成にかかった時間（共有しないspawn / forkserverではテンプレートの解析を含む）
+- 生成後の各ワーカーのRSS、PSS（共有ページを按分したもの）、プライベートなメモリ
+を計測してJSONで出力する。メモリは /proc/self/smaps_rollup から読むのでLinuxのみ。
+
+    python tool/pool_probe.py                          # fork / spawn / forkserver × 共有あり・なし、2ワーカー
+    python tool/pool_probe.py --methods spawn -j 4     # spawnだけ、4ワーカー
+    python tool/pool_probe.py -o pool.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+TOOL_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TOOL_DIR)
+START_METHODS = ("fork", "spawn", "forkserver")
+# smaps_rollup の項目 -> 結果のキー（KB）
+_MEMORY_FIELDS = {"Rss": "rss_kb", "Pss": "pss_kb", "Private_Clean": "private_kb", "Private_Dirty": "private_kb"}
+
+
+def memory_usage():
+    """このプロセスのRSS、PSS、プライベートなメモリ（KB）"""
+    usage = dict.fromkeys(_MEMORY_FIELDS.values(), 0)
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in _MEMORY_FIELDS:
+                usage[_MEMORY_FIELDS[name]] += int(value.split()[0])
+    return usage
+
+
+def _worker_probe(payload):
+    """ワーカー側: 書類一式を1回生成し、開始・終了時刻とメモリを返す"""
+    from generator import preprocess_data, render_documents
+
+    started = time.time()
+    render_documents(preprocess_data(payload), workers=1)
+    finished = time.time()
+    return dict(pid=os.getpid(), started=started, finished=finished, **memory_usage())
+
+
+def _child(workers):
+    """子プロセス側: プールを作って計測し、結果を1行のJSONで標準出力に書く"""
+    sys.path.insert(0, TOOL_DIR)
+    from benchmark import synthetic_payload
+    import generator
+
+    payload = synthetic_payload({"is_subscription": "yes"}, 1)
+    begin = time.time()
+    pool = generator.get_executor("process", workers)
+    created = time.time()
+    futures = [pool.submit(_worker_probe, payload) for _ in range(workers)]
+    results = {}
+    for future in futures:
+        result = future.result()
+        results.setdefault(result["pid"], result)
+    report = []
+    for result in results.values():
+        report.append({
+            "ready_ms": round((result["started"] - created) * 1000, 1),
+            "first_render_ms": round((result["finished"] - result["started"]) * 1000, 1),
+            "rss_kb": result["rss_kb"], "pss_kb": result["pss_kb"], "private_kb": result["private_kb"],
+        })
+    print(json.dumps({
+        "pool_ms": round((created - begin) * 1000, 1),
+        "all_done_ms": round((max(r["finished"] for r in results.values()) - created) * 1000, 1),
+        "parent": memory_usage(),
+        "workers": report,
+    }))
+    generator.shutdown_executors()
+
+
+def probe(method, shared, workers=2):
+    """新しいプロセスで1回計測し、結果のdictを返す"""
+    env = dict(os.environ, JINZAI_START_METHOD=method, JINZAI_SHARED_TEMPLATES="1" if shared else "0")
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", str(workers)],
+                               capture_output=True, text=True, env=env, cwd=ROOT_DIR)
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"プールの計測に失敗しました（{method}）:\n{completed.stderr}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result.update(method=method, shared=shared, process_ms=round(elapsed * 1000, 1))
+    return result
+
+
+def _summary_line(result):
+    workers = result["workers"]
+
+    def average(key):
+        return sum(w[key] for w in workers) / len(workers)
+
+    return (f"{result['method']:<10} 共有{'あり' if result['shared'] else 'なし'}  "
+            f"プール作成 {result['pool_ms']:>8.0f}ms  全ワーカー完了 {result['all_done_ms']:>8.0f}ms  "
+            f"ワーカー平均: 準備 {average('ready_ms'):>7.0f}ms  初回 {average('first_render_ms'):>7.0f}ms  "
+            f"RSS {average('rss_kb') / 1024:>5.1f}MB  PSS {average('pss_kb') / 1024:>5.1f}MB  "
+            f"プライベート {average('private_kb') / 1024:>5.1f}MB")
+
+
+def main(argv=None):
+    if argv is None and len(sys.argv) == 3 and sys.argv[1] == "--child":
+        _child(int(sys.argv[2]))
+        return 0
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--methods", default=",".join(START_METHODS), help="起動方式（カンマ区切り）")
+    parser.add_argument("-j", "--workers", type=int, default=2, help="ワーカー数")
+    parser.add_argument("--shared", choices=("both", "on", "off"), default="both",
+                        help="共有テンプレートを使うか（fork では常に使わない）")
+    parser.add_argument("-o", "--output", help="結果のJSONの出力先（省略時は標準出力）")
+    args = parser.parse_args(argv)
+
+    methods = [method for method in args.methods.split(",") if method]
+    unknown = set(methods) - set(START_METHODS)
+    if unknown:
+        parser.error(f"不明な起動方式です: {', '.join(sorted(unknown))}")
+    shared_options = {"both": (True, False), "on": (True,), "off": (False,)}[args.shared]
+    results = []
+    for method in methods:
+        for shared in (False,) if method == "fork" else shared_options:
+            result = probe(method, shared, args.workers)
+            print(_summary_line(result), file=sys.stderr)
+            results.append(result)
+
+    text = json.dumps({"workers": args.workers, "runs": results}, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+生成結果のキャッシュ
+前処理済みデータの安定したハッシュをキーに、完成したZIPと各書類のバイト列を保持する。
+書類ごとのキーは、その書類が依存する入力項目（generator.form_inputs）の値だけから作るので、
+一部の項目を直して再生成したときは、その項目を読む書類だけが作り直される。
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+RESULT_CACHE_BYTES = int(os.environ.get("JINZAI_RESULT_CACHE_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_ENTRIES = int(os.environ.get("JINZAI_RESULT_CACHE_ENTRIES", "512"))
+
+_MISSING = "\0missing"
+
+
+def _json_default(value):
+    # 申請データ・受講者の一覧（application.py）は to_json でdict・リストにする
+    to_json = getattr(value, "to_json", None)
+    return to_json() if to_json is not None else str(value)
+
+
+def _canonical(value):
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=_json_default)
+
+
+def payload_digest(data):
+    """前処理済みデータの安定したハッシュ（キーの順序に依存しない）"""
+    return hashlib.sha256(_canonical(data).encode("utf-8")).hexdigest()
+
+
+def fields_digest(data, keys):
+    """指定した入力項目の値だけのハッシュ（存在しない項目とNoneは区別する）"""
+    values = [data[k] if k in data else _MISSING for k in keys]
+    return hashlib.sha256(_canonical(values).encode("utf-8")).hexdigest()
+
+
+class LRUBytesCache:
+    """件数と合計バイト数の上限を持つLRUキャッシュ"""
+
+    def __init__(self, max_bytes=RESULT_CACHE_BYTES, max_entries=RESULT_CACHE_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._items[key] = value
+            self._bytes += len(value)
+            while self._items and (self._bytes > self.max_bytes or len(self._items) > self.max_entries):
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+# 完成したZIP: payload_digest -> ZIPのバイト列
+zip_cache = LRUBytesCache()
+# 各書類: (様式ID, テンプレートのスタンプとページ, 入力項目の値のハッシュ) -> xlsxのバイト列
+form_cache = LRUBytesCache()
+
+
+def form_digest(keys, data):
+    """書類のキャッシュキーに使う入力のハッシュ（入力項目が分からない書類は入力全体）
+
+    ページに分けた書類は全ページで同じ値を使うので、様式ごとに一度だけ求めればよい。
+    """
+    return payload_digest(data) if keys is None else fields_digest(data, keys)
+
+
+def lookup_form(form_id, stamp, digest):
+    """キャッシュ済みの書類を探す（なければNone）"""
+    return form_cache.get((form_id, stamp, digest))
+
+
+def store_form(form_id, stamp, digest, content):
+    form_cache.put((form_id, stamp, digest), content)
+
+
+def clear():
+    zip_cache.clear()
+    form_cache.clear()
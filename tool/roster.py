@@ -0,0 +1,208 @@
+"""
+対象労働者名簿の読み込み
+人事システムから書き出したCSV / Excelの名簿を1行ずつ読み、受講者データ（workers）に変換する。
+ワークブック全体をメモリ上に展開しないので、数万行の名簿でも保持するのは受講者データだけで済む。
+"""
+
+import codecs
+import csv
+import os
+import re
+import unicodedata
+
+# 読み込む行数の上限と、返すエラーの件数の上限
+ROSTER_MAX_ROWS = int(os.environ.get("JINZAI_ROSTER_MAX_ROWS", "20000"))
+ROSTER_MAX_ERRORS = int(os.environ.get("JINZAI_ROSTER_MAX_ERRORS", "100"))
+
+# 雇用保険被保険者番号の桁数（4桁ー6桁ー1桁）
+INSURANCE_WIDTHS = {"insurance_1": 4, "insurance_2": 6, "insurance_3": 1}
+
+# 見出し -> 項目名（見出しはNFKC正規化・小文字化・空白除去してから照合する）
+HEADER_ALIASES = {
+    "name": ("name", "氏名", "名前", "対象労働者名", "対象労働者の氏名", "受講者名"),
+    "name_kana": ("name_kana", "kana", "フリガナ", "ふりがな", "カナ", "氏名(フリガナ)", "対象労働者名(フリガナ)"),
+    "insurance_number": ("insurance_number", "雇用保険被保険者番号", "被保険者番号"),
+    "insurance_1": ("insurance_1", "被保険者番号1"),
+    "insurance_2": ("insurance_2", "被保険者番号2"),
+    "insurance_3": ("insurance_3", "被保険者番号3"),
+    "employment_type": ("employment_type", "type", "雇用形態"),
+}
+
+# 雇用形態の表記ゆれ
+EMPLOYMENT_TYPES = {
+    "regular": "regular", "正規": "regular", "正規雇用": "regular", "正規雇用労働者等": "regular",
+    "正社員": "regular",
+    "contract": "contract", "有期": "contract", "有期契約": "contract", "有期契約労働者等": "contract",
+    "契約社員": "contract",
+}
+
+_HEADERS = {re.sub(r"\s", "", alias.lower()): key
+            for key, aliases in HEADER_ALIASES.items() for alias in aliases}
+_WORKER_KEY_RE = re.compile(r"^worker_(\d+)_(.+)$")
+_DIGITS_RE = re.compile(r"\D")
+_SEPARATOR_RE = re.compile(r"[-ー－‐―\s]+")
+
+
+class RosterError(ValueError):
+    """名簿ファイル全体を読めない（形式不明・見出しなし・行数超過など）"""
+
+
+def _text(value, width=None):
+    """セルの値を文字列にする（Excelで数値になった番号は桁数まで0埋めする）"""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        text = str(value)
+        return text.zfill(width) if width else text
+    return unicodedata.normalize("NFKC", str(value)).strip()
+
+
+def _split_insurance_number(text):
+    parts = [part for part in _SEPARATOR_RE.split(text) if part]
+    if len(parts) == 3:
+        return parts
+    digits = _DIGITS_RE.sub("", text)
+    if len(digits) == 11:
+        return [digits[:4], digits[4:10], digits[10:]]
+    return None
+
+
+def normalize_worker(record):
+    """受講者1人分の入力（項目名 -> 値）を、書類の生成で使う形に揃える
+
+    雇用保険被保険者番号は insurance_1〜3 の分割形式と insurance_number（「1234-567890-1」
+    または11桁）のどちらでもよい。検証はしないので、名簿の取り込みでは validate_worker と併用する。
+    """
+    worker = {
+        "name": _text(record.get("name")),
+        "name_kana": _text(record.get("name_kana")),
+    }
+    for key, width in INSURANCE_WIDTHS.items():
+        worker[key] = _text(record.get(key), width)
+    number = _text(record.get("insurance_number"), 11)
+    if number and not any(worker[key] for key in INSURANCE_WIDTHS):
+        parts = _split_insurance_number(number)
+        if parts is not None:
+            worker.update(zip(INSURANCE_WIDTHS, parts))
+    if any(worker[key] for key in INSURANCE_WIDTHS):
+        number = "-".join(worker[key] for key in INSURANCE_WIDTHS)
+    worker["insurance_number"] = number
+    employment_type = _text(record.get("employment_type", record.get("type")))
+    worker["employment_type"] = EMPLOYMENT_TYPES.get(employment_type, employment_type or "regular")
+    return worker
+
+
+def validate_worker(worker):
+    """受講者1人分のデータの問題点（メッセージのリスト、問題なければ空）"""
+    problems = []
+    if not worker["name"]:
+        problems.append("氏名がありません")
+    if worker["insurance_number"]:
+        for key, width in INSURANCE_WIDTHS.items():
+            if not (len(worker[key]) == width and worker[key].isdigit()):
+                problems.append("雇用保険被保険者番号は4桁-6桁-1桁の数字で入力してください")
+                break
+    if worker["employment_type"] not in ("regular", "contract"):
+        problems.append(f"雇用形態が不明です: {worker['employment_type']}")
+    return problems
+
+
+def flat_worker_records(data):
+    """フォームの worker_{番号}_{項目} 形式の入力を、番号順の受講者ごとの辞書にする
+
+    番号は連番でなくてよい（画面で途中の受講者を削除しても、後ろの受講者は失われない）。
+    """
+    records = {}
+    for key, value in data.items():
+        match = _WORKER_KEY_RE.match(key)
+        if match:
+            records.setdefault(int(match.group(1)), {})[match.group(2)] = value
+    return [records[index] for index in sorted(records)]
+
+
+def _csv_encoding(stream):
+    """CSVの文字コード（UTF-8として読めなければExcelの既定のShift_JIS（cp932）とみなす）"""
+    head = stream.read(65536)
+    stream.seek(0)
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # 先頭部分の末尾で切れた多バイト文字は無視する
+        if e.start < len(head) - 3:
+            return "cp932"
+    return "utf-8-sig"
+
+
+def _csv_rows(stream):
+    reader = codecs.getreader(_csv_encoding(stream))(stream)
+    yield from csv.reader(reader)
+
+
+def _xlsx_rows(stream):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        yield from wb.worksheets[0].iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def iter_roster_rows(stream, filename):
+    """名簿ファイルの行を先頭から順に返す（.xlsx / .xlsm はExcel、それ以外はCSVとして読む）"""
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        return _xlsx_rows(stream)
+    return _csv_rows(stream)
+
+
+def _header_columns(row):
+    columns = {}
+    for index, value in enumerate(row):
+        key = _HEADERS.get(re.sub(r"\s", "", _text(value).lower()))
+        if key is not None and key not in columns:
+            columns[key] = index
+    return columns
+
+
+def iter_roster(stream, filename):
+    """名簿ファイルを1行ずつ受講者データに変換し、(行番号, 受講者, 問題点のリスト) を返す
+
+    最初の空でない行を見出しとみなす。空行は読み飛ばす。
+    """
+    rows = iter_roster_rows(stream, filename)
+    columns = None
+    for line, row in enumerate(rows, 1):
+        if not any(_text(value) for value in row):
+            continue
+        if columns is None:
+            columns = _header_columns(row)
+            if "name" not in columns:
+                raise RosterError("見出し行に「氏名」の列がありません")
+            continue
+        record = {key: row[index] for key, index in columns.items() if index < len(row)}
+        worker = normalize_worker(record)
+        yield line, worker, validate_worker(worker)
+    if columns is None:
+        raise RosterError("名簿が空です")
+
+
+def read_roster(stream, filename, max_rows=None):
+    """名簿ファイルを読み、(受講者のリスト, エラーのリスト) を返す
+
+    エラーは {"line": 行番号, "errors": [メッセージ]} の形で、先頭から ROSTER_MAX_ERRORS 件まで。
+    問題のある行は受講者に含めない。行数の上限は問題のある行も含めたデータ行（見出しと空行を除く）で数える。
+    """
+    max_rows = ROSTER_MAX_ROWS if max_rows is None else max_rows
+    workers = []
+    errors = []
+    for count, (line, worker, problems) in enumerate(iter_roster(stream, filename), 1):
+        if count > max_rows:
+            raise RosterError(f"名簿の行数が上限（{max_rows}行）を超えています")
+        if problems:
+            if len(errors) < ROSTER_MAX_ERRORS:
+                errors.append({"line": line, "errors": problems})
+            continue
+        workers.append(worker)
+    return workers, errors
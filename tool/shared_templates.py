@@ -0,0 +1,105 @@
+"""
+テンプレートの共有（プロセスプールのワーカー用）
+spawn / forkserver で起動したワーカーは親のテンプレートキャッシュを引き継がないので、そのままでは
+ワーカーごとにテンプレートを読み直して解析し（openpyxl方式では全様式で20秒ほど）、同じものを別々に持つ。
+親で解析済みのものを1つのファイルに並べてメモリマップし、ワーカーは初期化時に割り当てるだけにする。
+- openpyxl方式の解析済みワークブックのpickle: memoryview のまま pickle.loads に渡すので複製を持たない
+- テンプレートのxlsx（patch方式とテンプレートの確認で読む）: ファイルを読まずに共有ファイルから解析する
+  （解析の間だけ一時的に複製する。解析結果のパーツはどのみちワーカーごとに持つ）
+- マージ索引と登録簿（template_registry）: ワーカーごとに復元する（小さい）
+マップしたページはOSのページキャッシュとして全ワーカーで共有される。
+fork のワーカーは親のキャッシュをそのまま引き継ぐので、これは使わない（generator.get_executor）。
+
+JINZAI_SHARED_TEMPLATES: 0 にすると使わない（既定1）
+"""
+
+import functools
+import io
+import mmap
+import os
+import pickle
+import tempfile
+from collections import namedtuple
+
+import template_registry
+import template_store
+import xlsx_patch
+
+SHARED_TEMPLATES = os.environ.get("JINZAI_SHARED_TEMPLATES", "1") not in ("", "0")
+
+# 共有ファイルの置き場所（tmpfsがあればそこに置き、ディスクに書き出さない）
+SHARED_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+# 共有ファイル1つ分（path: ファイルのパス、segments: 区切りの一覧）
+SharedTemplates = namedtuple("SharedTemplates", "path segments")
+# 共有ファイル内の区切り（kind: xlsx / openpyxl / merge_index / registry）
+Segment = namedtuple("Segment", "kind template stamp offset length")
+
+# ワーカー側で開いた共有ファイル（プロセスが終わるまで閉じない）
+_attached = []
+
+
+def publish(paths):
+    """テンプレートを共有ファイルに書き出し、ワーカーに渡す SharedTemplates を返す
+
+    paths: 共有するテンプレートのパス（存在しないものは飛ばす）。
+    openpyxl方式のワークブックは解析済み（template_store にあるもの）だけを入れる。
+    """
+    segments = []
+    fd, shared_path = tempfile.mkstemp(prefix="jinzai-templates-", suffix=".bin", dir=SHARED_DIR)
+    with os.fdopen(fd, "wb") as f:
+        def append(kind, template, stamp, content):
+            offset = f.tell()
+            f.write(content)
+            segments.append(Segment(kind, template, stamp, offset, len(content)))
+
+        for path in dict.fromkeys(paths):
+            if not os.path.exists(path):
+                continue
+            stamp = template_store.template_stamp(path)
+            with open(path, "rb") as source:
+                append("xlsx", path, stamp, source.read())
+            entry = template_store.cached_entry(path)
+            if entry is not None and entry[0] == stamp:
+                append("openpyxl", path, stamp, entry[1])
+                append("merge_index", path, stamp, pickle.dumps(entry[2], protocol=pickle.HIGHEST_PROTOCOL))
+        append("registry", None, None,
+               pickle.dumps(template_registry.registry(), protocol=pickle.HIGHEST_PROTOCOL))
+    return SharedTemplates(shared_path, tuple(segments))
+
+
+def attach(shared):
+    """共有ファイルのテンプレートを、このプロセスのキャッシュに登録する（ワーカーの初期化時）
+
+    親が書き出した後にテンプレートが更新されていれば、その分は登録せず従来どおり読む。
+    """
+    with open(shared.path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    _attached.append((mapped, view))
+    payloads = {}
+    for segment in shared.segments:
+        content = view[segment.offset:segment.offset + segment.length]
+        if segment.kind == "registry":
+            template_registry.install_registry(pickle.loads(content))
+            continue
+        try:
+            if template_store.template_stamp(segment.template) != segment.stamp:
+                continue
+        except OSError:
+            continue
+        if segment.kind == "xlsx":
+            xlsx_patch.install_source(segment.template, segment.stamp, functools.partial(io.BytesIO, content))
+        elif segment.kind == "openpyxl":
+            payloads[segment.template] = content
+        elif segment.kind == "merge_index" and segment.template in payloads:
+            template_store.install(segment.template, segment.stamp, payloads[segment.template],
+                                   pickle.loads(content))
+
+
+def release(shared):
+    """共有ファイルを削除する（マップ済みのワーカーはそのまま使い続けられる）"""
+    try:
+        os.unlink(shared.path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,360 @@
+"""
+テンプレートの軽量化（ビルド時の前処理）
+各様式のテンプレートから、印刷・表示に影響しない部分を取り除いた書き込み用の版を作る。
+- 書式: 同じ内容のフォント・塗りつぶし・罫線・セル書式を1つにまとめ、どのシートも使っていないセル書式を外す
+- 保護: 既定値と同じ保護の指定（<protection locked="1"/> など）を外す
+- 名前: 参照先が消えている名前（#REF!、存在しないシート）のうち、数式から使われていないものを外す
+- 行: 読み込みのヒントにすぎない spans 属性を外す
+作った版は元のテンプレートとセルごとの書式（フォント・塗りつぶし・罫線・表示形式・配置）を突き合わせ、
+シート名・使用範囲・マージ範囲が同じことを確かめてから書き出す。小さくならなかった様式は書き出さない。
+
+    python tool/slim_templates.py              # 全様式を軽量化して tool/slim_templates/ に書き出し、前後を表示
+    python tool/slim_templates.py 8_1 5        # 指定した様式だけ
+    python tool/slim_templates.py --dry-run    # 書き出さずに比べるだけ
+
+書き出した版は manifest.json に元のテンプレートのハッシュと一緒に記録され、
+元のテンプレートが変わっていなければ template_registry が代わりに使う（JINZAI_SLIM_TEMPLATES で場所を変更、空で無効）。
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from form_specs import FORM_SPECS
+from template_registry import BASE_DIR, SLIM_DIR, SLIM_MANIFEST, SOURCE_TEMPLATES
+from xlsx_patch import PatchTemplate
+
+_WORKSHEET_RE = re.compile(r'^xl/worksheets/sheet\d+\.xml$')
+_STYLED_TAG_RE = re.compile(rb'<(?:c|row|col)\b[^>]*>')
+_STYLE_ATTR_RE = re.compile(rb'(\s(?:s|style)=")(\d+)"')
+_ROW_SPANS_RE = re.compile(rb'(<row\b[^>]*?)\sspans="[^"]*"')
+_ID_ATTR_RES = {name: re.compile(rb'(\s%s=")(\d+)"' % name) for name in (b"fontId", b"fillId", b"borderId")}
+_XF_ID_RE = re.compile(rb'(\sxfId=")(\d+)"')
+_DEFAULT_PROTECTION_RE = re.compile(rb'<protection(?:\s+locked="1"|\s+hidden="0")*\s*/>')
+_COUNT_RE = re.compile(rb'\scount="\d+"')
+_DEFINED_NAMES_RE = re.compile(rb'<definedNames>(.*?)</definedNames>', re.S)
+_DEFINED_NAME_RE = re.compile(rb'<definedName\b([^>]*)>(.*?)</definedName>', re.S)
+_NAME_ATTR_RE = re.compile(rb'\sname="([^"]*)"')
+_LOCAL_SHEET_RE = re.compile(rb'\slocalSheetId="(\d+)"')
+_SHEET_TAG_RE = re.compile(rb'<sheet\b[^>]*?\sname="([^"]*)"')
+_FORMULA_RE = re.compile(rb'<(f|formula[12]?|xm:f)\b[^>]*>(.*?)</\1>', re.S)
+
+# 書式の一覧（親要素, 子要素）
+_STYLE_LISTS = {b"fonts": b"font", b"fills": b"fill", b"borders": b"border",
+                b"cellStyleXfs": b"xf", b"cellXfs": b"xf"}
+# 番号を変えてはいけない要素（0番は既定の書式、塗りつぶしの1番はExcelが予約している）
+_RESERVED = {b"fonts": {0}, b"fills": {0, 1}, b"borders": {0}, b"cellXfs": {0}}
+
+
+def _list_re(parent, child):
+    return re.compile(rb'<%s\b[^>]*>(.*?)</%s>' % (parent, parent), re.S), \
+        re.compile(rb'<%s\b[^>]*/>|<%s\b[^>]*>.*?</%s>' % (child, child, child), re.S)
+
+
+_LIST_RES = {parent: _list_re(parent, child) for parent, child in _STYLE_LISTS.items()}
+
+
+def _style_lists(styles):
+    """styles.xml の各一覧を {親要素: [子要素のバイト列, ...]} で返す（ない一覧は含めない）"""
+    lists = {}
+    for parent, (container_re, item_re) in _LIST_RES.items():
+        m = container_re.search(styles)
+        if m is not None:
+            lists[parent] = item_re.findall(m.group(1))
+    return lists
+
+
+def _replace_lists(styles, lists):
+    for parent, items in lists.items():
+        container_re = _LIST_RES[parent][0]
+        m = container_re.search(styles)
+        open_tag = styles[m.start():styles.index(b">", m.start()) + 1]
+        open_tag = _COUNT_RE.sub(b' count="%d"' % len(items), open_tag)
+        styles = b"".join((styles[:m.start()], open_tag, *items, b"</%s>" % parent, styles[m.end():]))
+    return styles
+
+
+def _compact(items, used, reserved=()):
+    """used・reserved の番号の要素だけを、同じ内容は1つにまとめて残す。(残す要素, 旧番号 -> 新番号) を返す"""
+    kept = []
+    positions = {}
+    mapping = {}
+    for i, item in enumerate(items):
+        if i not in used and i not in reserved:
+            continue
+        j = positions.get(item)
+        if j is None:
+            j = positions[item] = len(kept)
+            kept.append(item)
+        mapping[i] = j
+    return kept, mapping
+
+
+def _remap_ids(xf, maps):
+    for name, mapping in maps.items():
+        xf = _ID_ATTR_RES[name].sub(lambda m: b'%s%d"' % (m.group(1), mapping[int(m.group(2))]), xf)
+    return xf
+
+
+def _xf_ids(xfs, name):
+    pattern = _ID_ATTR_RES[name]
+    return {int(m.group(2)) for xf in xfs for m in pattern.finditer(xf)}
+
+
+def slim_styles(styles, used_xfs):
+    """styles.xml を軽量化して (新しいstyles.xml, セル書式の旧番号 -> 新番号) を返す
+
+    used_xfs: シートから参照されているセル書式の番号
+    """
+    lists = _style_lists(styles)
+    parts = {b"fontId": b"fonts", b"fillId": b"fills", b"borderId": b"borders"}
+
+    # 同じ内容のフォント・塗りつぶし・罫線をまとめ、セル書式の参照を付け替える
+    maps = {}
+    for name, parent in parts.items():
+        items = lists[parent]
+        lists[parent], maps[name] = _compact(items, range(len(items)), _RESERVED[parent])
+    for parent in (b"cellStyleXfs", b"cellXfs"):
+        lists[parent] = [_DEFAULT_PROTECTION_RE.sub(b"", _remap_ids(xf, maps)) for xf in lists.get(parent, ())]
+
+    # 使われているセル書式だけを残す（同じ内容になったものは1つにまとめる）
+    lists[b"cellXfs"], xf_map = _compact(lists[b"cellXfs"], used_xfs, _RESERVED[b"cellXfs"])
+
+    # どのセル書式からも参照されなくなったフォント・塗りつぶし・罫線を外す
+    xfs = lists[b"cellXfs"] + lists.get(b"cellStyleXfs", [])
+    maps = {}
+    for name, parent in parts.items():
+        lists[parent], maps[name] = _compact(lists[parent], _xf_ids(xfs, name), _RESERVED[parent])
+    for parent in (b"cellStyleXfs", b"cellXfs"):
+        if parent in lists:
+            lists[parent] = [_remap_ids(xf, maps) for xf in lists[parent]]
+    return _replace_lists(styles, lists), xf_map
+
+
+def used_styles(sheets):
+    """シートのセル・行・列が参照しているセル書式の番号"""
+    return {int(m.group(2)) for xml in sheets for tag in _STYLED_TAG_RE.findall(xml)
+            for m in _STYLE_ATTR_RE.finditer(tag)}
+
+
+def slim_sheet(xml, xf_map):
+    """セル・行・列の書式番号を付け替え、行の spans 属性を外す"""
+    def retag(m):
+        tag = _STYLE_ATTR_RE.sub(lambda a: b'%s%d"' % (a.group(1), xf_map[int(a.group(2))]), m.group(0))
+        return _ROW_SPANS_RE.sub(rb'\1', tag)
+    return _STYLED_TAG_RE.sub(retag, xml)
+
+
+def slim_workbook(workbook, sheets):
+    """参照先が消えていて数式からも使われていない名前を外す"""
+    m = _DEFINED_NAMES_RE.search(workbook)
+    if m is None:
+        return workbook
+    sheet_count = len(_SHEET_TAG_RE.findall(workbook))
+    formulas = b"\n".join(f.group(2) for xml in sheets for f in _FORMULA_RE.finditer(xml))
+
+    def orphaned(attrs, body):
+        local = _LOCAL_SHEET_RE.search(attrs)
+        if b"#REF!" not in body and (local is None or int(local.group(1)) < sheet_count):
+            return False
+        name = _NAME_ATTR_RE.search(attrs)
+        return name is not None and name.group(1) not in formulas
+
+    names = [d.group(0) for d in _DEFINED_NAME_RE.finditer(m.group(1)) if not orphaned(d.group(1), d.group(2))]
+    replacement = b"<definedNames>" + b"".join(names) + b"</definedNames>" if names else b""
+    return workbook[:m.start()] + replacement + workbook[m.end():]
+
+
+def slim_template(content):
+    """xlsxのバイト列を軽量化したバイト列を返す"""
+    with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        parts = [(info, zf.read(info)) for info in zf.infolist()]
+    contents = {info.filename: data for info, data in parts}
+    sheet_names = [name for name in contents if _WORKSHEET_RE.match(name)]
+    sheets = [contents[name] for name in sheet_names]
+
+    changed = {}
+    if "xl/styles.xml" in contents:
+        changed["xl/styles.xml"], xf_map = slim_styles(contents["xl/styles.xml"], used_styles(sheets) | {0})
+        for name in sheet_names:
+            changed[name] = slim_sheet(contents[name], xf_map)
+    if "xl/workbook.xml" in contents:
+        changed["xl/workbook.xml"] = slim_workbook(contents["xl/workbook.xml"], sheets)
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as out:
+        for info, data in parts:
+            out.writestr(info.filename, changed.get(info.filename, data), zipfile.ZIP_DEFLATED)
+    return buffer.getvalue()
+
+
+def _resolved_sheets(content):
+    """シートごとに、書式番号を書式の内容（フォント・塗りつぶし・罫線の実体を含む）に置き換えたXML
+
+    元のテンプレートと軽量化した版でこれが一致すれば、どのセルの見た目も変わっていない。
+    """
+    with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        names = sorted(name for name in zf.namelist() if _WORKSHEET_RE.match(name))
+        sheets = [zf.read(name) for name in names]
+        lists = _style_lists(zf.read("xl/styles.xml"))
+
+    def resolve(xf):
+        for name, parent in ((b"fontId", b"fonts"), (b"fillId", b"fills"), (b"borderId", b"borders")):
+            items = lists[parent]
+            xf = _ID_ATTR_RES[name].sub(lambda m: b"%s%s\"" % (m.group(1), items[int(m.group(2))]), xf)
+        return _DEFAULT_PROTECTION_RE.sub(b"", xf)
+
+    style_xfs = [resolve(xf) for xf in lists.get(b"cellStyleXfs", ())]
+    xfs = [_XF_ID_RE.sub(lambda m: b"%s%s\"" % (m.group(1), style_xfs[int(m.group(2))]), resolve(xf))
+           for xf in lists[b"cellXfs"]]
+
+    def retag(m):
+        tag = _STYLE_ATTR_RE.sub(lambda a: a.group(1) + xfs[int(a.group(2))] + b'"', m.group(0))
+        return _ROW_SPANS_RE.sub(rb'\1', tag)
+
+    return [_STYLED_TAG_RE.sub(retag, xml) for xml in sheets]
+
+
+def verify(original, slim, name):
+    """軽量化した版が元と同じ見た目・構造かを確かめる（違えば ValueError）"""
+    if _resolved_sheets(original) != _resolved_sheets(slim):
+        raise ValueError(f"セルの書式が元のテンプレートと一致しません: {name}")
+    before, after = _patch_template(original), _patch_template(slim)
+    if before.sheet_names() != after.sheet_names():
+        raise ValueError(f"シート名が元のテンプレートと一致しません: {name}")
+    for index in range(len(before.sheet_names())):
+        a, b = before.sheet(index), after.sheet(index)
+        if (a.dimension, a.merge_index, a.numbers) != (b.dimension, b.merge_index, b.numbers):
+            raise ValueError(f"シート{index}の構造が元のテンプレートと一致しません: {name}")
+
+
+@contextlib.contextmanager
+def _temporary_file(content):
+    """content を一時ファイルに書き、そのパスを渡す（抜けるときに消す）"""
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        yield path
+    finally:
+        os.remove(path)
+
+
+def _patch_template(content):
+    with _temporary_file(content) as path:
+        return PatchTemplate(path)
+
+
+def parse_times(path, sheet, repeat=3):
+    """テンプレートの解析時間（ミリ秒、repeat回の中央値）を {"openpyxl": ..., "patch": ...} で返す"""
+    from openpyxl import load_workbook
+
+    def measure(parse):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            parse()
+            samples.append((time.perf_counter() - start) * 1000)
+        return round(statistics.median(samples), 1)
+
+    return {"openpyxl": measure(lambda: load_workbook(path).close()),
+            "patch": measure(lambda: PatchTemplate(path).sheet(sheet))}
+
+
+def _file_digest(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def build(form_ids, output_dir=SLIM_DIR, dry_run=False, repeat=3):
+    """様式ごとに軽量化した版を作り、前後のサイズと解析時間のリストを返す"""
+    manifest_path = os.path.join(output_dir, SLIM_MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    if not dry_run:
+        os.makedirs(output_dir, exist_ok=True)
+
+    report = []
+    for form_id in form_ids:
+        path = SOURCE_TEMPLATES[form_id]
+        if not os.path.exists(path):
+            report.append({"form_id": form_id, "skipped": "テンプレートがありません"})
+            continue
+        with open(path, "rb") as f:
+            original = f.read()
+        slim = slim_template(original)
+        verify(original, slim, os.path.basename(path))
+
+        entry = {"form_id": form_id, "before_bytes": len(original), "after_bytes": len(slim)}
+        if len(slim) >= len(original):
+            entry["skipped"] = "小さくなりません"
+            manifest.pop(form_id, None)
+            report.append(entry)
+            continue
+
+        sheet = FORM_SPECS[form_id].sheet
+        entry["before_ms"] = parse_times(path, sheet, repeat)
+        if dry_run:
+            with _temporary_file(slim) as slim_path:
+                entry["after_ms"] = parse_times(slim_path, sheet, repeat)
+        else:
+            with open(os.path.join(output_dir, os.path.basename(path)), "wb") as f:
+                f.write(slim)
+            entry["after_ms"] = parse_times(f.name, sheet, repeat)
+        manifest[form_id] = {"source": os.path.relpath(path, BASE_DIR), "sha256": _file_digest(original),
+                             "file": os.path.basename(path)}
+        report.append(entry)
+
+    if not dry_run:
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("forms", nargs="*", help="軽量化する様式ID（省略時は全様式）")
+    parser.add_argument("-o", "--output", default=SLIM_DIR, help="出力先のディレクトリ")
+    parser.add_argument("--dry-run", action="store_true", help="書き出さずに前後を比べるだけ")
+    parser.add_argument("-n", "--repeat", type=int, default=3, help="解析時間の計測回数")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    args = parser.parse_args(argv)
+
+    unknown = [form_id for form_id in args.forms if form_id not in SOURCE_TEMPLATES]
+    if unknown:
+        parser.error(f"不明な様式IDです: {', '.join(unknown)}")
+    if not args.output and not args.dry_run:
+        parser.error("出力先がありません（JINZAI_SLIM_TEMPLATES が空です）")
+    report = build(args.forms or list(SOURCE_TEMPLATES), args.output, args.dry_run, args.repeat)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+
+    print(f"{'様式':<6}{'サイズ(KB)':>16}{'openpyxl(ms)':>20}{'patch(ms)':>18}")
+    for entry in report:
+        size = f"{entry['before_bytes'] / 1024:.1f} -> {entry['after_bytes'] / 1024:.1f}" \
+            if "before_bytes" in entry else "-"
+        if "after_ms" in entry:
+            before, after = entry["before_ms"], entry["after_ms"]
+            print(f"{entry['form_id']:<6}{size:>16}{before['openpyxl']:>10} -> {after['openpyxl']:<7}"
+                  f"{before['patch']:>9} -> {after['patch']}")
+        else:
+            print(f"{entry['form_id']:<6}{size:>16}  （{entry['skipped']}）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+テンプレートのスナップショット（サーバーレスの起動を速くする）
+ビルド時に全テンプレートを解析し、そのまま書き込みに使える状態（patch方式の分割済みシートXMLと
+土台のZIP、openpyxl方式の解析済みワークブックのpickle、前処理済みの対応表）を1つのファイルに保存する。
+起動時はそれを1回読むだけで、最初のリクエストでテンプレートを解析し直さずに済む。
+
+Vercelではビルドの手順（vercel.json の buildCommand）で作り、関数に含める（includeFiles）。
+リポジトリには入れない。ないときや作った後にコードが変わったときは、従来どおりテンプレートを解析する。
+
+    python tool/snapshot.py                    # tool/template_snapshot.pickle.gz に書き出す
+    python tool/snapshot.py --engines patch    # patch方式の分だけ
+    python tool/snapshot.py --check            # 今のコードとテンプレートに合っているか（古い・ないときは終了コード1）
+
+テンプレートはスタンプ（mtimeとサイズ）、違っていれば内容のハッシュで照合し、
+変わっていたテンプレートはスナップショットを使わず従来どおり解析する。
+対応表・生成エンジンのソースやPython・openpyxlの版が保存時と違えば、スナップショット全体を使わない。
+"""
+
+import argparse
+import functools
+import gzip
+import hashlib
+import importlib.metadata
+import os
+import pickle
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import mapping
+import template_store
+import xlsx_patch
+from form_specs import FORM_SPECS
+from generator import FILL_ENGINES, FORM_TEMPLATES
+from template_registry import BASE_DIR
+from timing import record_startup
+
+SNAPSHOT_VERSION = 4
+SNAPSHOT_PATH = os.environ.get("JINZAI_SNAPSHOT", os.path.join(BASE_DIR, "tool", "template_snapshot.pickle.gz"))
+
+# スナップショットの中身（前処理済みの手順、pickleしたテンプレート）の形を決めるソース
+CODE_FILES = ("form_specs.py", "mapping.py", "dependencies.py", "xlsx_patch.py", "template_store.py")
+
+
+def _file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def code_digest():
+    """スナップショットを作ったコードの識別子（CODE_FILES の内容とPython・openpyxlの版のハッシュ）"""
+    versions = f"{sys.version_info[0]}.{sys.version_info[1]} {importlib.metadata.version('openpyxl')}"
+    digest = hashlib.sha256(versions.encode())
+    tool_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in CODE_FILES:
+        with open(os.path.join(tool_dir, name), "rb") as f:
+            digest.update(name.encode() + b"\0" + f.read())
+    return digest.hexdigest()
+
+
+def build_snapshot(output_path=SNAPSHOT_PATH, engines=FILL_ENGINES):
+    """全テンプレートを解析してスナップショットを書き出し、テンプレートの数を返す"""
+    templates = {}
+    compiled = {}
+    for form_id, path in FORM_TEMPLATES.items():
+        if not os.path.exists(path):
+            continue
+        form = FORM_SPECS[form_id]
+        name = os.path.relpath(path, BASE_DIR)
+        entry = templates.get(name)
+        if entry is None:
+            entry = templates[name] = {"stamp": template_store.template_stamp(path),
+                                       "sha256": _file_digest(path)}
+        if "patch" in engines:
+            template = xlsx_patch.patch_template(path)
+            template.sheet(form.sheet)
+            template._base(frozenset([form.sheet]))
+            entry["patch"] = template
+            loader = functools.partial(xlsx_patch.sheet_merge_index, path, form.sheet)
+        if "openpyxl" in engines:
+            entry["openpyxl"] = template_store.template_entry(path)
+            loader = functools.partial(template_store.template_merge_index, path, form.sheet)
+        compiled[form_id] = (name, mapping.compiled_form(form_id, form, entry["stamp"], loader))
+
+    snapshot = {"version": SNAPSHOT_VERSION, "code": code_digest(), "templates": templates, "compiled": compiled}
+    temp_path = output_path + ".tmp"
+    with gzip.open(temp_path, "wb", compresslevel=6) as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, output_path)
+    return len(templates)
+
+
+def _current_stamp(path, entry):
+    """テンプレートが保存時と同じならその現在のスタンプ、違えばNone"""
+    try:
+        stamp = template_store.template_stamp(path)
+    except OSError:
+        return None
+    if stamp == entry["stamp"]:
+        return stamp
+    # デプロイでmtimeだけ変わった場合は内容で照合する
+    if stamp[1] == entry["stamp"][1] and _file_digest(path) == entry["sha256"]:
+        return stamp
+    return None
+
+
+def read_snapshot(path=SNAPSHOT_PATH):
+    """スナップショットを読む（ない・読めない・今のコードと合わないときは、理由を標準エラー出力に書いてNone）"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError) as e:
+        print(f"スナップショットを読めないので使いません: {e}", file=sys.stderr)
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+        print("スナップショットの形式が古いので使いません（python tool/snapshot.py で作り直す）", file=sys.stderr)
+        return None
+    if snapshot.get("code") != code_digest():
+        print("スナップショットが今のコードと合わないので使いません（python tool/snapshot.py で作り直す）",
+              file=sys.stderr)
+        return None
+    return snapshot
+
+
+def stale_templates(snapshot):
+    """スナップショットを作った後に変わった（またはなくなった）テンプレートの一覧"""
+    return [name for name, entry in snapshot["templates"].items()
+            if _current_stamp(os.path.join(BASE_DIR, name), entry) is None]
+
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    """スナップショットを読み込み、テンプレートのキャッシュに登録する
+
+    戻り値は登録したテンプレートの数（スナップショットがない・読めない・古いときは0）。
+    """
+    start = time.perf_counter()
+    snapshot = read_snapshot(path)
+    if snapshot is None:
+        return 0
+
+    stamps = {}
+    for name, entry in snapshot["templates"].items():
+        template_path = os.path.join(BASE_DIR, name)
+        stamp = _current_stamp(template_path, entry)
+        if stamp is None:
+            continue
+        stamps[name] = stamp
+        if "patch" in entry:
+            xlsx_patch.install(template_path, entry["patch"], stamp)
+        if "openpyxl" in entry:
+            template_store.install(template_path, stamp, *entry["openpyxl"])
+    for form_id, (name, steps) in snapshot["compiled"].items():
+        if name in stamps and form_id in FORM_SPECS:
+            mapping.install_compiled(form_id, stamps[name], steps)
+    record_startup("snapshot", time.perf_counter() - start)
+    return len(stamps)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-o", "--output", default=SNAPSHOT_PATH, help="出力先")
+    parser.add_argument("--engines", default=",".join(FILL_ENGINES),
+                        help="含める生成方式（カンマ区切り、既定は全方式）")
+    parser.add_argument("--check", action="store_true",
+                        help="書き出さずに、スナップショットが今のコードとテンプレートに合っているか確かめる")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        snapshot = read_snapshot(args.output)
+        if snapshot is None:
+            print(f"使えるスナップショットがありません: {args.output}", file=sys.stderr)
+            return 1
+        stale = stale_templates(snapshot)
+        for name in stale:
+            print(f"スナップショットの後に変わったテンプレート: {name}", file=sys.stderr)
+        return 1 if stale else 0
+
+    engines = tuple(engine for engine in args.engines.split(",") if engine)
+    unknown = set(engines) - set(FILL_ENGINES)
+    if unknown:
+        parser.error(f"不明な生成方式です: {', '.join(sorted(unknown))}")
+    start = time.perf_counter()
+    count = build_snapshot(args.output, engines)
+    print(f"{count}件のテンプレートを {args.output} に保存しました"
+          f"（{os.path.getsize(args.output) // 1024}KB、{time.perf_counter() - start:.1f}秒）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+起動時間のプローブ（サーバーレスのコールドスタートの回帰を追う）
+新しいPythonプロセスで api/index.py を読み込み、import時間、スナップショットの読み込み時間、
+最初と2回目のリクエスト（/generate_and_download）の所要時間を計測してJSONで出力する。
+
+    python tool/startup_probe.py                        # 3回計測した中央値など
+    python tool/startup_probe.py --no-snapshot -n 5     # スナップショットなしと比べる
+    python tool/startup_probe.py --max-import-ms 800 --max-first-request-ms 3000   # 超えたら終了コード1
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+TOOL_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TOOL_DIR)
+METRICS = ("process_ms", "import_ms", "snapshot_ms", "first_request_ms", "second_request_ms")
+
+
+def _child(workers):
+    """子プロセス側: 計測結果を1行のJSONで標準出力に書く"""
+    start = time.perf_counter()
+    sys.path.insert(0, ROOT_DIR)
+    import api.index
+
+    imported = time.perf_counter()
+    from benchmark import synthetic_payload
+    from timing import STARTUP
+
+    client = api.index.app.test_client()
+    payload = synthetic_payload({"is_subscription": "yes"}, workers)
+    timings = []
+    status = []
+    for company in ("株式会社プローブ1", "株式会社プローブ2"):
+        # 2回目は入力を変えて、結果キャッシュに当たらないようにする
+        begin = time.perf_counter()
+        response = client.post("/generate_and_download", json=dict(payload, company_name=company))
+        response.get_data()
+        timings.append(time.perf_counter() - begin)
+        status.append(response.status_code)
+    print(json.dumps({
+        "import_ms": round((imported - start) * 1000, 1),
+        "snapshot_ms": round(STARTUP["snapshot"] * 1000, 1) if "snapshot" in STARTUP else None,
+        "first_request_ms": round(timings[0] * 1000, 1),
+        "second_request_ms": round(timings[1] * 1000, 1),
+        "status": status,
+    }))
+
+
+def probe(runs=3, workers=1, snapshot=True):
+    """runs回、新しいプロセスで起動を計測し、各回の結果のリストを返す"""
+    env = dict(os.environ)
+    if not snapshot:
+        env["JINZAI_SNAPSHOT"] = ""
+    results = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", str(workers)],
+                                   capture_output=True, text=True, env=env, cwd=ROOT_DIR)
+        elapsed = time.perf_counter() - start
+        if completed.returncode != 0:
+            raise RuntimeError(f"起動の計測に失敗しました:\n{completed.stderr}")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        result["process_ms"] = round(elapsed * 1000, 1)
+        results.append(result)
+    return results
+
+
+def summarize(results):
+    summary = {}
+    for metric in METRICS:
+        values = [r[metric] for r in results if r.get(metric) is not None]
+        if values:
+            summary[metric] = {"median": statistics.median(values), "min": min(values), "max": max(values)}
+    return summary
+
+
+def main(argv=None):
+    if argv is None and len(sys.argv) == 3 and sys.argv[1] == "--child":
+        _child(int(sys.argv[2]))
+        return 0
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--runs", type=int, default=3, help="計測回数（毎回新しいプロセス）")
+    parser.add_argument("--workers", type=int, default=1, help="リクエストの受講者数")
+    parser.add_argument("--no-snapshot", action="store_true", help="スナップショットを使わずに計測する")
+    parser.add_argument("--max-import-ms", type=float, help="import時間（中央値）の上限")
+    parser.add_argument("--max-first-request-ms", type=float, help="最初のリクエスト（中央値）の上限")
+    parser.add_argument("-o", "--output", help="結果のJSONの出力先（省略時は標準出力）")
+    args = parser.parse_args(argv)
+
+    results = probe(args.runs, args.workers, snapshot=not args.no_snapshot)
+    report = {"snapshot": not args.no_snapshot, "runs": results, "summary": summarize(results)}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    failed = []
+    summary = report["summary"]
+    if args.max_import_ms is not None and summary["import_ms"]["median"] > args.max_import_ms:
+        failed.append(f"import {summary['import_ms']['median']}ms > {args.max_import_ms}ms")
+    if args.max_first_request_ms is not None and summary["first_request_ms"]["median"] > args.max_first_request_ms:
+        failed.append(f"最初のリクエスト {summary['first_request_ms']['median']}ms > {args.max_first_request_ms}ms")
+    for message in failed:
+        print(f"上限超過: {message}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
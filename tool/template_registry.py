@@ -0,0 +1,291 @@
+"""
+テンプレートの登録簿
+起動時に全様式のテンプレートを1回ずつ確認し、メタデータ（内容のハッシュ、シート名、使用範囲、
+マージ索引）を持っておく。確認するのは
+- テンプレートが存在し、xlsxとして読めるか
+- 対応表の書き込み先（シート番号、セル番地）がすべて有効か
+  （結合セルなら左上のセルであること、同時に書きうる2つの項目が同じセルに入らないこと）
+シートの使用範囲（<dimension>）の外への書き込みは、要素が目安にすぎないので警告だけにする。
+問題のある様式は使えない様式として記録し、その様式が必要なリクエストは生成を始める前に失敗させる。
+JINZAI_STRICT_TEMPLATES=1 のときは、問題があれば起動の時点で TemplateError を送出する。
+
+    python tool/template_registry.py          # 全テンプレートを確認して一覧を表示（問題があれば終了コード1）
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import zipfile
+from collections import namedtuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from form_specs import FORM_SPECS
+from mapping import exclusive, ops_targets
+from template_store import template_stamp
+from timing import record_startup
+from xlsx_patch import PatchUnsupported, column_index, patch_template
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLAN_DIR = os.path.join(BASE_DIR, "計画届（変更届）を提出する場合")
+APP_DIR = os.path.join(BASE_DIR, "支給申請を行う場合")
+
+# 様式ID -> 元のテンプレートのパス
+SOURCE_TEMPLATES = {
+    "1_1": os.path.join(PLAN_DIR,
+        "様式第1-1号人材開発支援助成金（事業展開等リスキリング支援コース）職業訓練実施計画届.xlsx"),
+    "1_3": os.path.join(PLAN_DIR,
+        "様式第1-3号人材開発支援助成金（事業展開等リスキリング支援コース）事業展開等実施計画.xlsx"),
+    "3_1": os.path.join(PLAN_DIR,
+        "様式第3-1号人材開発支援助成金（事業展開等リスキリング支援コース）対象労働者一覧.xlsx"),
+    "3_2": os.path.join(PLAN_DIR, "様式第3-2号.xlsx"),
+    "11": os.path.join(PLAN_DIR,
+        "様式第11号人材開発支援助成金（事業展開等リスキリング支援コース）事前確認書.xlsx"),
+    "4_2": os.path.join(APP_DIR,
+        "様式第4-2号人材開発支援助成金（事業展開等リスキリング支援コース）支給申請書.xlsx"),
+    "5": os.path.join(APP_DIR,
+        "様式第5号人材開発支援助成金（事業展開等リスキリング支援コース）賃金助成の内訳.xlsx"),
+    "6_2": os.path.join(APP_DIR,
+        "様式第6-2号人材開発支援助成金（事業展開等リスキリング支援コース）経費助成の内訳.xlsx"),
+    "6_3": os.path.join(APP_DIR,
+        "様式第6-3号人材開発支援助成金（事業展開等リスキリング支援コース） 定額制サービスによる訓練に関する経費助成の内訳.xlsx"),
+    "8_1": os.path.join(APP_DIR,
+        "様式第8-1号人材開発支援助成金（事業展開等リスキリング支援コース）OFF-JT実施状況報告書保護解除.xlsx"),
+    "8_3": os.path.join(APP_DIR,
+        "様式第8-3号人材開発支援助成金（事業展開等リスキリング支援コース）eラーニング訓練実施結果報告書.xlsx"),
+    "12": os.path.join(APP_DIR,
+        "様式第12号人材開発支援助成金（事業展開等リスキリング支援コース）支給申請承諾書（訓練実施者）.xlsx"),
+    "13": os.path.join(APP_DIR,
+        "様式第13号人材開発支援助成金（事業展開等リスキリング支援コース）事業所確認票.xlsx"),
+    "10": os.path.join(PLAN_DIR,
+        "様式第10号人材開発支援助成金（事業展開等リスキリング支援コース）OFF-JT講師要件確認書.xlsx"),
+    "2_1": os.path.join(PLAN_DIR,
+        "様式第2-1号人材開発支援助成金（事業展開等リスキリング支援コース）職業訓練実施計画変更届.xlsx"),
+    "14_1": os.path.join(PLAN_DIR,
+        "様式第14-1号人材開発支援助成金（事業展開等リスキリング支援コース） 定額制サービスによる訓練に関する事業所確認票.xlsx"),
+    "14_2": os.path.join(PLAN_DIR,
+        "様式第14-2号人材開発支援助成金（事業展開等リスキリング支援コース） 本社一括申請に関する事業所確認票.xlsx"),
+    "7": os.path.join(APP_DIR,
+        "様式第7号人材開発支援助成金（事業展開等リスキリング支援コース）自発的職業能力開発に関する申立書.xlsx"),
+    "8_4": os.path.join(APP_DIR,
+        "様式第8-4号人材開発支援助成金（事業展開等リスキリング支援コース）通信制訓練実施結果報告書.xlsx"),
+    "8_5": os.path.join(APP_DIR,
+        "様式第8-5号人材開発支援助成金（事業展開等リスキリング支援コース） 定額制サービスによる訓練実施結果報告書.xlsx"),
+}
+
+# 軽量化したテンプレート（tool/slim_templates.py で作る）の置き場所。空なら使わない
+SLIM_DIR = os.environ.get("JINZAI_SLIM_TEMPLATES", os.path.join(BASE_DIR, "tool", "slim_templates"))
+SLIM_MANIFEST = "manifest.json"
+
+
+def _slim_variants(templates, slim_dir=SLIM_DIR):
+    """元のテンプレートが軽量化したときのままの様式だけ、パスを軽量化した版に差し替えた対応表を返す"""
+    manifest_path = os.path.join(slim_dir, SLIM_MANIFEST) if slim_dir else ""
+    if not os.path.exists(manifest_path):
+        return dict(templates)
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    resolved = dict(templates)
+    for form_id, entry in manifest.items():
+        source = templates.get(form_id)
+        slim_path = os.path.join(slim_dir, entry["file"])
+        if (source and os.path.exists(source) and os.path.exists(slim_path)
+                and _file_digest(source) == entry["sha256"]):
+            resolved[form_id] = slim_path
+    return resolved
+
+
+def _file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+# 様式ID -> 生成に使うテンプレートのパス（軽量化した版があればそちら）
+FORM_TEMPLATES = _slim_variants(SOURCE_TEMPLATES)
+
+STRICT_TEMPLATES = os.environ.get("JINZAI_STRICT_TEMPLATES", "") not in ("", "0")
+
+# Excelのシートの上限（列XFD、1048576行）
+MAX_COLUMN = 16384
+MAX_ROW = 1048576
+
+# 様式1つ分のテンプレートの情報（problems が空なら使える。warnings は表示するだけ）
+TemplateInfo = namedtuple("TemplateInfo", "form_id path sha256 size stamp sheets dimension merge_index problems "
+                                          "warnings", defaults=((),))
+
+
+class TemplateError(Exception):
+    """使えないテンプレートがある（JINZAI_STRICT_TEMPLATES=1 の起動時）"""
+
+
+class TemplateUnavailable(FileNotFoundError):
+    """リクエストに必要な様式のテンプレートが使えない"""
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def _cell_position(cell):
+    """セル番地の (列番号, 行番号)。番地として不正ならNone"""
+    letters = cell.rstrip("0123456789")
+    digits = cell[len(letters):]
+    if not (letters.isalpha() and letters.isupper() and digits and digits[0] != "0"):
+        return None
+    return column_index(letters), int(digits)
+
+
+def _dimension_bounds(dimension):
+    """使用範囲（"A1:AM108" や "A1"）の (左上, 右下) の (列番号, 行番号)。読めなければNone"""
+    if not dimension:
+        return None
+    first, _, last = dimension.partition(":")
+    start, end = _cell_position(first), _cell_position(last or first)
+    return (start, end) if start and end else None
+
+
+def _cell_problem(cell, merge_index=None):
+    """書き込み先のセル番地に問題があれば説明、なければNone
+
+    merge_index: シートのマージ索引（省略時（シートを読めなかったとき）は番地の書式だけを確かめる）
+    """
+    position = _cell_position(cell)
+    if position is None:
+        return f"セル番地が不正です: {cell}"
+    column, row = position
+    if column > MAX_COLUMN or row > MAX_ROW:
+        return f"セル番地がシートの範囲外です: {cell}"
+    anchor = (merge_index or {}).get(cell, cell)
+    if anchor != cell:
+        return f"セル番地が結合セルの左上ではありません（左上は {anchor}）: {cell}"
+    return None
+
+
+def _cell_warning(cell, bounds):
+    """書き込み先がシートの使用範囲（_dimension_bounds）の外なら警告の説明、そうでなければNone"""
+    position = _cell_position(cell)
+    if bounds is None or position is None:
+        return None
+    column, row = position
+    (first_column, first_row), (last_column, last_row) = bounds
+    if first_column <= column <= last_column and first_row <= row <= last_row:
+        return None
+    return f"セル番地がシートの使用範囲の外です: {cell}"
+
+
+def _collisions(targets, merge_index):
+    """同時に書きうる2つの書き込みが同じセル（結合セルは左上）に入るものの説明の集合
+
+    targets: mapping.ops_targets の (セル番地, safe, 分岐) の並び
+    """
+    written = {}
+    collisions = set()
+    for cell, _, branch in targets:
+        anchor = merge_index.get(cell, cell)
+        for other, other_branch in written.get(anchor, ()):
+            if not exclusive(branch, other_branch):
+                collisions.add(f"2つの項目が同じセルに書き込まれます: {other} と {cell}（{anchor}）")
+        written.setdefault(anchor, []).append((cell, branch))
+    return collisions
+
+
+def inspect_template(form_id):
+    """様式のテンプレートを確認して TemplateInfo を返す"""
+    path = FORM_TEMPLATES[form_id]
+    form = FORM_SPECS[form_id]
+    name = os.path.basename(path)
+    if not os.path.exists(path):
+        return TemplateInfo(form_id, path, None, None, None, (), None, {},
+                            (f"テンプレートが見つかりません: {name}",))
+    problems = []
+    sheets = ()
+    dimension = None
+    merge_index = {}
+    try:
+        template = patch_template(path)
+        sheets = tuple(template.sheet_names())
+        if form.sheet >= len(sheets):
+            problems.append(f"シート番号 {form.sheet} がありません（{len(sheets)}シート）: {name}")
+        else:
+            sheet = template.sheet(form.sheet)
+            dimension = sheet.dimension
+            merge_index = sheet.merge_index
+    except (OSError, zipfile.BadZipFile, PatchUnsupported) as e:
+        problems.append(f"テンプレートを読めません: {name}: {e}")
+    targets = list(ops_targets(form.ops))
+    cell_problems = {_cell_problem(cell, merge_index) for cell, _, _ in targets} - {None}
+    problems.extend(f"{problem}（{name}）" for problem in sorted(cell_problems | _collisions(targets, merge_index)))
+    bounds = _dimension_bounds(dimension)
+    warnings = {_cell_warning(cell, bounds) for cell, _, _ in targets} - {None}
+    return TemplateInfo(form_id, path, _file_digest(path), os.path.getsize(path), template_stamp(path),
+                        sheets, dimension, merge_index, tuple(problems),
+                        tuple(f"{warning}（{name}）" for warning in sorted(warnings)))
+
+
+def load_registry(strict=None):
+    """全様式のテンプレートを確認して登録簿を作り直し、{様式ID: TemplateInfo} を返す
+
+    strict（省略時は JINZAI_STRICT_TEMPLATES）なら、問題のある様式があれば TemplateError を送出する。
+    そうでなければ問題を標準エラー出力に書き、その様式だけを使えないものとして扱う。
+    警告は strict でも標準エラー出力に書くだけにする。
+    """
+    global _registry
+    strict = STRICT_TEMPLATES if strict is None else strict
+    start = time.perf_counter()
+    registry = {form_id: inspect_template(form_id) for form_id in FORM_TEMPLATES}
+    with _registry_lock:
+        _registry = registry
+    record_startup("templates", time.perf_counter() - start)
+
+    problems = [problem for info in registry.values() for problem in info.problems]
+    if problems and strict:
+        raise TemplateError("使えないテンプレートがあります:\n" + "\n".join(problems))
+    for problem in problems:
+        print(f"テンプレートの確認: {problem}", file=sys.stderr)
+    for warning in (warning for info in registry.values() for warning in info.warnings):
+        print(f"テンプレートの確認（警告）: {warning}", file=sys.stderr)
+    return registry
+
+
+def install_registry(entries):
+    """確認済みの登録簿（親プロセスで作ったもの）をそのまま使う"""
+    global _registry
+    with _registry_lock:
+        _registry = entries
+
+
+def registry():
+    """登録簿（まだ作っていなければ作る）"""
+    entries = _registry
+    return entries if entries is not None else load_registry(strict=False)
+
+
+def template_info(form_id):
+    return registry()[form_id]
+
+
+def require_templates(form_ids):
+    """様式のテンプレートがすべて使えるか登録簿で確認する（使えなければ TemplateUnavailable）"""
+    entries = registry()
+    problems = [problem for form_id in dict.fromkeys(form_ids) for problem in entries[form_id].problems]
+    if problems:
+        raise TemplateUnavailable("; ".join(problems))
+
+
+def main():
+    entries = load_registry(strict=False)
+    for info in entries.values():
+        status = "NG" if info.problems else "OK"
+        index = FORM_SPECS[info.form_id].sheet
+        sheet = info.sheets[index] if index < len(info.sheets) else "-"
+        slim = "（軽量化）" if info.path != SOURCE_TEMPLATES[info.form_id] else ""
+        print(f"{status}  {info.form_id:<5} {sheet:<24} {info.dimension or '-':<12} "
+              f"{(info.sha256 or '-')[:12]:<12} {os.path.basename(info.path)}{slim}")
+    return 1 if any(info.problems for info in entries.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
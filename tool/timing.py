@@ -0,0 +1,232 @@
+"""
+処理段階ごとの所要時間の計測
+生成処理の要所を stage("load", form_id) のように囲んでおき、
+- record_stages() の中で実行したときは、そのスレッドでの段階ごとの合計時間を集計する
+  （ベンチマーク、リクエストごとの Server-Timing ヘッダー）
+- JINZAI_METRICS=1 のときは、プロセス全体のヒストグラムにも記録する（/metrics）
+どちらでもないときは何もしない（共有の空のコンテキストマネージャーを返すだけ）。
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+METRICS_ENABLED = os.environ.get("JINZAI_METRICS", "") not in ("", "0")
+
+# 段階の名前（テンプレート読込、書き込み、保存、ZIP作成）
+STAGES = ("load", "fill", "save", "zip")
+
+# ヒストグラムのバケット（秒）
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_local = threading.local()
+_NOOP = nullcontext()
+# 集計中のスレッドの数（0なら thread-local を見ずに済ませる）
+_active = 0
+_active_lock = threading.Lock()
+
+
+class Histogram:
+    """ラベルごとの累積バケット・合計・件数（Prometheusのhistogram）"""
+
+    def __init__(self, name, help_text, labels, buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        for label_values, (counts, total, count) in items:
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+class Counter:
+    """ラベルごとの累計値（Prometheusのcounter）"""
+
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{{{_labels(self.labels, label_values)}}} {value}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+STAGE_SECONDS = Histogram("jinzai_stage_seconds", "生成処理の段階ごとの所要時間（秒）", ("stage", "form"))
+BYTES_WRITTEN = Counter("jinzai_bytes_written_total", "書き出したバイト数", ("stage", "form"))
+REQUEST_SECONDS = Histogram("jinzai_request_seconds", "リクエストの処理時間（秒）", ("endpoint", "status"))
+ZIP_ENTRIES = Counter("jinzai_zip_entries_total", "出力ZIPに書いたエントリ数", ("method",))
+ZIP_BYTES = Counter("jinzai_zip_bytes_total", "出力ZIPのエントリの圧縮前（in）・格納後（out）のバイト数",
+                    ("method", "direction"))
+# 起動時の各段階の所要時間（秒）: import、snapshot（テンプレートのスナップショットの読み込み）など
+STARTUP = {}
+
+
+class _Stage:
+    __slots__ = ("name", "form", "totals", "start")
+
+    def __init__(self, name, form, totals):
+        self.name = name
+        self.form = form
+        self.totals = totals
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        if self.totals is not None:
+            self.totals[self.name] = self.totals.get(self.name, 0.0) + elapsed
+            if self.form is not None:
+                key = f"form.{self.form}"
+                self.totals[key] = self.totals.get(key, 0.0) + elapsed
+        if METRICS_ENABLED:
+            STAGE_SECONDS.observe((self.name, self.form or ""), elapsed)
+        return False
+
+
+def stage(name, form=None):
+    """囲んだ処理の所要時間を段階 name（様式IDがあれば様式ごとにも）に記録する"""
+    if not _active and not METRICS_ENABLED:
+        return _NOOP
+    return _Stage(name, form, getattr(_local, "totals", None))
+
+
+def recording():
+    """計測中か（計測していなければ、記録のための余分な処理を省ける）"""
+    return METRICS_ENABLED or (_active > 0 and getattr(_local, "totals", None) is not None)
+
+
+def add_bytes(name, size, form=None):
+    """段階 name で書き出したバイト数を記録する"""
+    totals = getattr(_local, "totals", None) if _active else None
+    if totals is not None:
+        key = f"{name}.bytes"
+        totals[key] = totals.get(key, 0) + size
+    if METRICS_ENABLED:
+        BYTES_WRITTEN.inc((name, form or ""), size)
+
+
+def start_recording():
+    """このスレッドでの集計を始め、(集計用の辞書, 終了時に戻す状態) を返す"""
+    global _active
+    with _active_lock:
+        _active += 1
+    previous = getattr(_local, "totals", None)
+    totals = _local.totals = {}
+    return totals, previous
+
+
+def stop_recording(previous):
+    global _active
+    _local.totals = previous
+    with _active_lock:
+        _active -= 1
+
+
+@contextmanager
+def record_stages():
+    """このスレッドで実行した処理の段階ごとの合計時間（秒）を集計する辞書を返す
+
+    様式ごとの合計は "form.<様式ID>"、書き出したバイト数は "<段階>.bytes" のキーに入る。
+    並列実行のワーカー（別スレッド・別プロセス）で行った処理は含まない。
+    """
+    totals, previous = start_recording()
+    try:
+        yield totals
+    finally:
+        stop_recording(previous)
+
+
+def server_timing(totals, total=None, partial=False):
+    """集計結果を Server-Timing ヘッダーの値にする（時間はms、書き出したバイト数はdescに入れる）
+
+    partial: 応答を返し終える前の途中の値（ストリーミング）なら、合計のdescにそう示す
+    """
+    entries = []
+    for key, value in totals.items():
+        if key.endswith(".bytes"):
+            continue
+        entry = f"{key.replace('.', '-')};dur={value * 1000:.1f}"
+        size = totals.get(f"{key}.bytes")
+        if size is not None:
+            entry += f';desc="{size} bytes"'
+        entries.append(entry)
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.1f}" + (';desc="partial"' if partial else ""))
+    return ", ".join(entries)
+
+
+def observe_request(endpoint, status, seconds):
+    if METRICS_ENABLED:
+        REQUEST_SECONDS.observe((endpoint, str(status)), seconds)
+
+
+def count_zip_entry(method, bytes_in, bytes_out):
+    """出力ZIPに書いたエントリを格納方式（stored / deflated）ごとに数える"""
+    if METRICS_ENABLED:
+        ZIP_ENTRIES.inc((method,))
+        ZIP_BYTES.inc((method, "in"), bytes_in)
+        ZIP_BYTES.inc((method, "out"), bytes_out)
+
+
+def record_startup(phase, seconds):
+    """起動時の段階の所要時間を記録する（/metrics の jinzai_startup_seconds）"""
+    STARTUP[phase] = seconds
+
+
+def render_metrics():
+    """Prometheusのテキスト形式のメトリクス"""
+    lines = []
+    for metric in (STAGE_SECONDS, BYTES_WRITTEN, REQUEST_SECONDS, ZIP_ENTRIES, ZIP_BYTES):
+        lines.extend(metric.render())
+    lines += ["# HELP jinzai_startup_seconds 起動時の段階ごとの所要時間（秒）",
+              "# TYPE jinzai_startup_seconds gauge"]
+    lines += [f'jinzai_startup_seconds{{phase="{_escape(phase)}"}} {value}' for phase, value in STARTUP.items()]
+    return "\n".join(lines) + "\n"
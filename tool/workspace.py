@@ -0,0 +1,157 @@
+"""
+生成ジョブごとの出力ワークスペース
+ジョブIDごとに専用ディレクトリを作り、古いものはバックグラウンドで削除する
+生成中のワークスペース（in_use）と、作成・更新から WORKSPACE_MIN_AGE 秒以内のもの（ダウンロード待ち）は
+合計サイズの超過では削除しない。
+"""
+
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Vercel環境では/tmpに出力、ローカルではtool/output
+if os.environ.get("VERCEL"):
+    OUTPUT_ROOT = "/tmp/jinzai_output"
+else:
+    OUTPUT_ROOT = os.path.join(BASE_DIR, "tool", "output")
+
+# 掃除の設定（秒・バイト）
+WORKSPACE_TTL = int(os.environ.get("JINZAI_WORKSPACE_TTL", "3600"))
+WORKSPACE_MAX_BYTES = int(os.environ.get("JINZAI_WORKSPACE_MAX_BYTES", str(200 * 1024 * 1024)))
+CLEANUP_INTERVAL = int(os.environ.get("JINZAI_CLEANUP_INTERVAL", "60"))
+WORKSPACE_MIN_AGE = int(os.environ.get("JINZAI_WORKSPACE_MIN_AGE", "300"))
+
+_JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+_cleaner = None
+_cleaner_lock = threading.Lock()
+# 生成中のワークスペースのジョブID -> 使用中の数
+_in_use = Counter()
+_in_use_lock = threading.Lock()
+
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+
+def is_valid_job_id(job_id):
+    return bool(job_id) and _JOB_ID_RE.match(job_id) is not None
+
+
+def workspace_path(job_id):
+    """ジョブIDに対応するワークスペースのパス（不正なIDならNone）"""
+    if not is_valid_job_id(job_id):
+        return None
+    return os.path.join(OUTPUT_ROOT, job_id)
+
+
+def create_workspace(job_id=None):
+    """新しいワークスペースを作り、(ジョブID, パス) を返す"""
+    start_cleaner()
+    job_id = job_id or new_job_id()
+    path = workspace_path(job_id)
+    if path is None:
+        raise ValueError(f"不正なジョブIDです: {job_id}")
+    os.makedirs(path, exist_ok=True)
+    return job_id, path
+
+
+@contextmanager
+def in_use(job_id):
+    """この間はジョブのワークスペースを掃除で削除しない（生成中）"""
+    with _in_use_lock:
+        _in_use[job_id] += 1
+    try:
+        yield
+    finally:
+        with _in_use_lock:
+            _in_use[job_id] -= 1
+            if not _in_use[job_id]:
+                del _in_use[job_id]
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def cleanup_workspaces(max_age=None, max_bytes=None, now=None, min_age=None):
+    """古いワークスペースを削除する
+
+    max_ageより古いものを消した後、合計サイズがmax_bytesを超えていれば
+    古い順に消していく。生成中のものはどちらでも消さず、min_age秒以内に作成・更新したものは
+    サイズの超過では消さない（合計がmax_bytesを超えたままになることがある）。
+    削除したジョブIDのリストを返す。
+    """
+    max_age = WORKSPACE_TTL if max_age is None else max_age
+    max_bytes = WORKSPACE_MAX_BYTES if max_bytes is None else max_bytes
+    min_age = WORKSPACE_MIN_AGE if min_age is None else min_age
+    now = time.time() if now is None else now
+    with _in_use_lock:
+        busy = set(_in_use)
+    if not os.path.isdir(OUTPUT_ROOT):
+        return []
+
+    entries = []
+    for name in os.listdir(OUTPUT_ROOT):
+        path = os.path.join(OUTPUT_ROOT, name)
+        if not is_valid_job_id(name) or not os.path.isdir(path):
+            continue
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            continue
+        entries.append((mtime, name, path))
+    entries.sort()
+
+    removed = []
+    kept = []
+    for mtime, name, path in entries:
+        if now - mtime > max_age and name not in busy:
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(name)
+        else:
+            kept.append((mtime, name, path, _dir_size(path)))
+
+    total = sum(size for _, _, _, size in kept)
+    for mtime, name, path, size in kept:
+        if total <= max_bytes:
+            break
+        if name in busy or now - mtime < min_age:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed.append(name)
+        total -= size
+    return removed
+
+
+def _cleanup_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            cleanup_workspaces()
+        except Exception:
+            pass
+
+
+def start_cleaner(interval=None):
+    """掃除用のデーモンスレッドを起動する（起動済みなら何もしない）"""
+    global _cleaner
+    with _cleaner_lock:
+        if _cleaner is not None:
+            return
+        _cleaner = threading.Thread(target=_cleanup_loop, args=(interval or CLEANUP_INTERVAL,),
+                                    name="workspace-cleaner", daemon=True)
+        _cleaner.start()
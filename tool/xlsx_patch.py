@@ -0,0 +1,426 @@
+"""
+xlsxテンプレートの直接書き換えエンジン
+テンプレートをZIPとして扱い、シートXMLのうち書き込み先の<c>要素だけを差し替える。
+openpyxlでの読み込み・保存を経ないので速く、openpyxlが扱わない部品（図形、入力規則の拡張など）も残る。
+書き換えないパーツはテンプレートのバイト列をそのまま出力に使う。
+
+文字列はインライン文字列（t="inlineStr"）で書くので共有文字列表は触らない。
+数式の計算結果が古いまま残らないよう、ブックには開いたときの再計算（fullCalcOnLoad）を指定し、
+計算チェーン（calcChain.xml）は外す（openpyxlで保存した場合と同じ）。
+"""
+
+import bisect
+import copy
+import io
+import os
+import posixpath
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+from xml.etree import ElementTree
+
+from template_store import template_stamp
+
+# openpyxlと同じ扱いにする（制御文字はエラー、32767文字で切る、"="始まりは数式、エラー値）
+ILLEGAL_CHARACTERS_RE = re.compile(r'[\000-\010]|[\013-\014]|[\016-\037]')
+ERROR_CODES = ("#NULL!", "#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!", "#N/A")
+MAX_STRING_LENGTH = 32767
+
+# 分岐ごとのテンプレートの変種（generator.form_variant_writes）を何件まで持つか。0で変種を使わない
+VARIANT_CACHE_ENTRIES = int(os.environ.get("JINZAI_TEMPLATE_VARIANTS", "64"))
+
+_NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_SHEET_DATA_RE = re.compile(rb'<sheetData\s*/>|<sheetData>(.*?)</sheetData>', re.S)
+_ROW_RE = re.compile(rb'<row\b[^>]*/>|<row\b[^>]*>.*?</row>', re.S)
+_ROW_OPEN_RE = re.compile(rb'<row\b([^>]*?)(/?)>')
+_ROW_NUMBER_RE = re.compile(rb'\sr="(\d+)"')
+_SPANS_RE = re.compile(rb'\sspans="[^"]*"')
+_CELL_RE = re.compile(rb'<c\b[^>]*/>|<c\b[^>]*>.*?</c>', re.S)
+_CELL_REF_RE = re.compile(rb'^<c\b[^>]*?\sr="([A-Z]+)(\d+)"')
+_CELL_STYLE_RE = re.compile(rb'^<c\b[^>]*?\ss="(\d+)"')
+_MASTER_FORMULA_RE = re.compile(rb'<f\b[^>]*\st="(?:shared|array|dataTable)"[^>]*\sref="')
+_MERGE_CELL_RE = re.compile(rb'<mergeCell\s+ref="([A-Z]+)(\d+):([A-Z]+)(\d+)"')
+_CELL_ADDRESS_RE = re.compile(r'^([A-Z]+)(\d+)$')
+_DIMENSION_RE = re.compile(rb'<dimension\s+ref="([^"]+)"')
+_CALC_PR_RE = re.compile(rb'<calcPr\b([^>]*?)(/?)>')
+_CALC_CHAIN_REL_RE = re.compile(rb'<Relationship\b[^>]*calcChain[^>]*/>')
+_CALC_CHAIN_TYPE_RE = re.compile(rb'<Override\b[^>]*calcChain[^>]*/>')
+
+
+class PatchUnsupported(Exception):
+    """直接書き換えで扱えないテンプレートまたは値（openpyxlで生成すること）"""
+
+
+def column_index(letters):
+    """A->1, B->2, ..., AA->27"""
+    num = 0
+    for c in letters:
+        num = num * 26 + (ord(c) - 64)
+    return num
+
+
+def column_letter(index):
+    """1->A, 2->B, ..., 27->AA"""
+    letters = ""
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _escape(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def cell_xml(ref, value, style=None):
+    """セル1つ分の<c>要素を作る（値の型の判定はopenpyxlと同じ）
+
+    制御文字を含む文字列はValueError、対応していない型はPatchUnsupportedを送出する。
+    """
+    s = f' s="{style.decode()}"' if style else ""
+    if isinstance(value, bool):
+        return f'<c r="{ref}"{s} t="b"><v>{int(value)}</v></c>'.encode()
+    if isinstance(value, int):
+        return f'<c r="{ref}"{s}><v>{value}</v></c>'.encode()
+    if isinstance(value, float):
+        if value != value or value in (float("inf"), float("-inf")):
+            raise PatchUnsupported(f"数値として書けない値です: {value!r}")
+        return f'<c r="{ref}"{s}><v>{value!r}</v></c>'.encode()
+    if not isinstance(value, str):
+        raise PatchUnsupported(f"直接書き換えで扱えない型です: {type(value).__name__}")
+
+    value = value[:MAX_STRING_LENGTH]
+    if ILLEGAL_CHARACTERS_RE.search(value):
+        raise ValueError(f"{value} cannot be used in worksheets.")
+    if len(value) > 1 and value.startswith("="):
+        return f'<c r="{ref}"{s}><f>{_escape(value[1:])}</f><v></v></c>'.encode()
+    if value in ERROR_CODES:
+        return f'<c r="{ref}"{s} t="e"><v>{value}</v></c>'.encode()
+    space = ' xml:space="preserve"' if value != value.strip() else ""
+    return f'<c r="{ref}"{s} t="inlineStr"><is><t{space}>{_escape(value)}</t></is></c>'.encode()
+
+
+class SheetXml:
+    """シートXMLを <sheetData> の前・行ごと・後に分けて持つ"""
+
+    def __init__(self, xml):
+        m = _SHEET_DATA_RE.search(xml)
+        if m is None:
+            raise PatchUnsupported("sheetDataが見つかりません")
+        self.head = xml[:m.start()] + b"<sheetData>"
+        self.tail = b"</sheetData>" + xml[m.end():]
+        body = m.group(1) or b""
+        self.rows = _ROW_RE.findall(body)
+        if _ROW_RE.sub(b"", body).strip():
+            raise PatchUnsupported("sheetDataに行以外の要素があります")
+        self.numbers = []
+        for row in self.rows:
+            number = _ROW_NUMBER_RE.search(_ROW_OPEN_RE.match(row).group(1))
+            if number is None:
+                raise PatchUnsupported("行番号のない行があります")
+            self.numbers.append(int(number.group(1)))
+        if self.numbers != sorted(self.numbers):
+            raise PatchUnsupported("行が番号順に並んでいません")
+        self.merge_index = self._merge_index(self.tail)
+        dimension = _DIMENSION_RE.search(self.head)
+        # シートの使用範囲（<dimension>、なければNone）
+        self.dimension = dimension.group(1).decode() if dimension else None
+
+    @staticmethod
+    def _merge_index(xml):
+        index = {}
+        for c1, r1, c2, r2 in _MERGE_CELL_RE.findall(xml):
+            col1, col2 = column_index(c1.decode()), column_index(c2.decode())
+            row1, row2 = int(r1), int(r2)
+            anchor = f"{c1.decode()}{row1}"
+            for col in range(col1, col2 + 1):
+                letter = column_letter(col)
+                for row in range(row1, row2 + 1):
+                    index[f"{letter}{row}"] = anchor
+        return index
+
+    def render(self, cells):
+        """cells: {行番号: {列番号: (セル番地, 値)}} を書き込んだシートXML"""
+        rows = list(self.rows)
+        numbers = list(self.numbers)
+        for number in sorted(cells):
+            i = bisect.bisect_left(numbers, number)
+            if i < len(numbers) and numbers[i] == number:
+                rows[i] = _patch_row(rows[i], cells[number])
+            else:
+                rows.insert(i, _patch_row(f'<row r="{number}"/>'.encode(), cells[number]))
+                numbers.insert(i, number)
+        return b"".join((self.head, *rows, self.tail))
+
+
+def _patch_row(row, targets):
+    m = _ROW_OPEN_RE.match(row)
+    attrs, closed = m.group(1), m.group(2)
+    body = b"" if closed else row[m.end():-len(b"</row>")]
+    existing = _CELL_RE.findall(body)
+    if _CELL_RE.sub(b"", body).strip():
+        raise PatchUnsupported("行にセル以外の要素があります")
+
+    targets = dict(targets)
+    cells = []
+    for cell in existing:
+        ref = _CELL_REF_RE.match(cell)
+        if ref is None:
+            raise PatchUnsupported("番地のないセルがあります")
+        col = column_index(ref.group(1).decode())
+        target = targets.pop(col, None)
+        if target is None:
+            cells.append((col, cell))
+            continue
+        if _MASTER_FORMULA_RE.search(cell):
+            raise PatchUnsupported(f"共有数式・配列数式の起点セルです: {target[0]}")
+        style = _CELL_STYLE_RE.match(cell)
+        cells.append((col, cell_xml(target[0], target[1], style.group(1) if style else None)))
+    for col, (ref, value) in targets.items():
+        cells.append((col, cell_xml(ref, value)))
+    cells.sort(key=lambda item: item[0])
+
+    # spans（セル範囲のヒント）は新しいセルと食い違うことがあるので外す
+    return b"".join((b"<row", _SPANS_RE.sub(b"", attrs), b">", *(c for _, c in cells), b"</row>"))
+
+
+class PatchTemplate:
+    """1つのテンプレートxlsxの直接書き換え用の前処理結果"""
+
+    # 変種で書き換え済みのシート番号（render では常に書き出す）
+    _rewritten = frozenset()
+
+    def __init__(self, path, source=None):
+        """source: テンプレートの内容を読むファイルオブジェクト（省略時はpathから読む）"""
+        self.path = path
+        self.stamp = template_stamp(path)
+        with zipfile.ZipFile(path if source is None else source) as zf:
+            self.parts = [(info, zf.read(info)) for info in zf.infolist()]
+        names = {info.filename: i for i, (info, _) in enumerate(self.parts)}
+        self.sheet_parts = self._sheet_parts(names)
+        self.parts = [self._prepare(info, content) for info, content in self.parts
+                      if info.filename != "xl/calcChain.xml"]
+        self._sheets = {}
+        self._bases = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # スナップショット（snapshot.py）に保存するときはロックを除く
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _read(self, name):
+        for info, content in self.parts:
+            if info.filename == name:
+                return content
+        raise PatchUnsupported(f"{name} がありません")
+
+    def _sheet_parts(self, names):
+        """ブック内のシート順に、シートXMLのパーツ名を返す"""
+        workbook = ElementTree.fromstring(self._read("xl/workbook.xml"))
+        rels = ElementTree.fromstring(self._read("xl/_rels/workbook.xml.rels"))
+        targets = {}
+        for rel in rels.iter(f"{_NS_PKG_REL}Relationship"):
+            target = rel.get("Target")
+            if target.startswith("/"):
+                target = target[1:]
+            else:
+                target = posixpath.normpath(posixpath.join("xl", target))
+            targets[rel.get("Id")] = target
+        parts = []
+        for sheet in workbook.iter(f"{_NS_MAIN}sheet"):
+            part = targets.get(sheet.get(f"{_NS_REL}id"))
+            if part not in names:
+                raise PatchUnsupported(f"シートのパーツが見つかりません: {sheet.get('name')}")
+            parts.append(part)
+        return parts
+
+    def sheet_names(self):
+        """ブック内のシート名（シート順）"""
+        workbook = ElementTree.fromstring(self._read("xl/workbook.xml"))
+        return [sheet.get("name") for sheet in workbook.iter(f"{_NS_MAIN}sheet")]
+
+    @staticmethod
+    def _prepare(info, content):
+        """ブック全体の設定だけを直す（開いたときに再計算、計算チェーンの参照を外す）"""
+        if info.filename == "xl/workbook.xml":
+            content = _CALC_PR_RE.sub(
+                lambda m: b'<calcPr' + re.sub(rb'\sfullCalcOnLoad="[^"]*"', b"", m.group(1))
+                          + b' fullCalcOnLoad="1"' + m.group(2) + b'>', content, count=1)
+        elif info.filename == "xl/_rels/workbook.xml.rels":
+            content = _CALC_CHAIN_REL_RE.sub(b"", content)
+        elif info.filename == "[Content_Types].xml":
+            content = _CALC_CHAIN_TYPE_RE.sub(b"", content)
+        # 書き出し時にZipInfoが書き換わるので、読み込み時のものとは別にしておく
+        copied = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+        copied.compress_type = info.compress_type
+        copied.external_attr = info.external_attr
+        return copied, content
+
+    def sheet(self, index):
+        """シート番号のSheetXml（初回に分割して以後使い回す）"""
+        sheet = self._sheets.get(index)
+        if sheet is None:
+            with self._lock:
+                sheet = self._sheets.get(index)
+                if sheet is None:
+                    sheet = self._sheets[index] = SheetXml(self._read(self.sheet_parts[index]))
+        return sheet
+
+    def _base(self, sheet_indexes):
+        """書き換えるシート以外のパーツだけを入れたZIP（書き換えるシートの組ごとに使い回す）"""
+        base = self._bases.get(sheet_indexes)
+        if base is None:
+            skip = {self.sheet_parts[i] for i in sheet_indexes}
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, "w") as zf:
+                for info, content in self.parts:
+                    if info.filename not in skip:
+                        zf.writestr(info, content)
+            base = self._bases[sheet_indexes] = buffer.getvalue()
+        return base
+
+    @staticmethod
+    def _cells(writes):
+        """書き込み計画を {シート番号: {行番号: {列番号: (セル番地, 値)}}} にまとめる
+
+        safeな書き込みで値が書けない（制御文字を含むなど）ものは飛ばす。
+        同じセルへの書き込みは後勝ち。
+        """
+        sheets = {}
+        for write in writes:
+            m = _CELL_ADDRESS_RE.match(write.cell)
+            if m is None:
+                raise PatchUnsupported(f"セル番地を解釈できません: {write.cell}")
+            try:
+                cell_xml(write.cell, write.value)
+            except ValueError:
+                if write.safe:
+                    continue
+                raise
+            row, col = int(m.group(2)), column_index(m.group(1))
+            sheets.setdefault(write.sheet, {}).setdefault(row, {})[col] = (write.cell, write.value)
+        return sheets
+
+    def variant(self, writes):
+        """書き込み計画を反映済みのシートを持つ複製（分岐ごとのテンプレートの変種）を返す
+
+        以後の render はその上に書き込む。書き換えないパーツと土台のZIPは元のテンプレートと共有する。
+        """
+        cells = self._cells(writes)
+        variant = copy.copy(self)
+        variant._sheets = dict(self._sheets)
+        for index, sheet_cells in cells.items():
+            variant._sheets[index] = SheetXml(self.sheet(index).render(sheet_cells))
+        variant._rewritten = self._rewritten | frozenset(cells)
+        return variant
+
+    def render(self, writes):
+        """書き込み計画（mapping.Writeのリスト）を反映したxlsxのバイト列を返す
+
+        safeな書き込みで値が書けない（制御文字を含むなど）ものは飛ばす。
+        同じセルへの書き込みは後勝ち。
+        """
+        sheets = self._cells(writes)
+        for index in self._rewritten:
+            sheets.setdefault(index, {})
+
+        buffer = io.BytesIO(self._base(frozenset(sheets)))
+        with zipfile.ZipFile(buffer, "a") as zf:
+            for index in sorted(sheets):
+                name = self.sheet_parts[index]
+                info = zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0))
+                info.compress_type = zipfile.ZIP_DEFLATED
+                zf.writestr(info, self.sheet(index).render(sheets[index]))
+        return buffer.getvalue()
+
+
+_templates = {}
+_templates_lock = threading.Lock()
+# path -> (stamp, テンプレートの内容のファイルオブジェクトを返す関数)。共有メモリから読むときに使う
+_sources = {}
+# (path, 変種のキー) -> (元のPatchTemplate, 変種)。古く使ったものから捨てる
+_variants = OrderedDict()
+
+
+def patch_template(path):
+    """テンプレートの前処理結果を返す（更新されていれば作り直す）"""
+    entry = _templates.get(path)
+    stamp = template_stamp(path)
+    if entry is None or entry.stamp != stamp:
+        source = _sources.get(path)
+        entry = PatchTemplate(path, source[1]() if source is not None and source[0] == stamp else None)
+        with _templates_lock:
+            _templates[path] = entry
+    return entry
+
+
+def install(path, entry, stamp):
+    """前処理済みのテンプレート（スナップショットから復元したもの）を登録する"""
+    entry.path = path
+    entry.stamp = stamp
+    with _templates_lock:
+        _templates[path] = entry
+
+
+def install_source(path, stamp, opener):
+    """テンプレートの内容の読み先を登録する（shared_templates.py。スタンプが同じ間はファイルを読まない）
+
+    opener: 呼ぶたびに先頭から読めるファイルオブジェクトを返す関数
+    """
+    with _templates_lock:
+        _sources[path] = (stamp, opener)
+
+
+def patch_variant(path, key, writes):
+    """テンプレートに書き込み計画 writes を反映した変種（key ごとに一度だけ作り、テンプレートの更新まで使い回す）"""
+    template = patch_template(path)
+    cache_key = (path, key)
+    with _templates_lock:
+        entry = _variants.get(cache_key)
+        if entry is not None and entry[0] is template:
+            _variants.move_to_end(cache_key)
+            return entry[1]
+    variant = template.variant(writes)
+    with _templates_lock:
+        _variants[cache_key] = (template, variant)
+        while len(_variants) > VARIANT_CACHE_ENTRIES:
+            _variants.popitem(last=False)
+    return variant
+
+
+def sheet_merge_index(path, sheet=0):
+    """シートXMLの<mergeCells>から作ったマージ索引（openpyxlでの解析を待たずに使える）"""
+    return patch_template(path).sheet(sheet).merge_index
+
+
+def fill(path, writes, output_path, variant=None):
+    """テンプレートに書き込み計画を反映して保存し、書き出したバイト数を返す
+
+    output_pathはパスかファイルオブジェクト。
+    variant: (変種のキー, 焼き込む書き込み計画)。指定すればテンプレートの変種の上に書き込む
+    """
+    template = patch_template(path) if variant is None else patch_variant(path, *variant)
+    content = template.render(writes)
+    if hasattr(output_path, "write"):
+        output_path.write(content)
+    else:
+        with open(output_path, "wb") as f:
+            f.write(content)
+    return len(content)
+
+
+def clear():
+    """キャッシュを破棄する"""
+    with _templates_lock:
+        _templates.clear()
+        _variants.clear()